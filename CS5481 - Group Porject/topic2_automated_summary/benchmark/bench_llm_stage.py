@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import List, Dict
+
+# 确保能正确导入项目模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark.mock_llm_server import MockLLMServer
+from processor.llm_processor import LLMProcessor
+from processor.request_scheduler import RequestScheduler
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ["BBC News", "CNN", "The New York Times", "Reuters", "Xinhua News"]
+SUBJECTS = ["OpenAI", "Google DeepMind", "European Union", "Nvidia", "Microsoft", "人工智能", "大型语言模型", "监管机构"]
+ACTIONS = ["发布了新的研究成果", "宣布了新一轮投资", "提出了监管框架草案", "推出了新一代产品", "召开了行业研讨会"]
+
+def generate_articles(count: int, sentences_per_article: int = 12, seed: int = 42) -> List[Dict]:
+    """生成确定性的合成文章，字段与DataProcessor的输出一致"""
+    rng = random.Random(seed)
+    base_date = datetime(2024, 1, 1)
+    articles = []
+    for i in range(count):
+        sentences = [
+            f"{rng.choice(SUBJECTS)}在{rng.randint(1, 12)}月{rng.choice(ACTIONS)}，{rng.choice(SUBJECTS)}对此表示关注。"
+            for _ in range(sentences_per_article)
+        ]
+        date = base_date + timedelta(days=rng.randint(0, 365))
+        articles.append({
+            'id': f'bench-{i}',
+            'title': f"{rng.choice(SUBJECTS)}相关报道 #{i + 1}",
+            'content': "".join(sentences),
+            'sentences': sentences,
+            'url': f"https://example.com/bench/{i}",
+            'published_date': date.strftime("%Y-%m-%d %H:%M:%S"),
+            'normalized_date': date,
+            'source': SOURCES[i % len(SOURCES)]
+        })
+    return articles
+
+def run_case(server: MockLLMServer, size: int, args) -> Dict:
+    """在给定语料规模下运行一次analyze_articles并收集指标"""
+    server.reset_stats()
+    scheduler = RequestScheduler(
+        requests_per_minute=args.scheduler_rpm,
+        tokens_per_minute=args.scheduler_tpm,
+        max_concurrency=args.concurrency
+    )
+    processor = LLMProcessor(
+        api_key="benchmark",
+        base_url=server.base_url,
+        max_workers=args.workers,
+        call_timeout=args.timeout,
+        summary_mode=args.summary_mode,
+        analysis_mode=args.analysis_mode,
+        scheduler=scheduler
+    )
+
+    articles = generate_articles(size)
+    start = time.time()
+    result = processor.analyze_articles(articles)
+    wall_time = time.time() - start
+
+    totals = result['usage']['totals']
+    return {
+        'articles': size,
+        'wall_time': round(wall_time, 3),
+        'calls': totals['calls'],
+        'prompt_tokens': totals['prompt_tokens'],
+        'completion_tokens': totals['completion_tokens'],
+        'retries': totals['retries'],
+        'errors': totals['errors'],
+        'server_rate_limited': server.stats['rate_limited'],
+        'server_errors': server.stats['errors'],
+        'entities': len(result['entities']),
+        'themes': len(result['themes']),
+        'timeline': len(result['timeline'])
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM阶段基准测试（使用本地模拟服务）')
+    parser.add_argument('--sizes', type=str, default='5,20,50,100', help='语料规模（文章数），用逗号分隔')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟服务的单次请求延迟（秒）')
+    parser.add_argument('--server-rpm', type=int, default=0, help='模拟服务的每分钟请求数限制')
+    parser.add_argument('--server-tpm', type=int, default=0, help='模拟服务的每分钟token数限制')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟服务的5xx错误率')
+    parser.add_argument('--scheduler-rpm', type=int, default=500, help='调度器的每分钟请求数预算')
+    parser.add_argument('--scheduler-tpm', type=int, default=200000, help='调度器的每分钟token数预算')
+    parser.add_argument('--concurrency', type=int, default=8, help='调度器的最大并发请求数')
+    parser.add_argument('--workers', type=int, default=4, help='LLMProcessor的分析线程数')
+    parser.add_argument('--timeout', type=float, default=120, help='单次LLM API调用的超时（秒），不含排队等待速率预算的时间')
+    parser.add_argument('--summary-mode', type=str, default='map_reduce', choices=['map_reduce', 'textrank'])
+    parser.add_argument('--analysis-mode', type=str, default='separate', choices=['separate', 'combined'])
+    parser.add_argument('--output', type=str, help='将结果保存为JSON文件')
+    args = parser.parse_args()
+
+    # 处理器模块在导入时已配置了INFO级别的日志，这里只保留警告以免淹没结果
+    logging.getLogger().setLevel(logging.WARNING)
+
+    server = MockLLMServer(latency=args.latency, requests_per_minute=args.server_rpm,
+                           tokens_per_minute=args.server_tpm, error_rate=args.error_rate).start()
+    results = []
+    try:
+        for size in [int(value) for value in args.sizes.split(',') if value.strip()]:
+            results.append(run_case(server, size, args))
+    finally:
+        server.stop()
+
+    header = f"{'文章数':>6} {'耗时(s)':>8} {'调用数':>6} {'输入token':>10} {'输出token':>10} {'重试':>5} {'429':>5} {'5xx':>5}"
+    print(header)
+    for item in results:
+        print(f"{item['articles']:>6} {item['wall_time']:>8.2f} {item['calls']:>6} {item['prompt_tokens']:>10} "
+              f"{item['completion_tokens']:>10} {item['retries']:>5} {item['server_rate_limited']:>5} {item['server_errors']:>5}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存至: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+import re
+import json
+import zlib
+import math
+import time
+import random
+import hashlib
+import logging
+import itertools
+from email import policy
+from email.parser import BytesParser
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple, Iterator
+
+logger = logging.getLogger(__name__)
+
+class MockLLMServer:
+    """本地OpenAI兼容服务（对话补全、嵌入、文件和批处理接口，对话补全支持流式输出），用于离线测量LLM阶段的并发、重试、JSON解析和延迟
+
+    支持可配置的延迟、每分钟请求数/token数限制（超出时返回429和Retry-After）、随机5xx错误率，
+    响应内容由提示的哈希决定，相同的请求总是得到相同的结果。批处理任务在batch_latency秒后一次性完成，
+    不受速率限制和错误率影响。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.2, latency_per_token: float = 0.0,
+                 requests_per_minute: int = 0, tokens_per_minute: int = 0, error_rate: float = 0.0, seed: int = 0,
+                 batch_latency: float = 1.0):
+        self.latency = latency
+        self.latency_per_token = latency_per_token
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.batch_latency = batch_latency
+        self.stats = {'requests': 0, 'rate_limited': 0, 'errors': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                      'batch_requests': 0}
+        self._lock = threading.Lock()
+        self._window = deque()      # (时间戳, token数)
+        self._files: Dict[str, bytes] = {}
+        self._batches: Dict[str, Dict] = {}
+        self._ids = itertools.count(1)
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"模拟LLM服务已启动: {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for key in self.stats:
+                self.stats[key] = 0
+            self._window.clear()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.rstrip('/')
+                match = re.search(r'/files/([^/]+)/content$', path)
+                if match and match.group(1) in server._files:
+                    data = server._files[match.group(1)]
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/octet-stream')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                match = re.search(r'/batches/([^/]+)$', path)
+                if match and match.group(1) in server._batches:
+                    self._send(200, server.get_batch(match.group(1)))
+                    return
+                self._send(404, {'error': {'message': f'unknown path {self.path}', 'type': 'invalid_request_error'}})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                raw = self.rfile.read(length)
+                if self.path.rstrip('/').endswith('/files'):
+                    self._send(200, server.handle_upload(self.headers.get('Content-Type', ''), raw))
+                    return
+                match = re.search(r'/batches/([^/]+)/cancel$', self.path.rstrip('/'))
+                if match and match.group(1) in server._batches:
+                    self._send(200, server.get_batch(match.group(1)))
+                    return
+                try:
+                    body = json.loads(raw or b'{}')
+                except ValueError:
+                    self._send(400, {'error': {'message': 'invalid json', 'type': 'invalid_request_error'}})
+                    return
+
+                if self.path.rstrip('/').endswith('/batches'):
+                    self._send(200, server.create_batch(body))
+                elif self.path.rstrip('/').endswith('/chat/completions'):
+                    status, payload, headers = server.handle_chat(body)
+                    if status == 200 and body.get('stream'):
+                        self._send_stream(server.stream_chunks(payload))
+                    else:
+                        self._send(status, payload, headers)
+                elif self.path.rstrip('/').endswith('/embeddings'):
+                    status, payload, headers = server.handle_embeddings(body)
+                    self._send(status, payload, headers)
+                else:
+                    self._send(404, {'error': {'message': f'unknown path {self.path}', 'type': 'invalid_request_error'}})
+
+            def _send(self, status: int, payload: Dict, headers: Dict = None):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, chunks):
+                """以server-sent events格式逐段发送，发送完毕后关闭连接"""
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for chunk in chunks:
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def handle_chat(self, body: Dict) -> Tuple[int, Dict, Dict]:
+        """处理一次对话补全请求，返回 (状态码, 响应体, 额外响应头)"""
+        messages = body.get('messages', [])
+        prompt = "\n".join(str(message.get('content', '')) for message in messages)
+        prompt_tokens = self._count_tokens(prompt)
+
+        retry_after = self._check_rate_limit(prompt_tokens)
+        if retry_after is not None:
+            return 429, {'error': {'message': 'Rate limit reached', 'type': 'requests', 'code': 'rate_limit_exceeded'}}, \
+                {'Retry-After': f"{retry_after:.2f}"}
+
+        with self._lock:
+            failed = self.random.random() < self.error_rate
+        if failed:
+            with self._lock:
+                self.stats['errors'] += 1
+            time.sleep(self.latency)
+            return 500, {'error': {'message': 'Simulated server error', 'type': 'server_error'}}, {}
+
+        content = self._respond(messages, body.get('response_format'))
+        completion_tokens = self._count_tokens(content)
+        # 流式请求在首个token之前只等待基础延迟，逐token的延迟在发送各段时体现
+        time.sleep(self.latency if body.get('stream') else self.latency + self.latency_per_token * completion_tokens)
+
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['completion_tokens'] += completion_tokens
+
+        return 200, {
+            'id': 'chatcmpl-' + hashlib.md5(prompt.encode('utf-8')).hexdigest()[:12],
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens}
+        }, {}
+
+    def stream_chunks(self, completion: Dict, piece_size: int = 8) -> Iterator[Dict]:
+        """把一次完整的补全切成chat.completion.chunk序列，每段按latency_per_token延迟"""
+        content = completion['choices'][0]['message']['content']
+        base = {key: completion[key] for key in ('id', 'created', 'model')}
+        for start in range(0, len(content), piece_size):
+            piece = content[start:start + piece_size]
+            time.sleep(self.latency_per_token * self._count_tokens(piece))
+            yield dict(base, object='chat.completion.chunk',
+                       choices=[{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}])
+        yield dict(base, object='chat.completion.chunk', choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+
+    def handle_embeddings(self, body: Dict) -> Tuple[int, Dict, Dict]:
+        """处理一次嵌入请求：按文本的词哈希生成确定性的归一化向量"""
+        inputs = body.get('input', [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        prompt_tokens = sum(self._count_tokens(str(text)) for text in inputs)
+
+        retry_after = self._check_rate_limit(prompt_tokens)
+        if retry_after is not None:
+            return 429, {'error': {'message': 'Rate limit reached', 'type': 'requests', 'code': 'rate_limit_exceeded'}}, \
+                {'Retry-After': f"{retry_after:.2f}"}
+
+        time.sleep(self.latency)
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['prompt_tokens'] += prompt_tokens
+
+        return 200, {
+            'object': 'list',
+            'model': body.get('model', 'mock-embedding'),
+            'data': [{'object': 'embedding', 'index': i, 'embedding': self._embedding(str(text))}
+                     for i, text in enumerate(inputs)],
+            'usage': {'prompt_tokens': prompt_tokens, 'total_tokens': prompt_tokens}
+        }, {}
+
+    def _embedding(self, text: str, dimensions: int = 256) -> List[float]:
+        vector = [0.0] * dimensions
+        for word in re.findall(r'[a-z0-9]+|[\u4e00-\u9fa5]{2}', text.lower()):
+            vector[zlib.crc32(word.encode('utf-8')) % dimensions] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [round(value / norm, 6) for value in vector]
+
+    def handle_upload(self, content_type: str, raw: bytes) -> Dict:
+        """保存multipart/form-data上传的文件，返回文件对象"""
+        message = BytesParser(policy=policy.default).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode('utf-8') + raw
+        )
+        data, filename, purpose = b'', 'upload.jsonl', 'batch'
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name == 'file':
+                data = part.get_payload(decode=True) or b''
+                filename = part.get_filename() or filename
+            elif name == 'purpose':
+                purpose = part.get_content().strip()
+        return self._store_file(data, filename, purpose)
+
+    def _store_file(self, data: bytes, filename: str, purpose: str) -> Dict:
+        file_id = f"file-{next(self._ids)}"
+        with self._lock:
+            self._files[file_id] = data
+        return {'id': file_id, 'object': 'file', 'bytes': len(data), 'created_at': int(time.time()),
+                'filename': filename, 'purpose': purpose, 'status': 'processed'}
+
+    def create_batch(self, body: Dict) -> Dict:
+        """创建批处理任务，batch_latency秒后在后台线程中完成"""
+        batch_id = f"batch_{next(self._ids)}"
+        batch = {
+            'id': batch_id, 'object': 'batch', 'endpoint': body.get('endpoint', '/v1/chat/completions'),
+            'input_file_id': body.get('input_file_id'), 'completion_window': body.get('completion_window', '24h'),
+            'status': 'in_progress', 'created_at': int(time.time()), 'output_file_id': None, 'error_file_id': None,
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0}
+        }
+        with self._lock:
+            self._batches[batch_id] = batch
+        threading.Thread(target=self._process_batch, args=(batch_id,), daemon=True).start()
+        return dict(batch)
+
+    def get_batch(self, batch_id: str) -> Dict:
+        with self._lock:
+            return json.loads(json.dumps(self._batches[batch_id]))
+
+    def _process_batch(self, batch_id: str) -> None:
+        time.sleep(self.batch_latency)
+        batch = self._batches[batch_id]
+        lines = self._files.get(batch['input_file_id'], b'').decode('utf-8').splitlines()
+        outputs = []
+        for line in lines:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = item.get('body', {})
+            messages = body.get('messages', [])
+            prompt_tokens = self._count_tokens("\n".join(str(message.get('content', '')) for message in messages))
+            content = self._respond(messages, body.get('response_format'))
+            completion_tokens = self._count_tokens(content)
+            outputs.append({
+                'id': f"batch_req_{next(self._ids)}", 'custom_id': item.get('custom_id'), 'error': None,
+                'response': {'status_code': 200, 'request_id': '', 'body': {
+                    'object': 'chat.completion', 'model': body.get('model', 'mock'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                              'total_tokens': prompt_tokens + completion_tokens}
+                }}
+            })
+
+        output_file = self._store_file("\n".join(json.dumps(output, ensure_ascii=False) for output in outputs)
+                                       .encode('utf-8'), f"{batch_id}_output.jsonl", 'batch_output')
+        with self._lock:
+            self.stats['batch_requests'] += len(outputs)
+            batch.update(status='completed', output_file_id=output_file['id'],
+                         request_counts={'total': len(outputs), 'completed': len(outputs), 'failed': 0})
+
+    def _check_rate_limit(self, tokens: int) -> Optional[float]:
+        """按60秒滑动窗口模拟请求数和token数限制，超限时返回需要等待的秒数"""
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return None
+        now = time.time()
+        with self._lock:
+            while self._window and now - self._window[0][0] >= 60:
+                self._window.popleft()
+            used_tokens = sum(item[1] for item in self._window)
+            over_requests = self.requests_per_minute and len(self._window) >= self.requests_per_minute
+            over_tokens = self.tokens_per_minute and self._window and used_tokens + tokens > self.tokens_per_minute
+            if over_requests or over_tokens:
+                self.stats['rate_limited'] += 1
+                return max(0.1, self._window[0][0] + 60 - now)
+            self._window.append((now, tokens))
+        return None
+
+    def _count_tokens(self, text: str) -> int:
+        cjk = len(re.findall(r'[\u4e00-\u9fa5]', text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def _respond(self, messages: List[Dict], response_format: Optional[Dict]) -> str:
+        """按系统提示判断请求类型，生成确定性的响应"""
+        system = str(messages[0].get('content', '')) if messages else ''
+        user = str(messages[-1].get('content', '')) if messages else ''
+        rng = random.Random(hashlib.sha256(user.encode('utf-8')).hexdigest())
+        words = self._keywords(user)
+
+        if not response_format:
+            return self._summary_text(words, rng)
+
+        if '时间线' in system:
+            events = []
+            for article_id in re.findall(r'\[(a\d+)\]', user):
+                events.append({
+                    'article_id': article_id,
+                    'date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    'event': f"{rng.choice(words)}相关事件{article_id}"
+                })
+            return json.dumps({'events': events}, ensure_ascii=False)
+
+        entities = [{'name': word, 'type': rng.choice(['组织', '人物', '技术', '地点']), 'description': f"{word}的简要描述"}
+                    for word in words[:10]]
+        themes = [{'name': f"{word}的发展", 'description': f"围绕{word}的讨论"} for word in words[:5]]
+        if '新闻分析专家' in system:
+            return json.dumps({'summary': self._summary_text(words, rng), 'entities': entities, 'themes': themes},
+                              ensure_ascii=False)
+        if '主题' in system:
+            return json.dumps({'themes': themes}, ensure_ascii=False)
+        return json.dumps({'entities': entities}, ensure_ascii=False)
+
+    def _keywords(self, text: str) -> List[str]:
+        """从提示中取出现次数最多的英文单词和中文双字词"""
+        counts: Dict[str, int] = {}
+        for word in re.findall(r'[A-Z][A-Za-z0-9\-]+|[\u4e00-\u9fa5]{2}', text):
+            counts[word] = counts.get(word, 0) + 1
+        ranked = sorted(counts, key=lambda word: (-counts[word], word))
+        return ranked[:10] or ['主题']
+
+    def _summary_text(self, words: List[str], rng: random.Random) -> str:
+        sentences = [f"{word}是本次报道的重点之一。" for word in words[:rng.randint(3, 6)]]
+        return "".join(sentences)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地OpenAI兼容模拟服务')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help='每个请求的基础延迟（秒）')
+    parser.add_argument('--latency-per-token', type=float, default=0.0, help='每个输出token额外增加的延迟（秒）')
+    parser.add_argument('--rpm', type=int, default=0, help='每分钟请求数限制，0表示不限制')
+    parser.add_argument('--tpm', type=int, default=0, help='每分钟token数限制，0表示不限制')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='随机返回500错误的比例')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = MockLLMServer(host=args.host, port=args.port, latency=args.latency,
+                           latency_per_token=args.latency_per_token, requests_per_minute=args.rpm,
+                           tokens_per_minute=args.tpm, error_rate=args.error_rate)
+    print(f"模拟LLM服务地址: {server.base_url}（设置 OPENAI_BASE_URL 指向该地址即可使用）")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
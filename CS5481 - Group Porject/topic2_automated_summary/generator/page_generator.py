@@ -1,30 +1,132 @@
-from jinja2 import Template, FileSystemLoader, Environment
+from jinja2 import FileSystemLoader, Environment, FileSystemBytecodeCache
 import os
-from typing import List, Dict
+import re
+import json
+import math
+import gzip
+import shutil
+import hashlib
+import tempfile
+import threading
+from itertools import islice
+from typing import List, Dict, Tuple, Iterable, Optional, Callable
 import logging
 from datetime import datetime
 
+from generator.page_manifest import PageManifest
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+# 页面共用的CSS/JS，按内容哈希命名后发布到输出目录的assets/下
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+ASSET_DIR = "assets"
+# 分片模式下完整的文章列表和时间线以JSON分片写入 data/<页面名>/
+DATA_DIR = "data"
+SUMMARY_TEMPLATE = "summary.html"
+INDEX_TEMPLATE = "index.html"
+INDEX_PAGE = "index.html"
+# 页面输入哈希中包含的文章字段（即页面上展示的字段）
+ARTICLE_FIELDS = ('url', 'title', 'source', 'published_date', 'content')
+# 页面只展示文章内容开头的摘录（summary.html中的article.content[:200]和分片中的excerpt）
+EXCERPT_CHARS = 200
+
+
+def shown_fields(article: Dict) -> Dict:
+    """文章中页面展示的字段，内容只保留摘录部分"""
+    fields = {field: article.get(field) for field in ARTICLE_FIELDS}
+    fields['content'] = (fields['content'] or '')[:EXCERPT_CHARS]
+    return fields
+
+
 class PageGenerator:
     """页面生成器，负责生成HTML摘要页面"""
     
-    def __init__(self, output_dir: str = "./output"):
+    # 同一进程中的生成器共享Jinja2环境（及其中已编译的模板），键为 (模板目录, 字节码缓存目录, 是否自动重新加载)
+    _environments: Dict[Tuple[str, str, bool], Environment] = {}
+    _environments_lock = threading.Lock()
+    
+    # 预压缩使用最高压缩级别：每个文件只压缩一次，之后每次请求都直接发送压缩结果
+    GZIP_LEVEL = 9
+    BROTLI_QUALITY = 11
+    
+    def __init__(self, output_dir: str = "./output", template_dir: str = TEMPLATE_DIR,
+                 bytecode_cache_dir: str = None, auto_reload: bool = False, max_articles: int = 10,
+                 precompress: bool = True, shard_size: int = 0):
         self.output_dir = output_dir
+        # 构造参数，渲染进程池中的工作进程据此创建相同配置的生成器
+        self.options = {'output_dir': output_dir, 'template_dir': template_dir, 'bytecode_cache_dir': bytecode_cache_dir,
+                        'auto_reload': auto_reload, 'max_articles': max_articles, 'precompress': precompress,
+                        'shard_size': shard_size}
+        # 页面中列出的源文章数量上限，None表示全部列出（页面流式写入，文章数量不影响内存占用）
+        self.max_articles = max_articles
+        # 大于0时为分片模式：页面只内嵌第一页文章和时间线，全部内容按shard_size分页写成JSON分片，
+        # 页面滚动到列表末尾时再加载下一页；此时max_articles不再限制文章数量
+        self.shard_size = shard_size
+        # 每个页面和静态资源旁写入.gz（安装了brotli时还有.br）预压缩文件，静态服务可直接发送
+        self.compressed_variants = (['.gz', '.br'] if brotli else ['.gz']) if precompress else []
         # 确保输出目录存在
         os.makedirs(output_dir, exist_ok=True)
         
         # 设置Jinja2环境
-        self.env = Environment(
-            loader=FileSystemLoader(os.path.dirname(__file__)),
-            autoescape=True
-        )
+        self.env = self.get_environment(template_dir, bytecode_cache_dir, auto_reload)
+        # 记录每个页面的输入哈希，输入未变化时跳过渲染；一轮生成结束后调用save_manifest()
+        self.manifest = PageManifest(output_dir)
+        self._templates_digest: str = None
+        # 静态资源名 -> 页面中引用的带哈希的相对路径
+        self.assets = self._publish_assets()
     
-    def generate_summary_page(self, analysis_results: Dict, articles: List[Dict], topic: str) -> str:
-        """生成综合摘要页面"""
-        logger.info(f"开始生成关于 '{topic}' 的摘要页面")
+    @property
+    def article_limit(self) -> Optional[int]:
+        """页面输出（HTML及分片）包含的文章数量上限，None表示全部"""
+        return None if self.shard_size else self.max_articles
+    
+    @classmethod
+    def get_environment(cls, template_dir: str = TEMPLATE_DIR, bytecode_cache_dir: str = None,
+                        auto_reload: bool = False) -> Environment:
+        """返回共享的Jinja2环境
+        
+        环境在内存中缓存编译后的模板；字节码缓存把编译结果保存到磁盘，新进程启动时也无需重新编译。
+        auto_reload为False时不检查模板文件的修改时间，修改模板后需要重启进程（开发时可设为True）。
+        """
+        key = (os.path.abspath(template_dir), bytecode_cache_dir or '', auto_reload)
+        with cls._environments_lock:
+            env = cls._environments.get(key)
+            if env is None:
+                bytecode_cache = None
+                if bytecode_cache_dir:
+                    os.makedirs(bytecode_cache_dir, exist_ok=True)
+                    bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+                env = Environment(
+                    loader=FileSystemLoader(template_dir),
+                    autoescape=True,
+                    bytecode_cache=bytecode_cache,
+                    auto_reload=auto_reload
+                )
+                cls._environments[key] = env
+            return env
+    
+    @staticmethod
+    def page_name(topic: str) -> str:
+        """主题摘要页面的文件名"""
+        return f"summary_{topic.replace(' ', '_')}.html"
+    
+    def generate_summary_page(self, analysis_results: Dict, articles: List[Dict], topic: str,
+                              force: bool = False, index_url: str = None) -> str:
+        """生成综合摘要页面；页面输入（分析结果、展示的文章和模板）与上次相同时不重新渲染，除非force为True
+        
+        index_url为多主题站点的目录页地址，提供时页面顶部显示返回目录的链接。
+        分片模式下同时写出全部文章和时间线的JSON分片。
+        """
+        name = self.page_name(topic)
+        output_file = os.path.join(self.output_dir, name)
         
         # 准备模板数据
         template_data = {
@@ -34,383 +136,224 @@ class PageGenerator:
             'entities': analysis_results.get('entities', []),
             'themes': analysis_results.get('themes', []),
             'timeline': analysis_results.get('timeline', []),
-            'articles': articles[:10]  # 限制显示的文章数量
+            # 限制显示的文章数量；不复制列表，模板渲染时逐篇读取
+            'articles': islice(articles, self.max_articles),
+            'index_url': index_url,
+            'assets': self.assets
         }
         
-        # 使用模板生成HTML
-        html_content = self._render_template(template_data)
+        digest = self._input_digest(template_data, articles)
+        if not force and self.manifest.is_current(name, digest):
+            logger.info(f"'{topic}' 的页面输入没有变化，跳过渲染")
+            return output_file
+        
+        logger.info(f"开始生成关于 '{topic}' 的摘要页面")
+        
+        files = []
+        if self.shard_size:
+            files = self._prepare_shards(template_data, articles, os.path.splitext(name)[0])
         
-        # 保存HTML文件
-        output_file = os.path.join(self.output_dir, f"summary_{topic.replace(' ', '_')}.html")
-        self._save_html(html_content, output_file)
+        # 使用模板流式生成HTML并写入文件
+        files = self._render_to_file(template_data, output_file) + files
+        self.manifest.record(name, digest, files)
         
         logger.info(f"摘要页面已保存至: {output_file}")
         return output_file
     
-    def _render_template(self, data: Dict) -> str:
-        """渲染HTML模板"""
-        # 内联模板字符串
-        template_str = '''
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{{ topic }} - 自动生成摘要页面</title>
-    <style>
-        /* 科技主题样式 */
-        :root {
-            --primary-color: #1a73e8;
-            --secondary-color: #34a853;
-            --accent-color: #ea4335;
-            --background-color: #f8f9fa;
-            --card-background: #ffffff;
-            --text-color: #202124;
-            --text-secondary: #5f6368;
-            --border-color: #dadce0;
-            --timeline-color: #e0e0e0;
-        }
-        
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Segoe UI', 'Microsoft YaHei', sans-serif;
-            line-height: 1.6;
-            color: var(--text-color);
-            background-color: var(--background-color);
-        }
-        
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 20px;
-        }
-        
-        header {
-            background: linear-gradient(135deg, var(--primary-color), #3a57e8);
-            color: white;
-            padding: 40px 0;
-            margin-bottom: 30px;
-            border-radius: 12px;
-            box-shadow: 0 4px 20px rgba(0, 0, 0, 0.1);
-        }
-        
-        header h1 {
-            font-size: 2.5rem;
-            margin-bottom: 10px;
-            text-align: center;
-        }
-        
-        header .subtitle {
-            text-align: center;
-            font-size: 1.1rem;
-            opacity: 0.9;
-        }
-        
-        .card {
-            background-color: var(--card-background);
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.05);
-            padding: 30px;
-            margin-bottom: 25px;
-            transition: transform 0.3s ease, box-shadow 0.3s ease;
-        }
-        
-        .card:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 4px 20px rgba(0, 0, 0, 0.1);
-        }
-        
-        .card h2 {
-            color: var(--primary-color);
-            margin-bottom: 20px;
-            font-size: 1.8rem;
-            border-bottom: 2px solid var(--border-color);
-            padding-bottom: 10px;
-        }
-        
-        .card h3 {
-            color: var(--secondary-color);
-            margin: 20px 0 10px;
-            font-size: 1.3rem;
-        }
-        
-        /* 摘要样式 */
-        .summary-content {
-            font-size: 1.1rem;
-            line-height: 1.8;
-            text-align: justify;
-        }
-        
-        /* 实体和主题网格 */
-        .entity-grid, .theme-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fill, minmax(280px, 1fr));
-            gap: 20px;
-            margin-top: 20px;
-        }
-        
-        .entity-card, .theme-card {
-            background-color: rgba(26, 115, 232, 0.05);
-            border-radius: 8px;
-            padding: 15px;
-            border-left: 4px solid var(--primary-color);
-        }
-        
-        .entity-card h4, .theme-card h4 {
-            color: var(--primary-color);
-            margin-bottom: 8px;
-            font-size: 1.1rem;
-        }
-        
-        .entity-card p, .theme-card p {
-            color: var(--text-secondary);
-            font-size: 0.95rem;
-        }
-        
-        .entity-type {
-            display: inline-block;
-            background-color: var(--primary-color);
-            color: white;
-            font-size: 0.8rem;
-            padding: 2px 8px;
-            border-radius: 12px;
-            margin-top: 5px;
-        }
-        
-        /* 时间线样式 */
-        .timeline {
-            position: relative;
-            margin: 20px 0;
-        }
-        
-        .timeline::before {
-            content: '';
-            position: absolute;
-            left: 20px;
-            top: 0;
-            bottom: 0;
-            width: 4px;
-            background-color: var(--timeline-color);
-            border-radius: 2px;
-        }
-        
-        .timeline-item {
-            position: relative;
-            padding-left: 60px;
-            margin-bottom: 25px;
-        }
-        
-        .timeline-item::before {
-            content: '';
-            position: absolute;
-            left: 18px;
-            top: 5px;
-            width: 8px;
-            height: 8px;
-            border-radius: 50%;
-            background-color: var(--primary-color);
-            border: 2px solid var(--primary-color);
-        }
-        
-        .timeline-date {
-            color: var(--primary-color);
-            font-weight: bold;
-            margin-bottom: 5px;
-        }
-        
-        .timeline-event {
-            color: var(--text-color);
-        }
-        
-        /* 文章列表样式 */
-        .article-list {
-            list-style: none;
-        }
-        
-        .article-item {
-            margin-bottom: 20px;
-            padding: 15px;
-            background-color: rgba(52, 168, 83, 0.05);
-            border-radius: 8px;
-            transition: background-color 0.3s ease;
-        }
-        
-        .article-item:hover {
-            background-color: rgba(52, 168, 83, 0.1);
-        }
-        
-        .article-title {
-            font-size: 1.2rem;
-            color: var(--secondary-color);
-            margin-bottom: 8px;
-        }
-        
-        .article-title a {
-            color: var(--secondary-color);
-            text-decoration: none;
-            transition: color 0.3s ease;
-        }
-        
-        .article-title a:hover {
-            color: #277b3e;
-            text-decoration: underline;
-        }
-        
-        .article-meta {
-            font-size: 0.9rem;
-            color: var(--text-secondary);
-            margin-bottom: 10px;
-        }
-        
-        .article-summary {
-            font-size: 0.95rem;
-            color: var(--text-color);
-            line-height: 1.6;
-        }
-        
-        /* 页脚样式 */
-        footer {
-            text-align: center;
-            padding: 20px;
-            color: var(--text-secondary);
-            font-size: 0.9rem;
-            margin-top: 40px;
+    def generate_index_page(self, pages: List[Dict], title: str = "主题目录") -> str:
+        """生成多主题站点的目录页；pages中每项为 {topic, file, summary, articles, entities, themes}"""
+        output_file = os.path.join(self.output_dir, INDEX_PAGE)
+        template_data = {
+            'title': title,
+            'generation_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'topics': pages,
+            'assets': self.assets
         }
+        digest = self._input_digest(template_data)
+        if self.manifest.is_current(INDEX_PAGE, digest):
+            logger.info("主题目录没有变化，跳过渲染")
+            return output_file
         
-        /* 响应式设计 */
-        @media (max-width: 768px) {
-            header h1 {
-                font-size: 2rem;
-            }
-            
-            .card {
-                padding: 20px;
-            }
-            
-            .entity-grid, .theme-grid {
-                grid-template-columns: 1fr;
-            }
-            
-            .timeline::before {
-                left: 15px;
-            }
-            
-            .timeline-item {
-                padding-left: 50px;
-            }
-            
-            .timeline-item::before {
-                left: 13px;
+        files = self._render_to_file(template_data, output_file, INDEX_TEMPLATE)
+        self.manifest.record(INDEX_PAGE, digest, files)
+        logger.info(f"主题目录页已保存至: {output_file}")
+        return output_file
+    
+    def save_manifest(self) -> List[str]:
+        """保存页面清单并把本轮变更的文件追加到变更列表（changes.txt），返回变更的页面文件名"""
+        return self.manifest.save()
+    
+    def _input_digest(self, template_data: Dict, articles: List[Dict] = ()) -> str:
+        """页面输入的哈希：模板源码、除生成时间以外的模板数据（包括静态资源的带哈希路径）以及展示的文章字段"""
+        def parts():
+            yield self._templates_hash()
+            # 预压缩设置变化时需要补写或删除压缩文件
+            yield self.compressed_variants
+            yield self.shard_size
+            yield {key: value for key, value in template_data.items() if key not in ('generation_time', 'articles')}
+            for article in islice(articles, self.article_limit):
+                yield list(shown_fields(article).values())
+        return PageManifest.digest(parts())
+    
+    def _templates_hash(self) -> str:
+        """模板目录中全部模板的哈希，模板之间互相包含，任何一个变化都需要重新渲染"""
+        if self._templates_digest is None:
+            self._templates_digest = PageManifest.digest(
+                [name, self.env.loader.get_source(self.env, name)[0]] for name in sorted(self.env.list_templates())
+            )
+        return self._templates_digest
+    
+    def _prepare_shards(self, template_data: Dict, articles: List[Dict], stem: str) -> List[str]:
+        """写出文章和时间线的JSON分片，并把模板数据改为只内嵌第一页；返回写入的分片文件"""
+        base = f"{DATA_DIR}/{stem}"
+        timeline = template_data['timeline']
+        files = self._write_shards(base, 'articles', articles, len(articles), self._article_item)
+        files += self._write_shards(base, 'timeline', timeline, len(timeline),
+                                    lambda item: {'date': item.get('date'), 'event': item.get('event')})
+        
+        template_data['articles'] = islice(articles, self.shard_size)
+        template_data['timeline'] = timeline[:self.shard_size]
+        template_data['shards'] = {
+            'base': base + "/",
+            'articles': {'total': len(articles), 'next': self._shard_name('articles', 2, len(articles))},
+            'timeline': {'total': len(timeline), 'next': self._shard_name('timeline', 2, len(timeline))}
+        }
+        return files
+    
+    def _shard_name(self, kind: str, page: int, total: int) -> Optional[str]:
+        """第page页分片的文件名，超出总页数时返回None"""
+        pages = max(1, math.ceil(total / self.shard_size))
+        return f"{kind}-{page}.json" if page <= pages else None
+    
+    def _write_shards(self, base: str, kind: str, items: Iterable[Dict], total: int,
+                      to_item: Callable[[Dict], Dict]) -> List[str]:
+        """逐页写出 {kind, page, pages, total, next, items} 分片，并删除上次多出来的分片"""
+        directory = os.path.join(self.output_dir, base)
+        os.makedirs(directory, exist_ok=True)
+        pages = max(1, math.ceil(total / self.shard_size))
+        iterator = iter(items)
+        files = []
+        for page in range(1, pages + 1):
+            payload = {
+                'kind': kind,
+                'page': page,
+                'pages': pages,
+                'total': total,
+                'next': self._shard_name(kind, page + 1, total),
+                'items': [to_item(item) for item in islice(iterator, self.shard_size)]
             }
+            path = os.path.join(directory, self._shard_name(kind, page, total))
+            files += self._write_chunks([json.dumps(payload, ensure_ascii=False, default=str)], path)
+        
+        # 文章减少后，旧的多余分片不再被引用
+        for filename in os.listdir(directory):
+            match = re.match(rf'{kind}-(\d+)\.json', filename)
+            if match and int(match.group(1)) > pages:
+                os.remove(os.path.join(directory, filename))
+        return files
+    
+    def _article_item(self, article: Dict) -> Dict:
+        """分片中的文章条目，只包含页面展示的字段"""
+        return {
+            'url': article.get('url'),
+            'title': article.get('title'),
+            'source': article.get('source'),
+            'published_date': article.get('published_date'),
+            'excerpt': (article.get('content') or '')[:EXCERPT_CHARS]
         }
-        
-        /* 加载动画 */
-        .loading {
-            display: inline-block;
-            width: 20px;
-            height: 20px;
-            border: 3px solid rgba(26, 115, 232, 0.3);
-            border-radius: 50%;
-            border-top-color: var(--primary-color);
-            animation: spin 1s ease-in-out infinite;
-        }
-        
-        @keyframes spin {
-            to { transform: rotate(360deg); }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <header>
-            <h1>{{ topic }}</h1>
-            <p class="subtitle">自动生成的结构化摘要 | 更新时间: {{ generation_time }}</p>
-        </header>
-        
-        <!-- 主摘要部分 -->
-        <section class="card">
-            <h2>内容摘要</h2>
-            <div class="summary-content">
-                {{ summary }}
-            </div>
-        </section>
-        
-        <!-- 关键实体部分 -->
-        <section class="card">
-            <h2>关键实体</h2>
-            <div class="entity-grid">
-                {% for entity in entities %}
-                <div class="entity-card">
-                    <h4>{{ entity.name }}</h4>
-                    <p>{{ entity.description }}</p>
-                    <span class="entity-type">{{ entity.type }}</span>
-                </div>
-                {% endfor %}
-            </div>
-        </section>
-        
-        <!-- 主要主题部分 -->
-        <section class="card">
-            <h2>主要主题</h2>
-            <div class="theme-grid">
-                {% for theme in themes %}
-                <div class="theme-card">
-                    <h4>{{ theme.name }}</h4>
-                    <p>{{ theme.description }}</p>
-                </div>
-                {% endfor %}
-            </div>
-        </section>
-        
-        <!-- 时间线部分 -->
-        <section class="card">
-            <h2>发展时间线</h2>
-            <div class="timeline">
-                {% for item in timeline %}
-                <div class="timeline-item">
-                    <div class="timeline-date">{{ item.date }}</div>
-                    <div class="timeline-event">{{ item.event }}</div>
-                </div>
-                {% endfor %}
-            </div>
-        </section>
-        
-        <!-- 源文章链接部分 -->
-        <section class="card">
-            <h2>参考文章</h2>
-            <ul class="article-list">
-                {% for article in articles %}
-                <li class="article-item">
-                    <h3 class="article-title"><a href="{{ article.url }}" target="_blank">{{ article.title }}</a></h3>
-                    <div class="article-meta">来源: {{ article.source }} | 发布时间: {{ article.published_date }}</div>
-                    <p class="article-summary">{{ article.content[:200] }}...</p>
-                </li>
-                {% endfor %}
-            </ul>
-        </section>
-        
-        <footer>
-            <p>自动生成的摘要页面 | 基于Topic 2项目实现</p>
-        </footer>
-    </div>
-</body>
-</html>
-        '''
-        
-        template = Template(template_str)
-        return template.render(**data)
     
-    def _save_html(self, html_content: str, output_file: str) -> None:
-        """保存HTML内容到文件"""
+    def generate_streaming_page(self, topic: str, stream_file: str, poll_interval: int = 500) -> str:
+        """在分析开始前生成占位页面：摘要部分轮询stream_file（SummaryStream写入的JSON）逐步显示生成中的摘要，
+        流结束后重新加载，届时同一路径已被完整页面覆盖。页面需通过HTTP服务访问，浏览器不允许在file://下轮询。
+        """
+        template_data = {
+            'topic': topic,
+            'generation_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'summary': '',
+            'entities': [],
+            'themes': [],
+            'timeline': [],
+            'articles': [],
+            'stream_url': stream_file,
+            'poll_interval': poll_interval,
+            'assets': self.assets
+        }
+        output_file = os.path.join(self.output_dir, self.page_name(topic))
+        self._render_to_file(template_data, output_file)
+        logger.info(f"流式摘要页面已生成: {output_file}")
+        return output_file
+    
+    def _render_to_file(self, data: Dict, output_file: str, template_name: str = SUMMARY_TEMPLATE) -> List[str]:
+        """流式渲染模板并写入文件，渲染过程中不在内存中拼接整个页面；编译后的模板由环境缓存，多次渲染不会重复编译"""
+        return self._write_chunks(self.env.get_template(template_name).generate(**data), output_file)
+    
+    def _publish_assets(self) -> Dict[str, str]:
+        """把static/中的CSS/JS以内容哈希命名写入输出目录的assets/，返回 资源名 -> 相对路径
+        
+        文件名随内容变化，浏览器和CDN可以长期缓存；已存在的版本不再重写，旧版本保留给尚未更新的页面引用。
+        """
+        os.makedirs(os.path.join(self.output_dir, ASSET_DIR), exist_ok=True)
+        assets = {}
+        for filename in sorted(os.listdir(STATIC_DIR)):
+            with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, ext = os.path.splitext(filename)
+            name = f"{ASSET_DIR}/{stem}.{digest}{ext}"
+            target = os.path.join(self.output_dir, name)
+            if not all(os.path.exists(target + variant) for variant in [''] + self.compressed_variants):
+                files = self._write_chunks([data], target)
+                self.manifest.record(name, digest, files)
+            assets[filename] = name
+        return assets
+    
+    def _write_chunks(self, chunks: Iterable, output_file: str) -> List[str]:
+        """把内容逐块写入同目录下的临时文件，生成预压缩文件后原子替换目标文件，返回写入的文件（相对输出目录的路径）
+        
+        并发读取页面的进程（静态服务、同步任务）只会看到旧文件或完整的新文件；渲染出错时保留旧文件。
+        """
+        directory = os.path.dirname(output_file) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        pending = [(tmp_path, output_file)]
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            logger.info(f"HTML文件已成功保存: {output_file}")
-        except Exception as e:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            self._compress(tmp_path, output_file, pending)
+            # 压缩文件先于原文件替换，原文件出现时对应的压缩版本已经就绪
+            for path, target in reversed(pending):
+                # mkstemp创建的文件只有属主可读，页面需要能被静态服务读取
+                os.chmod(path, 0o644)
+                os.replace(path, target)
+            logger.info(f"文件已成功保存: {output_file}")
+        except BaseException as e:
             logger.error(f"保存HTML文件时出错: {e}")
-            raise
\ No newline at end of file
+            # pending包含所有已创建的临时文件（含压缩到一半的文件）
+            for path, _ in pending:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        
+        # 关闭预压缩或未安装brotli时删除旧的压缩文件，避免静态服务发送过期内容
+        for variant in ('.gz', '.br'):
+            if variant not in self.compressed_variants and os.path.exists(output_file + variant):
+                os.remove(output_file + variant)
+        return [os.path.relpath(target, self.output_dir).replace(os.sep, '/') for _, target in pending]
+    
+    def _compress(self, source_path: str, output_file: str, pending: List[Tuple[str, str]]) -> None:
+        """分块压缩已写好的临时文件；每个压缩临时文件在写入前就登记到调用方的pending（(临时文件, 目标路径)列表），
+        压缩中途出错时调用方可以删除全部临时文件"""
+        directory = os.path.dirname(output_file) or "."
+        for variant in self.compressed_variants:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+            pending.append((tmp_path, output_file + variant))
+            with open(source_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                if variant == '.gz':
+                    # mtime固定为0，相同内容的压缩结果逐字节相同
+                    with gzip.GzipFile(filename='', mode='wb', fileobj=dst, compresslevel=self.GZIP_LEVEL, mtime=0) as gz:
+                        shutil.copyfileobj(src, gz, 64 * 1024)
+                else:
+                    compressor = brotli.Compressor(quality=self.BROTLI_QUALITY)
+                    for block in iter(lambda: src.read(64 * 1024), b''):
+                        dst.write(compressor.process(block))
+                    dst.write(compressor.finish())
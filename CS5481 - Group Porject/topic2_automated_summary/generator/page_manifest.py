@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import List, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+class PageManifest:
+    """记录输出目录中每个页面的输入内容哈希，输入未变化的页面不再重新渲染
+
+    一轮生成结束后调用save()：原子写入manifest.json，并把本轮实际重写的文件（页面、预压缩文件和新的静态资源）
+    追加到changes.txt（每行一个相对路径，可直接用于 rsync --files-from），下游同步只需处理列出的文件。
+    连续或并发的多轮生成（守护进程、HTTP服务）都追加到同一个文件，不会覆盖下游尚未同步的变更；
+    下游先把changes.txt改名（改名是原子的，之后的追加会写入新的changes.txt），按改名后的文件同步完成后再删除它。
+    """
+
+    FILENAME = "manifest.json"
+    CHANGES_FILENAME = "changes.txt"
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self.pages: Dict[str, Dict] = self._load()
+        self.changed: List[str] = []
+        # 守护进程等模式下多个线程共用同一个页面生成器
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('pages', {})
+        except (OSError, ValueError) as e:
+            # 清单损坏时所有页面按已变化处理，重新渲染一遍
+            logger.warning(f"读取页面清单失败: {e}，将重新生成所有页面")
+            return {}
+
+    @staticmethod
+    def digest(parts: Iterable) -> str:
+        """逐项序列化并计算哈希，不在内存中拼接全部输入"""
+        hasher = hashlib.sha256()
+        for part in parts:
+            hasher.update(json.dumps(part, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'))
+            hasher.update(b"\n")
+        return hasher.hexdigest()
+
+    def is_current(self, name: str, digest: str) -> bool:
+        """上次渲染时的输入哈希相同，且页面文件仍是当时写入的文件（未被占位页面等其他内容覆盖）"""
+        entry = self.pages.get(name)
+        if not entry or entry.get('hash') != digest:
+            return False
+        try:
+            stat = os.stat(os.path.join(self.output_dir, name))
+        except OSError:
+            return False
+        return entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+
+    def record(self, name: str, digest: str, files: List[str] = None) -> None:
+        """记录页面已按新的输入重写；files为本次写入的全部文件（页面及其预压缩文件），用于变更列表"""
+        stat = os.stat(os.path.join(self.output_dir, name))
+        self.apply(name, {'hash': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                          'files': files or [name], 'updated_at': time.time()})
+
+    def apply(self, name: str, entry: Dict) -> None:
+        """合并其他进程（如渲染进程池）中记录的页面条目"""
+        with self._lock:
+            self.pages[name] = entry
+            if name not in self.changed:
+                self.changed.append(name)
+
+    def save(self) -> List[str]:
+        """写入清单和本轮的变更列表，返回变更的页面"""
+        with self._lock:
+            self._write(self.path, json.dumps({'pages': self.pages}, ensure_ascii=False, indent=2))
+            self._append_changes("".join(f"{path}\n" for name in self.changed
+                                         for path in self.pages[name].get('files', [name])))
+            changed, self.changed = self.changed, []
+        logger.info(f"页面清单已更新，本轮变更 {len(changed)} 个页面")
+        return changed
+
+    def _append_changes(self, content: str) -> None:
+        """以追加方式写入变更列表，一次write写入整轮的内容，不会与其他进程的追加交错"""
+        if not content:
+            return
+        fd = os.open(os.path.join(self.output_dir, self.CHANGES_FILENAME), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.fchmod(fd, 0o644)
+            os.write(fd, content.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def _write(self, path: str, content: str) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,134 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from itertools import islice
+from typing import List, Dict, Optional, Tuple
+
+from generator.page_generator import PageGenerator, INDEX_PAGE, shown_fields
+
+logger = logging.getLogger(__name__)
+
+# 工作进程中的页面生成器，由进程池的initializer创建，同一进程渲染的所有页面共享已编译的模板
+_worker_generator: Optional[PageGenerator] = None
+
+def _init_worker(options: Dict) -> None:
+    global _worker_generator
+    _worker_generator = PageGenerator(**options)
+
+def _render_page(topic: str, analysis_results: Dict, articles: List[Dict],
+                 index_url: str) -> Tuple[str, str, Optional[Dict], float]:
+    """在工作进程中渲染一个主题页面，返回 (主题, 页面路径, 页面清单条目（未重写时为None）, 耗时)"""
+    start = time.time()
+    generator = _worker_generator
+    output_file = generator.generate_summary_page(analysis_results, articles, topic, index_url=index_url)
+    name = os.path.basename(output_file)
+    entry = generator.manifest.pages.get(name) if name in generator.manifest.changed else None
+    generator.manifest.changed.clear()
+    return topic, output_file, entry, time.time() - start
+
+
+class SiteBuilder:
+    """多主题站点：各主题页面在进程池中渲染，全部完成后生成链接各页面的目录页
+
+    分析完一个主题即可submit()，页面渲染与后续主题的分析重叠进行。工作进程只写页面文件，
+    页面清单条目返回给主进程合并，清单和变更列表由主进程在finish()中统一写出。
+    processes不大于1时在当前进程中直接渲染。
+    """
+
+    SUMMARY_EXCERPT = 120
+
+    def __init__(self, page_generator: PageGenerator, processes: int = None, title: str = "主题目录"):
+        self.generator = page_generator
+        self.processes = processes or os.cpu_count() or 1
+        self.title = title
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: List[Future] = []
+        self._pages: Dict[str, Dict] = {}
+        self._start_time = time.time()
+        self._completed = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "SiteBuilder":
+        self._start_time = time.time()
+        if self.processes > 1:
+            # 使用spawn而不是fork：共享语料模式下进程池创建时其他主题的分析线程可能持有调度器、SQLite或日志的锁，
+            # fork出的子进程会继承这些已被占用的锁而死锁
+            self._executor = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker,
+                                                 initargs=(self.generator.options,),
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=exc_type is not None)
+            self._executor = None
+
+    def submit(self, topic: str, analysis_results: Dict, articles: List[Dict]) -> None:
+        """提交一个主题的页面渲染"""
+        self._pages[topic] = {
+            'topic': topic,
+            'file': self.generator.page_name(topic),
+            'summary': self._excerpt(analysis_results.get('summary', '')),
+            'articles': len(articles),
+            'entities': len(analysis_results.get('entities', [])),
+            'themes': len(analysis_results.get('themes', []))
+        }
+        # 只把页面上展示的字段传给工作进程，文章内容只传摘录，不把整篇正文序列化到每个工作进程
+        analysis = {field: analysis_results.get(field) for field in ('summary', 'entities', 'themes', 'timeline')
+                    if field in analysis_results}
+        shown = [shown_fields(article) for article in islice(articles, self.generator.article_limit)]
+        if self._executor:
+            future = self._executor.submit(_render_page, topic, analysis, shown, INDEX_PAGE)
+        else:
+            future = Future()
+            start = time.time()
+            try:
+                output_file = self.generator.generate_summary_page(analysis, shown, topic, index_url=INDEX_PAGE)
+                future.set_result((topic, output_file, None, time.time() - start))
+            except Exception as e:
+                future.set_exception(e)
+        self._futures.append(future)
+        future.add_done_callback(lambda f, topic=topic: self._report(topic, f))
+
+    def _report(self, topic: str, future: Future) -> None:
+        """每个页面渲染完成时报告进度"""
+        with self._lock:
+            self._completed += 1
+            progress = f"{self._completed}/{len(self._futures)}"
+        if future.exception():
+            logger.error(f"页面渲染失败（{progress}）：'{topic}': {future.exception()}")
+        else:
+            logger.info(f"页面渲染完成（{progress}）：'{topic}' 用时 {future.result()[3]:.2f}秒")
+
+    def finish(self) -> Dict[str, str]:
+        """等待所有页面渲染完成，生成目录页并保存页面清单，返回 主题 -> 页面路径"""
+        output_files = {}
+        total = len(self._futures)
+        render_time = 0.0
+        for future in self._futures:
+            if future.exception():
+                continue
+            topic, output_file, entry, seconds = future.result()
+            if entry:
+                self.generator.manifest.apply(os.path.basename(output_file), entry)
+            output_files[topic] = output_file
+            render_time += seconds
+
+        # 渲染失败的主题不出现在目录中
+        pages = [page for topic, page in self._pages.items() if topic in output_files]
+        self.generator.generate_index_page(pages, title=self.title)
+        changed = self.generator.save_manifest()
+        elapsed = time.time() - self._start_time
+        logger.info(f"站点生成完成：{len(output_files)}/{total} 个主题页面，变更 {len(changed)} 个文件，"
+                    f"{self.processes} 个渲染进程，渲染累计 {render_time:.2f}秒，总耗时 {elapsed:.2f}秒")
+        self._futures = []
+        return output_files
+
+    def _excerpt(self, summary: str) -> str:
+        summary = (summary or '').strip()
+        if len(summary) <= self.SUMMARY_EXCERPT:
+            return summary
+        return summary[:self.SUMMARY_EXCERPT] + "…"
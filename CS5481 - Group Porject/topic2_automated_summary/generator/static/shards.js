@@ -0,0 +1,73 @@
+// 分片加载：文章列表或时间线滚动到末尾时获取下一页JSON分片并追加到列表中
+(function () {
+    function element(tag, className, text) {
+        var node = document.createElement(tag);
+        if (className) {
+            node.className = className;
+        }
+        if (text !== undefined) {
+            node.textContent = text;
+        }
+        return node;
+    }
+
+    var renderers = {
+        articles: function (item) {
+            var li = element('li', 'article-item');
+            var title = element('h3', 'article-title');
+            var link = element('a', null, item.title || '');
+            link.href = item.url || '#';
+            link.target = '_blank';
+            title.appendChild(link);
+            li.appendChild(title);
+            li.appendChild(element('div', 'article-meta', '来源: ' + (item.source || '') + ' | 发布时间: ' + (item.published_date || '')));
+            li.appendChild(element('p', 'article-summary', (item.excerpt || '') + '...'));
+            return li;
+        },
+        timeline: function (item) {
+            var div = element('div', 'timeline-item');
+            div.appendChild(element('div', 'timeline-date', item.date || ''));
+            div.appendChild(element('div', 'timeline-event', item.event || ''));
+            return div;
+        }
+    };
+
+    function attach(list) {
+        var render = renderers[list.getAttribute('data-shard-kind')];
+        var base = list.getAttribute('data-shard-base');
+        var next = list.getAttribute('data-next-shard');
+        var loading = false;
+        var sentinel = element('div', 'shard-sentinel');
+        list.parentNode.insertBefore(sentinel, list.nextSibling);
+
+        var observer = new IntersectionObserver(function (entries) {
+            if (!entries[0].isIntersecting || loading || !next) {
+                return;
+            }
+            loading = true;
+            sentinel.className = 'shard-sentinel loading';
+            fetch(base + next)
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    data.items.forEach(function (item) { list.appendChild(render(item)); });
+                    next = data.next;
+                })
+                .catch(function () { /* 加载失败时等待下一次滚动重试 */ })
+                .then(function () {
+                    loading = false;
+                    sentinel.className = 'shard-sentinel';
+                    if (!next) {
+                        observer.disconnect();
+                        sentinel.parentNode.removeChild(sentinel);
+                    } else {
+                        // 追加后末尾可能仍在可视范围内，重新观察以立即触发下一次检查
+                        observer.unobserve(sentinel);
+                        observer.observe(sentinel);
+                    }
+                });
+        }, {rootMargin: '400px'});
+        observer.observe(sentinel);
+    }
+
+    Array.prototype.forEach.call(document.querySelectorAll('[data-next-shard]'), attach);
+})();
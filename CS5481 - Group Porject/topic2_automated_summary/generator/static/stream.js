@@ -0,0 +1,25 @@
+// 流式摘要页面：轮询SummaryStream写入的JSON文件，生成完成后重新加载完整页面
+(function () {
+    var target = document.getElementById('summary-stream');
+    if (!target) {
+        return;
+    }
+    var url = target.getAttribute('data-stream-url');
+    var interval = parseInt(target.getAttribute('data-poll-interval'), 10) || 500;
+    function poll() {
+        fetch(url + '?t=' + Date.now(), {cache: 'no-store'})
+            .then(function (response) { return response.ok ? response.json() : null; })
+            .then(function (data) {
+                if (data && data.summary) {
+                    target.textContent = data.summary;
+                }
+                if (data && data.status === 'done') {
+                    location.reload();
+                } else if (!data || data.status === 'streaming') {
+                    setTimeout(poll, interval);
+                }
+            })
+            .catch(function () { setTimeout(poll, interval); });
+    }
+    poll();
+})();
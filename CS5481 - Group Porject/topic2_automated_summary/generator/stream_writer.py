@@ -0,0 +1,59 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+class SummaryStream:
+    """把流式生成中的摘要逐步写入JSON文件，供摘要页面轮询显示
+
+    文件内容为 {topic, status, summary, updated_at}，status为streaming、done或failed。
+    每次写入临时文件后原子替换，页面不会读到半个文件；写入按min_interval节流，
+    close()总是写入最终内容。
+    """
+
+    def __init__(self, output_dir: str, topic: str, min_interval: float = 0.2):
+        self.output_dir = output_dir
+        self.topic = topic
+        self.filename = f"stream_{topic.replace(' ', '_')}.json"
+        self.path = os.path.join(output_dir, self.filename)
+        self.min_interval = min_interval
+        self._summary = ""
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        self._write('streaming')
+
+    def update(self, summary: str) -> None:
+        """summary为目前已生成的完整文本（不是增量），重试时会从头开始"""
+        with self._lock:
+            self._summary = summary
+            if time.time() - self._last_write >= self.min_interval:
+                self._write('streaming')
+
+    def close(self, summary: str = None, status: str = 'done') -> None:
+        """写入最终摘要并结束流，页面收到done后重新加载完整页面"""
+        with self._lock:
+            if summary is not None:
+                self._summary = summary
+            self._write(status)
+
+    def _write(self, status: str) -> None:
+        data = {'topic': self.topic, 'status': status, 'summary': self._summary, 'updated_at': time.time()}
+        # 以.开头的临时文件不会被静态服务列出或同步
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            # mkstemp创建的文件只有属主可读，页面轮询的文件需要能被静态服务读取
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # 流式输出只是提前展示，写入失败不影响最终页面的生成
+            logger.warning(f"写入流式摘要失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._last_write = time.time()
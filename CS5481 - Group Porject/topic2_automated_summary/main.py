@@ -1,7 +1,10 @@
 import os
+import json
 import logging
+import asyncio
 import argparse
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Tuple, Callable, Any
 from dotenv import load_dotenv
 import time
 
@@ -23,7 +26,17 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from crawler.base_crawler import CrawlerFactory
 from processor.data_processor import DataProcessor
 from processor.llm_processor import LLMProcessor
-from generator.page_generator import PageGenerator
+from processor.llm_cache import LLMResponseCache
+from processor.request_scheduler import RequestScheduler
+from processor.analysis_state import AnalysisStateStore
+from processor.batch_jobs import BatchJobClient, BatchAnalysisRunner
+from processor.topic_router import TopicRouter
+from processor.run_checkpoint import RunCheckpoint
+from generator.page_generator import PageGenerator, INDEX_PAGE
+from generator.stream_writer import SummaryStream
+from generator.site_builder import SiteBuilder
+from service.refresh_daemon import RefreshDaemon, parse_topic_intervals
+from service.http_service import SummaryService
 
 class AutomatedSummarySystem:
     """自动化摘要系统主类"""
@@ -38,33 +51,119 @@ class AutomatedSummarySystem:
         self.top_n_themes = int(config.get('TOP_N_THEMES', 5))
         self.embedding_model = config.get('EMBEDDING_MODEL', 'text-embedding-ada-002')
         self.api_key = config.get('OPENAI_API_KEY')
+        self.base_url = config.get('OPENAI_BASE_URL')
+        self.llm_max_workers = int(config.get('LLM_MAX_WORKERS', 4))
+        self.llm_call_timeout = float(config.get('LLM_CALL_TIMEOUT', 60))
+        self.summary_mode = config.get('SUMMARY_MODE', 'map_reduce')
+        self.analysis_mode = config.get('ANALYSIS_MODE', 'separate')
+        self.incremental = bool(config.get('INCREMENTAL_ANALYSIS', False))
+        self.retrieval_mode = config.get('RETRIEVAL_MODE', 'embedding')
+        self.stream_summary = bool(config.get('STREAM_SUMMARY', False))
+        # 多主题站点模式的渲染进程数，0表示使用全部CPU核心
+        self.render_processes = int(config.get('SITE_RENDER_PROCESSES', 0)) or None
+        # 启用时每次运行各阶段的输出保存到运行目录，失败后可以从中间阶段继续（默认关闭，
+        # 守护进程和HTTP服务的每次刷新都会写检查点；--resume总是使用运行目录）
+        self.checkpoint_runs = bool(config.get('CHECKPOINT_RUNS', False))
+        self.runs_dir = config.get('RUNS_DIR', './runs')
+        self.runs_keep = int(config.get('RUNS_KEEP', 5))
+        # 共享语料模式下同时分析的主题数
+        self.corpus_workers = int(config.get('CORPUS_ANALYSIS_WORKERS', 4))
+        
+        # 按账户的速率限制调度所有LLM请求
+        self.request_scheduler = RequestScheduler(
+            requests_per_minute=int(config.get('LLM_REQUESTS_PER_MINUTE', 500)),
+            tokens_per_minute=int(config.get('LLM_TOKENS_PER_MINUTE', 200000)),
+            max_concurrency=int(config.get('LLM_MAX_CONCURRENCY', 8))
+        )
+        
+        # LLM响应磁盘缓存，重复运行同一主题时复用已有结果
+        self.llm_cache = LLMResponseCache(
+            cache_dir=config.get('LLM_CACHE_DIR', './cache'),
+            ttl=float(config.get('LLM_CACHE_TTL', 7 * 24 * 3600)),
+            max_bytes=int(float(config.get('LLM_CACHE_MAX_MB', 200)) * 1024 * 1024),
+            bypass=bool(config.get('LLM_CACHE_BYPASS', False))
+        )
+        
+        # 增量分析时按主题保存上一次的分析状态，刷新时只分析新增文章
+        self.state_store = AnalysisStateStore(config.get('STATE_DIR', './state')) if self.incremental else None
         
         # 初始化各个组件
         self.data_processor = DataProcessor(min_text_length=self.min_text_length)
-        self.llm_processor = LLMProcessor(api_key=self.api_key, embedding_model=self.embedding_model)
-        self.page_generator = PageGenerator(output_dir="./output")
+        self.llm_processor = LLMProcessor(
+            api_key=self.api_key,
+            embedding_model=self.embedding_model,
+            max_workers=self.llm_max_workers,
+            call_timeout=self.llm_call_timeout,
+            cache=self.llm_cache,
+            summary_mode=self.summary_mode,
+            scheduler=self.request_scheduler,
+            analysis_mode=self.analysis_mode,
+            base_url=self.base_url,
+            state_store=self.state_store,
+            retrieval_mode=self.retrieval_mode,
+            timeline_max_events=int(config.get('TIMELINE_MAX_EVENTS', 20))
+        )
+        # 编译后的模板字节码缓存在磁盘上，新进程渲染页面时不必重新编译模板
+        self.page_generator = PageGenerator(
+            output_dir="./output",
+            bytecode_cache_dir=config.get('TEMPLATE_CACHE_DIR', './cache/templates'),
+            max_articles=int(config.get('PAGE_MAX_ARTICLES', 10)) or None,
+            precompress=bool(config.get('PRECOMPRESS_PAGES', True)),
+            shard_size=int(config.get('PAGE_SHARD_SIZE', 0))
+        )
     
-    def run(self) -> str:
-        """运行完整的摘要生成流程"""
-        logger.info(f"开始为主题 '{self.topic}' 生成自动摘要")
+    def run(self, topic: str = None, resume: bool = False, run_id: str = None, from_stage: str = None) -> str:
+        """运行完整的摘要生成流程，topic默认为配置的主题
+        
+        显式传入topic时不修改self.topic，多个线程可以用同一个系统实例同时处理不同主题（见守护进程模式）。
+        各阶段的输出保存到运行目录；resume时打开之前的运行目录（run_id，默认为该主题最近一次运行），
+        from_stage之前的阶段直接读取检查点，不再重新爬取和预处理。
+        """
+        topic = topic or self.topic
+        logger.info(f"开始为主题 '{topic}' 生成自动摘要")
         start_time = time.time()
+        checkpoint = self._open_checkpoint(topic, resume or bool(run_id or from_stage), run_id, from_stage)
+        stage = RunCheckpoint.STAGES[0]
+        
+        # 流式模式下先生成占位页面，摘要在生成过程中逐步写入页面轮询的JSON文件
+        stream = None
+        if self.stream_summary:
+            stream = SummaryStream(self.page_generator.output_dir, topic)
+            self.page_generator.generate_streaming_page(topic, stream.filename)
         
         try:
             # 步骤1: 爬取文章
-            articles = self._crawl_articles()
+            articles, _ = self._run_stage(checkpoint, stage, lambda: self._crawl_articles(query=topic))
             
             if not articles:
                 logger.error("未能获取任何文章，程序终止")
+                if stream:
+                    stream.close(status='failed')
                 return None
             
             # 步骤2: 预处理文章
-            processed_articles = self._process_articles(articles)
+            stage = 'process'
+            processed_articles, _ = self._run_stage(checkpoint, stage, lambda: self._process_articles(articles))
             
             # 步骤3: 分析文章
-            analysis_results = self._analyze_articles(processed_articles)
+            stage = 'analyze'
+            # 有任务回退到模拟数据时检查点标记为不完整，继续运行时重新分析而不是复用回退结果
+            analysis_results, reused = self._run_stage(
+                checkpoint, stage,
+                lambda: self._analyze_articles(processed_articles, on_summary_update=stream.update if stream else None,
+                                               topic=topic),
+                is_partial=lambda data: bool(data.get('failed')))
+            if not reused:
+                # 读取检查点时没有发出新的调用，保留上一次运行的用量报告
+                self._save_usage_report(analysis_results.get('usage'), name=topic)
             
             # 步骤4: 生成摘要页面
-            output_file = self._generate_summary_page(analysis_results, processed_articles)
+            stage = 'render'
+            output_file = self._generate_summary_page(analysis_results, processed_articles, topic=topic)
+            if stream:
+                stream.close(analysis_results.get('summary'))
+            if checkpoint:
+                checkpoint.mark_done(output_file)
             
             end_time = time.time()
             logger.info(f"摘要生成完成，总耗时: {end_time - start_time:.2f}秒")
@@ -74,10 +173,195 @@ class AutomatedSummarySystem:
             
         except Exception as e:
             logger.error(f"运行过程中发生错误: {e}", exc_info=True)
+            if checkpoint:
+                checkpoint.mark_failed(stage, str(e))
+                logger.info(f"已完成阶段的结果保存在 {checkpoint.run_dir}，可使用 --resume 从 {stage} 阶段继续")
+            if stream:
+                stream.close(status='failed')
+            return None
+        
+        finally:
+            # 写出页面清单和本轮变更的页面列表，供下游同步使用
+            self.page_generator.save_manifest()
+    
+    def _open_checkpoint(self, topic: str, resume: bool, run_id: str = None,
+                         from_stage: str = None) -> Optional[RunCheckpoint]:
+        """继续之前的运行目录，或为本次运行新建运行目录；未启用检查点且不是继续运行时返回None"""
+        if resume:
+            checkpoint = RunCheckpoint.resume(self.runs_dir, topic, run_id=run_id, from_stage=from_stage)
+            if checkpoint:
+                return checkpoint
+        if not (self.checkpoint_runs or resume):
             return None
+        return RunCheckpoint.create(self.runs_dir, topic, keep=self.runs_keep)
+    
+    def _run_stage(self, checkpoint: Optional[RunCheckpoint], stage: str, compute,
+                   is_partial: Callable[[Any], bool] = None) -> Tuple[Any, bool]:
+        """有可用的检查点时直接读取，否则计算该阶段并保存检查点，返回 (阶段输出, 是否读取自检查点)
+        
+        is_partial(data)为真时检查点标记为不完整，继续运行时该阶段会重新计算。
+        """
+        if checkpoint and checkpoint.reusable(stage):
+            data = checkpoint.load(stage)
+            if data is not None:
+                logger.info(f"{stage} 阶段使用检查点，跳过计算")
+                return data, True
+        data = compute()
+        if checkpoint and data:
+            partial = bool(is_partial and is_partial(data))
+            if partial:
+                logger.warning(f"{stage} 阶段的结果不完整，检查点已标记，使用 --resume 继续时会重新计算该阶段")
+            checkpoint.save(stage, data, partial=partial)
+        return data, False
+    
+    def run_batch(self, topics: List[str]) -> Dict[str, str]:
+        """离线批处理模式：逐个主题爬取和预处理，所有主题的LLM请求合并为批处理任务提交，最后生成各主题的页面"""
+        logger.info(f"开始批处理 {len(topics)} 个主题: {topics}")
+        start_time = time.time()
+        
+        corpora = {}
+        for topic in topics:
+            self.topic = topic
+            articles = self._crawl_articles()
+            if not articles:
+                logger.error(f"主题 '{topic}' 未能获取任何文章，已跳过")
+                continue
+            corpora[topic] = self._process_articles(articles)
+        
+        if self.llm_processor.client:
+            runner = BatchAnalysisRunner(
+                self.llm_processor,
+                BatchJobClient(
+                    self.llm_processor.client,
+                    job_dir=self.config.get('BATCH_JOB_DIR', './batch_jobs'),
+                    poll_interval=float(self.config.get('BATCH_POLL_INTERVAL', 30))
+                )
+            )
+            results = runner.analyze(corpora, top_n_entities=self.top_n_entities, top_n_themes=self.top_n_themes)
+            self._save_usage_report(runner.usage_report(), name='batch')
+        else:
+            # 没有API密钥时批处理没有意义，直接逐个主题分析（使用模拟数据）
+            results = {}
+            for topic, articles in corpora.items():
+                self.topic = topic
+                results[topic] = self._analyze_articles(articles)
+        
+        with SiteBuilder(self.page_generator, processes=self.render_processes) as site:
+            for topic, analysis_results in results.items():
+                self.topic = topic
+                self._save_usage_report(analysis_results.get('usage'))
+                site.submit(topic, analysis_results, corpora[topic])
+            output_files = site.finish()
+        
+        logger.info(f"批处理完成，总耗时: {time.time() - start_time:.2f}秒")
+        return output_files
+    
+    def run_site(self, topics: List[str]) -> Dict[str, str]:
+        """多主题站点模式：在同一进程中逐个主题爬取和分析，页面在进程池中渲染（与后续主题的分析重叠），最后生成目录页"""
+        logger.info(f"开始生成 {len(topics)} 个主题的站点: {topics}")
+        start_time = time.time()
+        timings = {'crawl': 0.0, 'process': 0.0, 'analyze': 0.0}
+        
+        with SiteBuilder(self.page_generator, processes=self.render_processes) as site:
+            for i, topic in enumerate(topics, 1):
+                self.topic = topic
+                try:
+                    stage_start = time.time()
+                    articles = self._crawl_articles()
+                    timings['crawl'] += time.time() - stage_start
+                    if not articles:
+                        logger.error(f"[{i}/{len(topics)}] 主题 '{topic}' 未能获取任何文章，已跳过")
+                        continue
+                    
+                    stage_start = time.time()
+                    processed_articles = self._process_articles(articles)
+                    timings['process'] += time.time() - stage_start
+                    
+                    stage_start = time.time()
+                    analysis_results = self._analyze_articles(processed_articles)
+                    timings['analyze'] += time.time() - stage_start
+                    self._save_usage_report(analysis_results.get('usage'))
+                except Exception as e:
+                    logger.error(f"[{i}/{len(topics)}] 主题 '{topic}' 处理失败: {e}", exc_info=True)
+                    continue
+                
+                site.submit(topic, analysis_results, processed_articles)
+                logger.info(f"[{i}/{len(topics)}] 主题 '{topic}' 分析完成，已提交页面渲染，"
+                            f"累计耗时 {time.time() - start_time:.2f}秒")
+            
+            stage_start = time.time()
+            output_files = site.finish()
+            # 页面渲染与分析重叠进行，这里只统计分析全部结束后等待渲染和生成目录页的时间
+            timings['render_wait'] = time.time() - stage_start
+        
+        logger.info(f"站点生成完成：{len(output_files)}/{len(topics)} 个主题，总耗时 {time.time() - start_time:.2f}秒，"
+                    + "，".join(f"{stage} {seconds:.2f}秒" for stage, seconds in timings.items()))
+        return output_files
+    
+    def run_corpus(self, topics: List[str]) -> Dict[str, str]:
+        """共享语料模式：所有主题只爬取和预处理一次，按相关度把文章分配给各主题，再并发分析各主题并在进程池中渲染页面
+        
+        各来源只以合并的搜索词（CORPUS_QUERY，默认把各主题用OR连接）爬取一次，抓取次数随不重复的文章数增长，
+        而不是随 主题数 × 来源数 增长。相关主题（如“AI监管”和“大语言模型”）重叠的文章只抓取、预处理一次。
+        """
+        logger.info(f"开始以共享语料生成 {len(topics)} 个主题的站点: {topics}")
+        start_time = time.time()
+        timings = {}
+        
+        stage_start = time.time()
+        query = self.config.get('CORPUS_QUERY') or " OR ".join(topics)
+        max_articles = int(self.config.get('CORPUS_MAX_ARTICLES_PER_SOURCE', 0)) or self.max_articles_per_source * len(topics)
+        articles = list({article.get('url') or article.get('title', ''): article
+                         for article in self._crawl_articles(query=query, max_articles=max_articles)}.values())
+        timings['crawl'] = time.time() - stage_start
+        if not articles:
+            logger.error("未能获取任何文章，程序终止")
+            return {}
+        
+        stage_start = time.time()
+        corpus = self._process_articles(articles)
+        router = TopicRouter(
+            embed=self.llm_processor.embedder(),
+            keyword_weight=float(self.config.get('CORPUS_KEYWORD_WEIGHT', 0.6)),
+            threshold=float(self.config.get('CORPUS_ROUTE_THRESHOLD', 0.3)),
+            max_articles=self.max_articles_per_source * len(self.news_sources)
+        )
+        corpora = router.route(corpus, topics)
+        timings['process'] = time.time() - stage_start
+        
+        # 各主题的分析共用LLM处理器（调度器、缓存和速率限制）；每次分析的调用带有独立的用量标签，
+        # 各主题的用量报告只包含自己的调用，整轮的报告另外保存（含文章路由的嵌入请求）
+        usage_mark = self.llm_processor.usage.mark()
+        stage_start = time.time()
+        with SiteBuilder(self.page_generator, processes=self.render_processes) as site, \
+                ThreadPoolExecutor(max_workers=max(1, self.corpus_workers)) as executor:
+            futures = {executor.submit(self._analyze_articles, corpora[topic], topic=topic): topic
+                       for topic in topics if corpora.get(topic)}
+            for i, future in enumerate(as_completed(futures), 1):
+                topic = futures[future]
+                try:
+                    analysis_results = future.result()
+                except Exception as e:
+                    logger.error(f"[{i}/{len(futures)}] 主题 '{topic}' 分析失败: {e}", exc_info=True)
+                    continue
+                self._save_usage_report(analysis_results.get('usage'), name=topic)
+                site.submit(topic, analysis_results, corpora[topic])
+                logger.info(f"[{i}/{len(futures)}] 主题 '{topic}' 分析完成，已提交页面渲染，"
+                            f"累计耗时 {time.time() - start_time:.2f}秒")
+            timings['analyze'] = time.time() - stage_start
+            
+            stage_start = time.time()
+            output_files = site.finish()
+            timings['render_wait'] = time.time() - stage_start
+        self._save_usage_report(self.llm_processor.usage.report(since=usage_mark), name='corpus')
+        
+        logger.info(f"共享语料站点生成完成：{len(output_files)}/{len(topics)} 个主题，{len(corpus)} 篇不重复文章，"
+                    f"总耗时 {time.time() - start_time:.2f}秒，"
+                    + "，".join(f"{stage} {seconds:.2f}秒" for stage, seconds in timings.items()))
+        return output_files
     
-    def _crawl_articles(self) -> List[Dict]:
-        """爬取所有来源的文章"""
+    def _crawl_articles(self, query: str = None, max_articles: int = None) -> List[Dict]:
+        """爬取所有来源的文章，默认以当前主题为搜索词"""
         all_articles = []
         
         for source in self.news_sources:
@@ -87,8 +371,8 @@ class AutomatedSummarySystem:
                 # 创建对应的爬虫实例
                 crawler = CrawlerFactory.create_crawler(
                     source=source,
-                    topic=self.topic,
-                    max_articles=self.max_articles_per_source
+                    topic=query or self.topic,
+                    max_articles=max_articles or self.max_articles_per_source
                 )
                 
                 # 执行爬取
@@ -125,24 +409,36 @@ class AutomatedSummarySystem:
         
         return sorted_articles
     
-    def _analyze_articles(self, articles: List[Dict]) -> Dict:
-        """分析文章内容"""
+    def _analyze_articles(self, articles: List[Dict], on_summary_update=None, topic: str = None) -> Dict:
+        """分析文章内容，topic默认为当前主题（决定增量分析状态的键）"""
         # 使用LLM处理器分析文章
         analysis_results = self.llm_processor.analyze_articles(
             articles,
             top_n_entities=self.top_n_entities,
-            top_n_themes=self.top_n_themes
+            top_n_themes=self.top_n_themes,
+            state_key=topic or self.topic,
+            on_summary_update=on_summary_update
         )
         
         return analysis_results
     
-    def _generate_summary_page(self, analysis_results: Dict, articles: List[Dict]) -> str:
+    def _save_usage_report(self, usage: Dict, name: str = None) -> None:
+        """保存本次运行的LLM调用用量报告（token、耗时、重试和估算费用），默认以主题命名"""
+        if not usage:
+            return
+        os.makedirs("./reports", exist_ok=True)
+        report_file = os.path.join("./reports", f"usage_{(name or self.topic).replace(' ', '_')}.json")
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(usage, f, ensure_ascii=False, indent=2)
+        logger.info(f"LLM用量报告已保存至: {report_file}")
+    
+    def _generate_summary_page(self, analysis_results: Dict, articles: List[Dict], topic: str = None) -> str:
         """生成摘要页面"""
         # 生成HTML摘要页面
         output_file = self.page_generator.generate_summary_page(
             analysis_results=analysis_results,
             articles=articles,
-            topic=self.topic
+            topic=topic or self.topic
         )
         
         return output_file
@@ -161,7 +457,48 @@ def load_config() -> Dict:
         'EMBEDDING_MODEL': os.getenv('EMBEDDING_MODEL', 'text-embedding-ada-002'),
         'TOP_N_ENTITIES': os.getenv('TOP_N_ENTITIES', '10'),
         'TOP_N_THEMES': os.getenv('TOP_N_THEMES', '5'),
-        'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY')
+        'LLM_MAX_WORKERS': os.getenv('LLM_MAX_WORKERS', '4'),
+        'LLM_CALL_TIMEOUT': os.getenv('LLM_CALL_TIMEOUT', '60'),
+        'SUMMARY_MODE': os.getenv('SUMMARY_MODE', 'map_reduce'),
+        'ANALYSIS_MODE': os.getenv('ANALYSIS_MODE', 'separate'),
+        'RETRIEVAL_MODE': os.getenv('RETRIEVAL_MODE', 'embedding'),
+        'LLM_REQUESTS_PER_MINUTE': os.getenv('LLM_REQUESTS_PER_MINUTE', '500'),
+        'LLM_TOKENS_PER_MINUTE': os.getenv('LLM_TOKENS_PER_MINUTE', '200000'),
+        'LLM_MAX_CONCURRENCY': os.getenv('LLM_MAX_CONCURRENCY', '8'),
+        'LLM_CACHE_DIR': os.getenv('LLM_CACHE_DIR', './cache'),
+        'LLM_CACHE_TTL': os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)),
+        'LLM_CACHE_MAX_MB': os.getenv('LLM_CACHE_MAX_MB', '200'),
+        'LLM_CACHE_BYPASS': os.getenv('LLM_CACHE_BYPASS', '').lower() in ('1', 'true', 'yes'),
+        'INCREMENTAL_ANALYSIS': os.getenv('INCREMENTAL_ANALYSIS', '').lower() in ('1', 'true', 'yes'),
+        'STATE_DIR': os.getenv('STATE_DIR', './state'),
+        'BATCH_JOB_DIR': os.getenv('BATCH_JOB_DIR', './batch_jobs'),
+        'BATCH_POLL_INTERVAL': os.getenv('BATCH_POLL_INTERVAL', '30'),
+        'TEMPLATE_CACHE_DIR': os.getenv('TEMPLATE_CACHE_DIR', './cache/templates'),
+        'PAGE_MAX_ARTICLES': os.getenv('PAGE_MAX_ARTICLES', '10'),
+        'PAGE_SHARD_SIZE': os.getenv('PAGE_SHARD_SIZE', '0'),
+        'TIMELINE_MAX_EVENTS': os.getenv('TIMELINE_MAX_EVENTS', '20'),
+        'PRECOMPRESS_PAGES': os.getenv('PRECOMPRESS_PAGES', 'true').lower() in ('1', 'true', 'yes'),
+        'SITE_RENDER_PROCESSES': os.getenv('SITE_RENDER_PROCESSES', '0'),
+        'CORPUS_QUERY': os.getenv('CORPUS_QUERY', ''),
+        'CORPUS_MAX_ARTICLES_PER_SOURCE': os.getenv('CORPUS_MAX_ARTICLES_PER_SOURCE', '0'),
+        'CORPUS_KEYWORD_WEIGHT': os.getenv('CORPUS_KEYWORD_WEIGHT', '0.6'),
+        'CORPUS_ROUTE_THRESHOLD': os.getenv('CORPUS_ROUTE_THRESHOLD', '0.3'),
+        'CORPUS_ANALYSIS_WORKERS': os.getenv('CORPUS_ANALYSIS_WORKERS', '4'),
+        'DAEMON_TOPICS': os.getenv('DAEMON_TOPICS', ''),
+        'DAEMON_INTERVAL': os.getenv('DAEMON_INTERVAL', '3600'),
+        'DAEMON_JITTER': os.getenv('DAEMON_JITTER', '0.1'),
+        'DAEMON_WORKERS': os.getenv('DAEMON_WORKERS', '2'),
+        'DAEMON_STATE_FILE': os.getenv('DAEMON_STATE_FILE', './state/daemon.json'),
+        'SERVICE_HOST': os.getenv('SERVICE_HOST', '127.0.0.1'),
+        'SERVICE_PORT': os.getenv('SERVICE_PORT', '8080'),
+        'SERVICE_FRESHNESS': os.getenv('SERVICE_FRESHNESS', '600'),
+        'SERVICE_MAX_CONCURRENT': os.getenv('SERVICE_MAX_CONCURRENT', '2'),
+        'CHECKPOINT_RUNS': os.getenv('CHECKPOINT_RUNS', '').lower() in ('1', 'true', 'yes'),
+        'RUNS_DIR': os.getenv('RUNS_DIR', './runs'),
+        'RUNS_KEEP': os.getenv('RUNS_KEEP', '5'),
+        'STREAM_SUMMARY': os.getenv('STREAM_SUMMARY', '').lower() in ('1', 'true', 'yes'),
+        'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY'),
+        'OPENAI_BASE_URL': os.getenv('OPENAI_BASE_URL')
     }
     
     return config
@@ -172,6 +509,19 @@ def main():
     parser = argparse.ArgumentParser(description='自动化主题摘要生成系统')
     parser.add_argument('--topic', type=str, help='要分析的事件主题')
     parser.add_argument('--output', type=str, help='输出目录')
+    parser.add_argument('--bypass-cache', action='store_true', help='不读取LLM响应缓存（仍会写入最新结果）')
+    parser.add_argument('--incremental', action='store_true', help='增量分析：只分析上次运行之后新增的文章并合并结果')
+    parser.add_argument('--batch-topics', type=str, help='离线批处理多个主题（用逗号分隔），LLM请求通过批处理接口提交')
+    parser.add_argument('--topics', type=str, help='多主题站点模式：处理多个主题（用逗号分隔），并行渲染页面并生成目录页')
+    parser.add_argument('--shared-corpus', action='store_true', help='与--topics一起使用：各主题共享一次爬取的语料，按相关度分配文章并并发分析')
+    parser.add_argument('--daemon', action='store_true', help='守护进程模式：常驻运行，按各主题的刷新间隔反复生成摘要（主题取自--topics或DAEMON_TOPICS）')
+    parser.add_argument('--serve', action='store_true', help='HTTP服务模式：按需生成主题摘要，同一主题的并发请求合并为一次运行')
+    parser.add_argument('--checkpoint', action='store_true', help='保存本次运行各阶段的检查点，失败后可以用--resume继续')
+    parser.add_argument('--resume', nargs='?', const='', default=None, metavar='RUN_ID',
+                        help='从之前的运行目录继续（默认为该主题最近一次运行），已有检查点的阶段直接读取')
+    parser.add_argument('--from-stage', choices=RunCheckpoint.STAGES,
+                        help='与--resume一起使用：从指定阶段开始重新计算，之前的阶段读取检查点')
+    parser.add_argument('--stream', action='store_true', help='流式生成摘要：先生成占位页面，摘要在生成过程中逐步显示')
     args = parser.parse_args()
     
     # 加载配置
@@ -180,10 +530,59 @@ def main():
     # 如果命令行提供了主题，覆盖配置
     if args.topic:
         config['EVENT_TOPIC'] = args.topic
+    if args.bypass_cache:
+        config['LLM_CACHE_BYPASS'] = True
+    if args.incremental:
+        config['INCREMENTAL_ANALYSIS'] = True
+    if args.stream:
+        config['STREAM_SUMMARY'] = True
+    if args.checkpoint:
+        config['CHECKPOINT_RUNS'] = True
+    if args.batch_topics and config['LLM_CACHE_BYPASS']:
+        # 批处理结果写入缓存后由最后一轮从缓存读取，不读取缓存时无法取回结果
+        parser.error("--batch-topics 需要读取LLM响应缓存，不能与 --bypass-cache（或 LLM_CACHE_BYPASS=true）同时使用")
     
     # 创建并运行系统
     system = AutomatedSummarySystem(config)
-    output_file = system.run()
+    
+    if args.serve:
+        service = SummaryService(
+            system,
+            host=config['SERVICE_HOST'],
+            port=int(config['SERVICE_PORT']),
+            freshness=float(config['SERVICE_FRESHNESS']),
+            max_concurrent=int(config['SERVICE_MAX_CONCURRENT'])
+        )
+        asyncio.run(service.serve_forever())
+        return
+    
+    if args.daemon:
+        spec = args.topics or config['DAEMON_TOPICS'] or config['EVENT_TOPIC']
+        daemon = RefreshDaemon(
+            system,
+            parse_topic_intervals(spec, float(config['DAEMON_INTERVAL'])),
+            jitter=float(config['DAEMON_JITTER']),
+            max_workers=int(config['DAEMON_WORKERS']),
+            state_file=config['DAEMON_STATE_FILE']
+        )
+        daemon.run()
+        return
+    
+    if args.batch_topics:
+        topics = [topic.strip() for topic in args.batch_topics.split(',') if topic.strip()]
+        for topic, output_file in system.run_batch(topics).items():
+            print(f"[{topic}] 摘要页面已生成: {os.path.abspath(output_file)}")
+        return
+    
+    if args.topics:
+        topics = [topic.strip() for topic in args.topics.split(',') if topic.strip()]
+        output_files = system.run_corpus(topics) if args.shared_corpus else system.run_site(topics)
+        for topic, output_file in output_files.items():
+            print(f"[{topic}] 摘要页面已生成: {os.path.abspath(output_file)}")
+        print(f"主题目录页: {os.path.abspath(os.path.join(system.page_generator.output_dir, INDEX_PAGE))}")
+        return
+    
+    output_file = system.run(resume=args.resume is not None, run_id=args.resume or None, from_stage=args.from_stage)
     
     if output_file:
         print(f"摘要页面已成功生成: {os.path.abspath(output_file)}")
@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class AnalysisStateStore:
+    """按主题持久化上一次的分析状态（实体、主题、时间线、摘要以及已分析文章的指纹），供增量分析使用"""
+
+    VERSION = 1
+
+    def __init__(self, state_dir: str = "./state"):
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.state_dir, f"analysis_{name}.json")
+
+    def load(self, key: str) -> Optional[Dict]:
+        """读取状态；文件不存在、损坏或版本不符时返回None，调用方退化为全量分析"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取分析状态失败: {e}，将进行全量分析")
+            return None
+        if state.get('version') != self.VERSION:
+            return None
+        return state
+
+    def save(self, key: str, state: Dict) -> None:
+        """写入临时文件后原子替换，避免中断时留下半个状态文件"""
+        state = dict(state, version=self.VERSION, key=key, updated_at=time.time())
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, indent=2, default=str)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def clear(self, key: str) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def article_key(article: Dict) -> str:
+        """文章的稳定标识：优先使用URL，没有URL时使用标题"""
+        return article.get('url') or article.get('id') or article.get('title', '')
+
+    @staticmethod
+    def fingerprint(article: Dict) -> str:
+        """文章内容指纹，同一URL的内容被更新时视为新文章"""
+        payload = f"{article.get('title', '')}\n{article.get('content', '')}"
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def split_delta(self, articles: List[Dict], state: Dict) -> Tuple[List[Dict], Dict[str, str]]:
+        """返回 (未分析过的文章, 全部文章的指纹表)"""
+        seen = state.get('articles', {}) if state else {}
+        fingerprints = {}
+        delta = []
+        for article in articles:
+            key = self.article_key(article)
+            fingerprint = self.fingerprint(article)
+            fingerprints[key] = fingerprint
+            if seen.get(key) != fingerprint:
+                delta.append(article)
+        return delta, fingerprints
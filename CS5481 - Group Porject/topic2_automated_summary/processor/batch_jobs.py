@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import logging
+from typing import List, Dict, Callable
+
+logger = logging.getLogger(__name__)
+
+class DeferredRequest(Exception):
+    """收集模式下缓存未命中的请求：请求已被记录，留待批处理任务统一提交"""
+
+
+class BatchJobClient:
+    """通过批处理接口执行一组对话补全请求
+
+    请求写成JSONL任务文件上传，创建批处理任务后轮询直到结束，再下载输出文件，
+    返回每个请求的输出文本和用量。任务文件和输出文件都保存在job_dir中便于排查。
+    """
+
+    TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+    # 批处理接口单个任务文件的请求数上限
+    MAX_REQUESTS_PER_JOB = 50000
+
+    def __init__(self, client, job_dir: str = "./batch_jobs", poll_interval: float = 30.0,
+                 timeout: float = 24 * 3600, completion_window: str = "24h"):
+        self.client = client
+        self.job_dir = job_dir
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.completion_window = completion_window
+        os.makedirs(job_dir, exist_ok=True)
+
+    def run(self, requests: Dict[str, Dict]) -> Dict[str, Dict]:
+        """提交请求（custom_id -> {'model', 'messages', 'params'}），返回 custom_id -> {'content', 'usage'}；失败的请求不出现在结果中"""
+        ids = list(requests)
+        results = {}
+        for start in range(0, len(ids), self.MAX_REQUESTS_PER_JOB):
+            batch_ids = ids[start:start + self.MAX_REQUESTS_PER_JOB]
+            results.update(self._run_job({custom_id: requests[custom_id] for custom_id in batch_ids}))
+        return results
+
+    def _run_job(self, requests: Dict[str, Dict]) -> Dict[str, Dict]:
+        input_path = self._write_job_file(requests)
+        with open(input_path, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint="/v1/chat/completions",
+                                           completion_window=self.completion_window)
+        logger.info(f"批处理任务 {batch.id} 已提交，共 {len(requests)} 个请求")
+
+        batch = self._wait(batch.id)
+        if batch.status != 'completed':
+            logger.error(f"批处理任务 {batch.id} 未完成，状态: {batch.status}")
+        if not batch.output_file_id:
+            return {}
+
+        output = self.client.files.content(batch.output_file_id).text
+        with open(input_path.replace('_input.jsonl', '_output.jsonl'), 'w', encoding='utf-8') as f:
+            f.write(output)
+        return self._parse_output(output)
+
+    def _write_job_file(self, requests: Dict[str, Dict]) -> str:
+        """每个请求写成一行 {custom_id, method, url, body}"""
+        path = os.path.join(self.job_dir, f"job_{time.strftime('%Y%m%d_%H%M%S')}_{len(requests)}_input.jsonl")
+        with open(path, 'w', encoding='utf-8') as f:
+            for custom_id, request in requests.items():
+                body = dict(request.get('params', {}), model=request['model'], messages=request['messages'])
+                f.write(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': '/v1/chat/completions',
+                                    'body': body}, ensure_ascii=False) + "\n")
+        return path
+
+    def _wait(self, batch_id: str):
+        """轮询任务状态直到结束或超时"""
+        deadline = time.time() + self.timeout
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status in self.TERMINAL_STATUSES:
+                counts = getattr(batch, 'request_counts', None)
+                if counts:
+                    logger.info(f"批处理任务 {batch_id} 结束：完成 {counts.completed}，失败 {counts.failed}")
+                return batch
+            if time.time() >= deadline:
+                logger.warning(f"批处理任务 {batch_id} 等待超时，取消任务")
+                return self.client.batches.cancel(batch_id)
+            time.sleep(self.poll_interval)
+
+    def _parse_output(self, output: str) -> Dict[str, Dict]:
+        results = {}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get('response') or {}
+            if item.get('error') or response.get('status_code') != 200:
+                logger.warning(f"批处理请求 {item.get('custom_id')} 失败: {item.get('error') or response.get('body')}")
+                continue
+            body = response.get('body') or {}
+            try:
+                content = body['choices'][0]['message']['content']
+            except (KeyError, IndexError, TypeError):
+                continue
+            results[item['custom_id']] = {'content': content, 'usage': body.get('usage') or {}}
+        return results
+
+
+class BatchAnalysisRunner:
+    """多主题离线批处理分析
+
+    分析流程中有前后依赖的请求（如map-reduce先摘要各块再合并），无法一次性列出全部提示。
+    因此按轮执行：每轮在收集模式下对所有主题运行一遍分析，缓存未命中的请求只被记录，
+    汇总后作为一个批处理任务提交，结果写回响应缓存；直到某一轮没有新的请求，
+    最后正常运行一遍分析，此时所有请求都由缓存满足。
+    """
+
+    def __init__(self, processor, job_client: BatchJobClient, max_rounds: int = 6):
+        if processor.cache is None or processor.cache.bypass:
+            raise ValueError("批处理模式需要启用LLM响应缓存（且不能忽略缓存）")
+        self.processor = processor
+        self.job_client = job_client
+        self.max_rounds = max_rounds
+        self._usage_mark = processor.usage.mark()
+
+    def analyze(self, corpora: Dict[str, List[Dict]], top_n_entities: int = 10, top_n_themes: int = 5,
+                on_result: Callable[[str, Dict], None] = None) -> Dict[str, Dict]:
+        """corpora为 主题 -> 预处理后的文章，返回 主题 -> analysis_results"""
+        self._usage_mark = self.processor.usage.mark()
+        for round_number in range(1, self.max_rounds + 1):
+            with self.processor.collect_requests() as pending:
+                for topic, articles in corpora.items():
+                    self.processor.analyze_articles(articles, top_n_entities=top_n_entities,
+                                                    top_n_themes=top_n_themes, state_key=topic)
+            if not pending:
+                break
+
+            logger.info(f"批处理第 {round_number} 轮：{len(corpora)} 个主题共 {len(pending)} 个待处理请求")
+            results = self.job_client.run(pending)
+            for key, item in results.items():
+                request = pending[key]
+                usage = item['usage']
+                self.processor.cache.set(key, item['content'])
+                self.processor.usage.record(request['purpose'], request['model'], usage.get('prompt_tokens', 0),
+                                            usage.get('completion_tokens', 0), 0.0, batch=True)
+            if len(results) < len(pending):
+                # 失败的请求在最后一轮中按普通方式同步请求
+                logger.warning(f"{len(pending) - len(results)} 个批处理请求失败，将在最终分析时同步重试")
+                break
+        else:
+            logger.warning(f"批处理达到最大轮数 {self.max_rounds}，剩余请求将同步执行")
+
+        analysis = {}
+        for topic, articles in corpora.items():
+            analysis[topic] = self.processor.analyze_articles(articles, top_n_entities=top_n_entities,
+                                                              top_n_themes=top_n_themes, state_key=topic)
+            if on_result:
+                on_result(topic, analysis[topic])
+        return analysis
+
+    def usage_report(self) -> Dict:
+        """最近一次analyze的全部调用用量，包括批处理请求和最终轮中的同步请求"""
+        return self.processor.usage.report(since=self._usage_mark)
@@ -62,7 +62,8 @@ class DataProcessor:
             
             # 分词
             processed['tokens'] = self._tokenize(processed['cleaned_content'])
-            processed['sentences'] = sent_tokenize(processed['cleaned_content'])
+            # 清洗后的文本已去掉标点，句子需要从原文中切分
+            processed['sentences'] = self._split_sentences(article['content'])
             
             # 提取关键词（基于词频）
             processed['keywords'] = self._extract_keywords(processed['tokens'], top_n=10)
@@ -95,6 +96,17 @@ class DataProcessor:
         
         return text.strip()
     
+    def _split_sentences(self, text: str) -> List[str]:
+        """切分句子，同时支持中文句末标点"""
+        text = re.sub(r'<[^>]+>', '', text)
+        sentences = []
+        for paragraph in re.split(r'\n+', text):
+            for part in re.split(r'(?<=[。！？；])', paragraph):
+                part = part.strip()
+                if part:
+                    sentences.extend(sent_tokenize(part))
+        return sentences
+    
     def _tokenize(self, text: str) -> List[str]:
         """分词"""
         tokens = word_tokenize(text)
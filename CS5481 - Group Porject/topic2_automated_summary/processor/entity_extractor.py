@@ -0,0 +1,138 @@
+import re
+import math
+import logging
+from collections import Counter
+from typing import List, Dict, Set
+
+logger = logging.getLogger(__name__)
+
+class EntityCandidateExtractor:
+    """本地实体候选提取器，在调用LLM之前对全部文章做一次纯CPU的实体预筛选"""
+
+    # 英文：连续的首字母大写单词（允许中间夹带of/for/and/the等连接词），覆盖"Google DeepMind"、"GPT-4"等
+    EN_PATTERN = re.compile(r"\b[A-Z][A-Za-z0-9\-&']*(?:\s+(?:(?:of|for|and|the|de)\s+)?[A-Z][A-Za-z0-9\-&']*)*")
+    # 中文：书名号内的名称，以及连续的汉字片段（用于统计n-gram）
+    TITLE_PATTERN = re.compile(r"《([^《》]{1,30})》")
+    CJK_PATTERN = re.compile(r"[\u4e00-\u9fa5]{2,}")
+
+    # 句首常见的大写虚词，不应单独作为实体
+    EN_STOP_WORDS = {
+        'The', 'A', 'An', 'In', 'On', 'At', 'By', 'For', 'From', 'To', 'Of', 'And', 'But', 'Or',
+        'This', 'That', 'These', 'Those', 'It', 'Its', 'He', 'She', 'They', 'We', 'I', 'You',
+        'His', 'Her', 'Their', 'Our', 'As', 'After', 'Before', 'If', 'When', 'While', 'With',
+        'According', 'However', 'Meanwhile', 'Mr', 'Mrs', 'Ms', 'Dr'
+    }
+    # 中文n-gram中出现这些字时基本不可能是实体
+    CJK_STOP_CHARS = set('的了和是在有我你他她它这那之以于一个中为与及等将对也都被从到把而并其就')
+
+    def __init__(self, min_mentions: int = 2, max_ngram: int = 4, snippet_window: int = 40, max_snippets: int = 2):
+        self.min_mentions = min_mentions
+        self.max_ngram = max_ngram
+        self.snippet_window = snippet_window
+        self.max_snippets = max_snippets
+
+    def extract(self, articles: List[Dict], top_n: int = 30) -> List[Dict]:
+        """对所有文章批量提取实体候选，返回按全语料提及次数排序的前top_n个候选及上下文片段"""
+        mention_counts = Counter()
+        article_counts = Counter()
+
+        for article in articles:
+            text = self._article_text(article)
+            counts = self._count_candidates(text)
+            mention_counts.update(counts)
+            article_counts.update(counts.keys())
+
+        # 过滤只出现一次的噪声，并去掉被更长候选完整覆盖的中文片段
+        candidates = {name: count for name, count in mention_counts.items() if count >= self.min_mentions}
+        candidates = self._suppress_substrings(candidates)
+
+        ranked = sorted(
+            candidates,
+            key=lambda name: (candidates[name] * (1 + math.log(article_counts[name])), len(name)),
+            reverse=True
+        )[:top_n]
+
+        snippets = self._collect_snippets(articles, ranked)
+        results = [
+            {
+                'name': name,
+                'mentions': candidates[name],
+                'articles': article_counts[name],
+                'snippets': snippets.get(name, [])
+            }
+            for name in ranked
+        ]
+
+        logger.info(f"本地实体预提取完成，{len(articles)} 篇文章中共 {len(candidates)} 个候选，保留前 {len(results)} 个")
+        return results
+
+    def _article_text(self, article: Dict) -> str:
+        """拼接标题和正文（使用原始大小写，清洗后的文本已被转为小写）"""
+        return f"{article.get('title', '')}\n{article.get('content', '')}"
+
+    def _count_candidates(self, text: str) -> Counter:
+        """统计单篇文章中的候选提及次数"""
+        counts = Counter()
+
+        for match in self.EN_PATTERN.finditer(text):
+            name = self._strip_en_stop_words(match.group(0))
+            if name:
+                counts[name] += 1
+
+        for match in self.TITLE_PATTERN.finditer(text):
+            counts[match.group(1).strip()] += 1
+
+        for match in self.CJK_PATTERN.finditer(text):
+            segment = match.group(0)
+            for n in range(2, min(self.max_ngram, len(segment)) + 1):
+                for i in range(len(segment) - n + 1):
+                    gram = segment[i:i + n]
+                    if not self.CJK_STOP_CHARS.intersection(gram):
+                        counts[gram] += 1
+
+        return counts
+
+    def _strip_en_stop_words(self, phrase: str) -> str:
+        """去掉英文短语首尾的虚词"""
+        words = phrase.split()
+        while words and words[0] in self.EN_STOP_WORDS:
+            words.pop(0)
+        while words and words[-1].lower() in {'of', 'for', 'and', 'the', 'de'}:
+            words.pop()
+        name = ' '.join(words).rstrip("'-&")
+        return name if len(name) > 1 else ''
+
+    def _suppress_substrings(self, candidates: Dict[str, int]) -> Dict[str, int]:
+        """中文n-gram会同时产生"人工智"和"人工智能"，保留更长且出现次数相近的那个"""
+        suppressed: Set[str] = set()
+        cjk_names = sorted((name for name in candidates if self.CJK_PATTERN.fullmatch(name)), key=len, reverse=True)
+
+        for longer in cjk_names:
+            if longer in suppressed:
+                continue
+            for n in range(2, len(longer)):
+                for i in range(len(longer) - n + 1):
+                    shorter = longer[i:i + n]
+                    if shorter in candidates and candidates[shorter] <= candidates[longer] * 1.2:
+                        suppressed.add(shorter)
+
+        return {name: count for name, count in candidates.items() if name not in suppressed}
+
+    def _collect_snippets(self, articles: List[Dict], names: List[str]) -> Dict[str, List[str]]:
+        """仅为最终入选的候选收集上下文片段，每个候选优先取自不同文章"""
+        snippets = {name: [] for name in names}
+
+        for article in articles:
+            pending = [name for name in names if len(snippets[name]) < self.max_snippets]
+            if not pending:
+                break
+            text = self._article_text(article)
+            for name in pending:
+                pos = text.find(name)
+                if pos < 0:
+                    continue
+                start = max(0, pos - self.snippet_window)
+                end = min(len(text), pos + len(name) + self.snippet_window)
+                snippets[name].append(re.sub(r'\s+', ' ', text[start:end]).strip())
+
+        return snippets
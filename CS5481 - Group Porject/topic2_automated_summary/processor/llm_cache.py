@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class LLMResponseCache:
+    """基于SQLite的LLM响应磁盘缓存，按模型+消息+参数哈希，支持TTL和按容量的LRU淘汰
+
+    SQLite自带文件锁，开启WAL后多个流水线进程可以同时读写同一个缓存文件。
+    写入时只维护内存中的总容量计数，超限或每EVICT_INTERVAL次写入才执行一次淘汰（同时按表重新统计，
+    纠正其他进程写入造成的偏差），淘汰时降到容量上限的LOW_WATER比例以下，避免之后每次写入都触发淘汰。
+    """
+
+    EVICT_INTERVAL = 100
+    LOW_WATER = 0.9
+
+    def __init__(self, cache_dir: str = "./cache", ttl: float = 7 * 24 * 3600, max_bytes: int = 200 * 1024 * 1024,
+                 bypass: bool = False):
+        self.path = os.path.join(cache_dir, "llm_cache.sqlite3")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # bypass时不读取缓存，但仍然写入最新结果
+        self.bypass = bypass
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'writes': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed_at ON responses (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON responses (created_at)")
+            self._size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立连接，避免跨线程共享连接；正常退出时提交事务"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], params: Dict) -> str:
+        """对模型、消息和请求参数做规范化JSON序列化后取SHA-256"""
+        payload = json.dumps({'model': model, 'messages': messages, 'params': params},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，过期条目视为未命中并删除"""
+        if self.bypass:
+            self._count('misses')
+            return None
+
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT content, size, created_at FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+                if row is None:
+                    self._count('misses')
+                    return None
+                content, size, created_at = row
+                if now - created_at > self.ttl:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._resize(-size)
+                    self._count('expired')
+                    self._count('misses')
+                    return None
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"读取LLM缓存失败: {e}")
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        return content
+
+    def set(self, key: str, content: str) -> None:
+        """写入缓存，总容量超限或达到淘汰间隔时淘汰过期和最久未访问的条目"""
+        now = time.time()
+        size = len(content.encode('utf-8'))
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, content, size, now, now)
+                )
+                self._count('writes')
+                with self._lock:
+                    self._size += size - (row[0] if row else 0)
+                    self._writes += 1
+                    due = self._size > self.max_bytes or self._writes % self.EVICT_INTERVAL == 0
+                if due:
+                    self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"写入LLM缓存失败: {e}")
+
+    def delete(self, key: str) -> None:
+        """删除一个条目（如内容无法被调用方解析）"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._resize(-row[0])
+        except sqlite3.Error as e:
+            logger.warning(f"删除LLM缓存条目失败: {e}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """删除过期条目并重新统计总容量，超限时从最久未访问的条目开始删除直到低于低水位"""
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        evicted = 0
+        if total > self.max_bytes:
+            target = self.max_bytes * self.LOW_WATER
+            while total > target:
+                # 按访问时间索引分批读取最旧的条目，不读取整张表
+                rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at LIMIT 256").fetchall()
+                if not rows:
+                    break
+                for key, size in rows:
+                    if total <= target:
+                        break
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+        with self._lock:
+            self._size = total
+        if evicted:
+            self._count('evictions', evicted)
+
+    def _resize(self, delta: int) -> None:
+        with self._lock:
+            self._size += delta
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+        with self._lock:
+            self._size = 0
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += value
+
+    def get_stats(self) -> Dict:
+        """返回命中统计"""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
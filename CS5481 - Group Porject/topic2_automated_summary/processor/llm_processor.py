@@ -1,10 +1,29 @@
 import os
-from typing import List, Dict, Tuple, Set
+import json
+import time
+from typing import List, Dict, Tuple, Set, Callable, Optional, Any
 import logging
 from datetime import datetime
+import threading
+import itertools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from processor.entity_extractor import EntityCandidateExtractor
+from processor.llm_cache import LLMResponseCache
+from processor.text_rank import TextRankSummarizer
+from processor.map_reduce_summarizer import MapReduceSummarizer
+from processor.timeline_builder import TimelineBuilder
+from processor.token_budget import TokenCounter, UsageTracker
+from processor.request_scheduler import RequestScheduler, RequestCancelled, cancel_scope, submit_in_context
+from processor.analysis_state import AnalysisStateStore
+from processor.sentence_dedup import SentenceDeduplicator
+from processor.vector_index import VectorIndex, HashingEmbedder
+from processor.batch_jobs import DeferredRequest
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -15,65 +34,311 @@ load_dotenv()
 class LLMProcessor:
     """使用LLM进行文本处理，包括实体提取、摘要生成和主题分析"""
     
-    def __init__(self, api_key: str = None, embedding_model: str = "text-embedding-3-small"):
+    # 各类提示中语料部分的token预算
+    PROMPT_BUDGETS = {
+        'entities': 1200,
+        'summary': 1500,
+        'themes': 1000,
+        'timeline_article': 400,
+        'summary_chunk': 1500,
+        'combined': 2500
+    }
+    
+    # 各类提示检索相关文本块时使用的查询；None表示以全部块的质心为查询，取覆盖面最广的块
+    RETRIEVAL_QUERIES = {
+        'entities': "文中涉及的人物、公司、组织机构、国家和地区、产品及技术名称",
+        'themes': None,
+        'summary': None,
+        'timeline': "事件发生的日期和时间，宣布、发布、签署、通过、启动等关键进展"
+    }
+    RETRIEVAL_CHUNK_TOKENS = 200
+    EMBEDDING_BATCH_SIZE = 100
+    
+    def __init__(self, api_key: str = None, embedding_model: str = "text-embedding-3-small",
+                 max_workers: int = 4, call_timeout: float = 60.0, cache: LLMResponseCache = None,
+                 summary_mode: str = "map_reduce", scheduler: RequestScheduler = None,
+                 analysis_mode: str = "separate", base_url: str = None, state_store: AnalysisStateStore = None,
+                 retrieval_mode: str = "embedding", timeline_max_events: int = 20):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.max_workers = max_workers
+        self.call_timeout = call_timeout
+        # map_reduce: 分块摘要后逐层合并，覆盖全部文章；textrank: 先抽取中心句再做一次摘要
+        self.summary_mode = summary_mode
+        # separate: 实体、摘要、主题分别请求；combined: 一次结构化输出请求同时返回三者
+        self.analysis_mode = analysis_mode
+        # 所有请求经由调度器发出，统一处理速率限制、优先级和重试
+        self.scheduler = scheduler or RequestScheduler()
+        # 提供状态存储时支持增量分析：只分析新增文章并合并到上一次的结果中
+        self.state_store = state_store
+        # embedding: 用嵌入接口建立向量索引；hashing: 使用本地哈希向量；off: 提示使用语料开头
+        self.retrieval_mode = retrieval_mode
+        # 时间线保留的事件数量上限（分片输出的页面可以展示更长的时间线）
+        self.timeline_max_events = timeline_max_events
         if not self.api_key:
             logger.warning("未提供OpenAI API密钥，将使用模拟数据")
             self.client = None
         else:
             try:
-                self.client = OpenAI(api_key=self.api_key)
+                # 超时作用于每一次API请求（_chat和_embed中也显式传入），排队等待速率预算的时间不计入
+                # 重试由调度器处理，以便按速率限制退避并记录每次调用的重试次数
+                # base_url可指向本地的OpenAI兼容服务（如benchmark/mock_llm_server.py）
+                self.client = OpenAI(api_key=self.api_key, base_url=base_url or os.getenv("OPENAI_BASE_URL"),
+                                     timeout=call_timeout, max_retries=0)
             except Exception as e:
                 logger.error(f"OpenAI客户端初始化失败: {e}")
                 self.client = None
         self.embedding_model = embedding_model
+        # 相同的模型+消息+参数直接复用磁盘缓存中的响应
+        self.cache = cache
+        # 按token而不是字符截断提示，并记录每次调用的用量和耗时
+        self.token_counter = TokenCounter()
+        self.usage = UsageTracker()
+        self.entity_extractor = EntityCandidateExtractor()
+        self.text_ranker = TextRankSummarizer()
+        self.deduplicator = SentenceDeduplicator()
+        self.hashing_embedder = HashingEmbedder()
+        # 每次analyze_articles的调用带有独立的用量标签，并发分析多个主题时各自的用量报告互不混入
+        self._analysis_ids = itertools.count(1)
+        # 批处理收集模式下记录缓存未命中的请求，见collect_requests()
+        self._pending: Optional[Dict[str, Dict]] = None
+        self.timeline_builder = TimelineBuilder(
+            self._chat,
+            article_budget=self.PROMPT_BUDGETS['timeline_article'],
+            truncate=self.token_counter.truncate,
+            max_events=timeline_max_events
+        )
+        self.map_reduce_summarizer = MapReduceSummarizer(
+            self._chat,
+            chunk_size=self.PROMPT_BUDGETS['summary_chunk'],
+            length_fn=self.token_counter.count,
+            max_workers=max_workers
+        )
     
-    def analyze_articles(self, articles: List[Dict], top_n_entities: int = 10, top_n_themes: int = 5) -> Dict:
-        """分析多篇文章，提取关键信息"""
+    def analyze_articles(self, articles: List[Dict], top_n_entities: int = 10, top_n_themes: int = 5,
+                         state_key: str = None, on_summary_update: Callable[[str], None] = None) -> Dict:
+        """分析多篇文章，提取关键信息；实体、摘要、主题和时间线互不依赖，并发执行
+        
+        配置了状态存储并提供state_key时进行增量分析：已有上一次的状态时只分析新增或内容变化的文章，
+        再与上一次的实体、主题、时间线和摘要合并，刷新成本与新增内容成正比。
+        提供on_summary_update时最终的摘要请求以流式方式发出，生成过程中不断以目前的摘要文本回调
+        （合并分析模式不支持流式）。
+        """
         logger.info(f"开始使用LLM分析 {len(articles)} 篇文章")
+        start_time = time.time()
+        usage_mark = self.usage.mark()
+        usage_tag = f"analysis-{next(self._analysis_ids)}"
+        
+        with self.usage.tagged(usage_tag):
+            incremental = bool(self.state_store and state_key and self.client)
+            previous = self.state_store.load(state_key) if incremental else None
+            failed: Set[str] = set()
+        
+            if previous:
+                delta, fingerprints = self.state_store.split_delta(articles, previous)
+                logger.info(f"增量分析：{len(articles)} 篇文章中有 {len(delta)} 篇新增或更新")
+                result, entity_pool = self._analyze_delta(delta, previous, top_n_entities, top_n_themes, failed,
+                                                          on_summary_update)
+                fingerprints = dict(previous.get('articles', {}), **fingerprints)
+            else:
+                result = self._analyze_full(articles, top_n_entities, top_n_themes, failed, on_summary_update)
+                if incremental:
+                    fingerprints = self.state_store.split_delta(articles, {})[1]
+                    entity_pool = self._merge_entities([], result['entities'], articles)
         
-        # 合并所有文章内容用于综合分析
-        combined_text = "\n\n".join([article['content'] for article in articles])
+            if incremental:
+                if failed:
+                    # 有任务回退时不更新状态，这些文章下次仍按新增文章处理
+                    logger.warning(f"分析任务 {sorted(failed)} 未成功，本次不更新分析状态")
+                else:
+                    state = {field: result[field] for field in ('summary', 'entities', 'themes', 'timeline')}
+                    state.update(articles=fingerprints, entity_pool=entity_pool)
+                    self.state_store.save(state_key, state)
         
-        # 提取关键实体
-        entities = self.extract_entities(combined_text, top_n=top_n_entities)
+        # 回退到模拟数据或上一次结果的任务写入结果和用量报告，调用方据此判断结果是否完整
+        result['failed'] = sorted(failed)
+        result['usage'] = self.usage.report(since=usage_mark, tag=usage_tag)
+        result['usage']['failed_tasks'] = result['failed']
+        if failed:
+            logger.warning(f"以下分析任务使用了回退结果: {result['failed']}")
         
-        # 生成综合摘要
-        summary = self.generate_summary(combined_text)
+        logger.info(f"LLM分析完成，耗时 {time.time() - start_time:.2f}秒")
+        logger.info(f"LLM调用统计: {result['usage']['totals']}")
+        if self.cache:
+            logger.info(f"LLM缓存统计: {self.cache.get_stats()}")
+        return result
+    
+    def _analyze_full(self, articles: List[Dict], top_n_entities: int, top_n_themes: int, failed: Set[str],
+                      on_summary_update: Callable[[str], None] = None) -> Dict:
+        """对全部文章进行完整分析，回退到模拟数据的任务名记录在failed中"""
+        if not self.client:
+            # 没有API密钥时直接返回模拟数据
+            return {
+                'entities': self._generate_mock_entities(top_n_entities),
+                'summary': self._generate_mock_summary(),
+                'themes': self._generate_mock_themes(top_n_themes),
+                'timeline': self.build_timeline(articles)
+            }
         
-        # 分析主要主题
-        themes = self.identify_themes(combined_text, top_n=top_n_themes)
+        # 转载稿中跨来源重复的句子只保留一份（附来源标注），提示只使用去重后的文本；
+        # 实体计数和时间线仍基于原始文章，保留每个来源的报道次数和发布日期
+        compact = self.deduplicator.compact(articles)
+        # 每个提示从向量索引中检索与自身任务最相关的文本块，而不是固定截取语料开头
+        index = self._build_index(compact)
         
-        # 构建时间线
-        timeline = self.build_timeline(articles)
+        def entities_task():
+            # 先在本地对全部文章做实体预提取，只把高频候选交给LLM做类型判定和描述
+            candidates = self.entity_extractor.extract(articles, top_n=top_n_entities * 3)
+            text = "" if candidates else self._retrieve_context(index, compact, 'entities')
+            return self._request_entities(text, top_n_entities, candidates)
         
-        result = {
-            'entities': entities,
-            'summary': summary,
-            'themes': themes,
-            'timeline': timeline
-        }
+        def summary_task():
+            if self.summary_mode == "map_reduce":
+                try:
+                    return self.map_reduce_summarizer.summarize(compact, on_update=on_summary_update, failed=failed)
+                except DeferredRequest:
+                    raise
+                except Exception as e:
+                    logger.error(f"map-reduce摘要失败: {e}，改用TextRank底稿摘要")
+            # 先用TextRank从全部文章中抽取中心句作为摘要底稿，避免只截取语料开头
+            digest = self.text_ranker.summarize(compact, budget=self.PROMPT_BUDGETS['summary'],
+                                                length_fn=self.token_counter.count)
+            return self._request_summary(digest or self._retrieve_context(index, compact, 'summary'),
+                                         on_update=on_summary_update)
+        
+        timeline_task = (lambda: self.build_timeline(articles, index, failed),
+                         lambda: self._generate_mock_timeline(self._sort_by_date(articles))[-self.timeline_max_events:])
+        
+        if self.analysis_mode == "combined":
+            tasks = {
+                'combined': (lambda: self.analyze_combined(articles, top_n_entities, top_n_themes, compact), dict),
+                'timeline': timeline_task
+            }
+            result = self._run_concurrently(tasks, failed)
+            
+            # 结构化输出中缺失或不合法的字段单独回退到模拟数据
+            combined = result.pop('combined')
+            fallbacks = {
+                'entities': lambda: self._generate_mock_entities(top_n_entities),
+                'summary': self._generate_mock_summary,
+                'themes': lambda: self._generate_mock_themes(top_n_themes)
+            }
+            for field, fallback in fallbacks.items():
+                if combined.get(field):
+                    result[field] = combined[field]
+                else:
+                    logger.warning(f"合并分析结果缺少有效的 {field} 字段，使用模拟数据")
+                    result[field] = fallback()
+                    failed.add(field)
+        else:
+            tasks = {
+                'entities': (entities_task, lambda: self._generate_mock_entities(top_n_entities)),
+                'summary': (summary_task, self._generate_mock_summary),
+                'themes': (lambda: self._request_themes(self._retrieve_context(index, compact, 'themes'), top_n_themes),
+                           lambda: self._generate_mock_themes(top_n_themes)),
+                'timeline': timeline_task
+            }
+            result = self._run_concurrently(tasks, failed)
         
-        logger.info("LLM分析完成")
         return result
     
-    def extract_entities(self, text: str, top_n: int = 10) -> List[Dict]:
-        """提取关键实体"""
+    def _analyze_delta(self, delta: List[Dict], previous: Dict, top_n_entities: int, top_n_themes: int,
+                       failed: Set[str], on_summary_update: Callable[[str], None] = None) -> Tuple[Dict, List[Dict]]:
+        """只分析新增文章并与上一次的结果合并，返回 (分析结果, 实体候选池)；出错的字段保留上一次的结果"""
+        entity_pool = previous.get('entity_pool') or previous.get('entities', [])
+        if not delta:
+            logger.info("没有新增文章，直接复用上一次的分析结果")
+            return {field: previous[field] for field in ('summary', 'entities', 'themes', 'timeline')}, entity_pool
+        
+        # 增量刷新始终使用独立请求，每个请求只包含新增文章的内容
+        compact = self.deduplicator.compact(delta)
+        index = self._build_index(compact)
+        
+        def entities_task():
+            candidates = self.entity_extractor.extract(delta, top_n=top_n_entities * 3)
+            text = "" if candidates else self._retrieve_context(index, compact, 'entities')
+            new_entities = self._request_entities(text, top_n_entities, candidates)
+            return self._merge_entities(entity_pool, new_entities, delta)
+        
+        def summary_task():
+            digest = self.text_ranker.summarize(compact, budget=self.PROMPT_BUDGETS['summary'],
+                                                length_fn=self.token_counter.count)
+            return self.refresh_summary(previous['summary'], digest or self._retrieve_context(index, compact, 'summary'),
+                                        on_update=on_summary_update)
+        
+        def timeline_task():
+            events = self.timeline_builder.build(self._sort_by_date(delta), self._timeline_content_fn(index), failed)
+            return self.timeline_builder.merge(previous['timeline'], events)
+        
+        tasks = {
+            'entity_pool': (entities_task, lambda: entity_pool),
+            'summary': (summary_task, lambda: previous['summary']),
+            'themes': (lambda: self.refresh_themes(previous['themes'], self._retrieve_context(index, compact, 'themes'),
+                                                   top_n_themes),
+                       lambda: previous['themes']),
+            'timeline': (timeline_task, lambda: previous['timeline'])
+        }
+        result = self._run_concurrently(tasks, failed)
+        entity_pool = result.pop('entity_pool')
+        result['entities'] = entity_pool[:top_n_entities]
+        return result, entity_pool
+    
+    def _merge_entities(self, pool: List[Dict], new_entities: List[Dict], articles: List[Dict],
+                        max_size: int = 50) -> List[Dict]:
+        """把新增文章中的提及次数累加到实体池，追加新出现的实体，并按提及次数排序
+        
+        实体池比页面展示的实体多保留一些，避免暂时排在后面的实体丢失累计的次数。
+        """
+        texts = [f"{article.get('title', '')}\n{article.get('content', '')}" for article in articles]
+        count = lambda name: sum(text.count(name) for text in texts)
+        
+        merged = {}
+        for entity in pool:
+            merged[entity['name']] = dict(entity, mentions=entity.get('mentions', 0) + count(entity['name']))
+        for entity in new_entities:
+            name = entity.get('name')
+            if name and name not in merged:
+                merged[name] = dict(entity, mentions=count(name))
+        
+        ranked = sorted(merged.values(), key=lambda item: item['mentions'], reverse=True)
+        return ranked[:max_size]
+    
+    def _run_concurrently(self, tasks: Dict[str, Tuple[Callable, Callable]], failed: Set[str] = None) -> Dict:
+        """在有界线程池中并发执行分析任务，出错的任务单独回退，任务名记录在failed中
+
+        不对整个任务设置截止时间：每次API请求各自受call_timeout限制，在调度器中排队等待预算的时间不计入。
+        返回前（包括被中断时）设置取消标志，仍在排队或退避中的请求不再发出，线程池随之正常结束。
+        """
+        results = {}
+        cancelled = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(tasks))))
+        try:
+            with cancel_scope(cancelled):
+                futures = {name: submit_in_context(executor, task) for name, (task, _) in tasks.items()}
+            
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except DeferredRequest:
+                    # 批处理收集模式下请求已被记录，本轮结果不会被使用
+                    results[name] = tasks[name][1]()
+                except Exception as e:
+                    logger.error(f"分析任务 {name} 出错: {e}，使用回退结果")
+                    results[name] = tasks[name][1]()
+                else:
+                    continue
+                if failed is not None:
+                    failed.add(name)
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+        
+        return results
+    
+    def extract_entities(self, text: str, top_n: int = 10, candidates: List[Dict] = None) -> List[Dict]:
+        """提取关键实体，提供本地候选时只把候选及其上下文发送给LLM"""
         if self.client:
             try:
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "你是一个实体提取专家。请从文本中提取关键实体，并按重要性排序。"},
-                        {"role": "user", "content": f"请从以下文本中提取最重要的{top_n}个实体。为每个实体提供类型（如人物、组织、地点、技术等）和简要描述。以JSON格式返回：[{{\"name\": \"实体名\", \"type\": \"实体类型\", \"description\": \"简要描述\"}}, ...]\n\n文本：{text[:2000]}..."}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                
-                import json
-                entities = json.loads(response.choices[0].message.content)
-                return entities[:top_n] if len(entities) > top_n else entities
-                
+                return self._request_entities(text, top_n, candidates)
             except Exception as e:
                 logger.error(f"使用LLM提取实体时出错: {e}")
                 # 出错时返回模拟数据
@@ -82,45 +347,264 @@ class LLMProcessor:
             # 没有API密钥时返回模拟数据
             return self._generate_mock_entities(top_n)
     
-    def generate_summary(self, text: str, max_length: int = 500) -> str:
-        """生成综合摘要"""
+    def _request_entities(self, text: str, top_n: int, candidates: List[Dict] = None) -> List[Dict]:
+        """请求LLM提取实体，出错时抛出异常"""
+        if candidates:
+            candidates_text = self.token_counter.pack(
+                self._format_entity_candidates(candidates), self.PROMPT_BUDGETS['entities'], separator="\n"
+            )
+            prompt = f"以下是从全部文章中预先统计出的候选实体，包含出现次数和上下文片段。请从中挑选最重要的{top_n}个真实实体（忽略不是实体的候选），为每个实体提供类型（如人物、组织、地点、技术等）和简要描述。以JSON格式返回：{{\"entities\": [{{\"name\": \"实体名\", \"type\": \"实体类型\", \"description\": \"简要描述\"}}, ...]}}\n\n候选实体：\n{candidates_text}"
+        else:
+            prompt = f"请从以下文本中提取最重要的{top_n}个实体。为每个实体提供类型（如人物、组织、地点、技术等）和简要描述。以JSON格式返回：[{{\"name\": \"实体名\", \"type\": \"实体类型\", \"description\": \"简要描述\"}}, ...]\n\n文本：{self.token_counter.truncate(text, self.PROMPT_BUDGETS['entities'])}"
+        
+        content = self._chat(
+            purpose='entities',
+            validate=json.loads,
+            messages=[
+                {"role": "system", "content": "你是一个实体提取专家。请从文本中提取关键实体，并按重要性排序。"},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"}
+        )
+        
+        entities = self._parse_json_list(content, 'entities')
+        
+        # 补充本地统计的全语料提及次数
+        mentions = {candidate['name']: candidate['mentions'] for candidate in candidates or []}
+        for entity in entities:
+            if entity.get('name') in mentions:
+                entity['mentions'] = mentions[entity['name']]
+        
+        return entities[:top_n] if len(entities) > top_n else entities
+    
+    def analyze_combined(self, articles: List[Dict], top_n_entities: int = 10, top_n_themes: int = 5,
+                         compact: List[Dict] = None) -> Dict:
+        """一次结构化输出请求同时生成实体、主题和摘要，只返回通过校验的字段；compact为句子去重后的文章"""
+        candidates = self.entity_extractor.extract(articles, top_n=top_n_entities * 3)
+        compact = compact if compact is not None else self.deduplicator.compact(articles)
+        digest = self.text_ranker.summarize(compact, budget=self.PROMPT_BUDGETS['summary'],
+                                            length_fn=self.token_counter.count)
+        
+        # 候选实体和摘要底稿共享同一份预算，候选实体最多占三分之一
+        candidates_text = self.token_counter.pack(
+            self._format_entity_candidates(candidates), self.PROMPT_BUDGETS['combined'] // 3, separator="\n"
+        )
+        remaining = self.PROMPT_BUDGETS['combined'] - self.token_counter.count(candidates_text)
+        digest_text = self.token_counter.truncate(digest or self._corpus_prefix(compact, remaining), remaining)
+        
+        schema = (
+            '{"summary": "不超过500个字符的综合摘要", '
+            '"entities": [{"name": "实体名", "type": "实体类型", "description": "简要描述"}], '
+            '"themes": [{"name": "主题名称", "description": "主题描述"}]}'
+        )
+        content = self._chat(
+            purpose='analysis',
+            validate=json.loads,
+            messages=[
+                {"role": "system", "content": "你是一个新闻分析专家，负责从一组文章中同时完成摘要生成、实体提取和主题分析，并严格按要求的JSON结构输出。"},
+                {"role": "user", "content": f"请根据以下材料完成三项任务：1. 生成一个全面的摘要，包含关键事件、重要发现和主要结论；2. 从候选实体中挑选最重要的{top_n_entities}个真实实体，给出类型（如人物、组织、地点、技术等）和简要描述；3. 识别最重要的{top_n_themes}个主题。以JSON格式返回，结构如下：{schema}\n\n候选实体（含出现次数和上下文）：\n{candidates_text}\n\n文章要点：\n{digest_text}"}
+            ],
+            response_format={"type": "json_object"}
+        )
+        
+        return self._validate_combined(json.loads(content), candidates, top_n_entities, top_n_themes)
+    
+    def _validate_combined(self, data: Dict, candidates: List[Dict], top_n_entities: int, top_n_themes: int) -> Dict:
+        """校验合并分析的JSON并整理为与单独请求相同的结果结构，不合法的字段被丢弃"""
+        if not isinstance(data, dict):
+            return {}
+        
+        result = {}
+        summary = data.get('summary')
+        if isinstance(summary, str) and summary.strip():
+            result['summary'] = summary.strip()
+        
+        mentions = {candidate['name']: candidate['mentions'] for candidate in candidates}
+        entities = []
+        for item in data.get('entities') or []:
+            if isinstance(item, dict) and isinstance(item.get('name'), str) and item['name'].strip():
+                entity = {
+                    'name': item['name'].strip(),
+                    'type': str(item.get('type') or ''),
+                    'description': str(item.get('description') or '')
+                }
+                if entity['name'] in mentions:
+                    entity['mentions'] = mentions[entity['name']]
+                entities.append(entity)
+        if entities:
+            result['entities'] = entities[:top_n_entities]
+        
+        themes = [
+            {'name': item['name'].strip(), 'description': str(item.get('description') or '')}
+            for item in data.get('themes') or []
+            if isinstance(item, dict) and isinstance(item.get('name'), str) and item['name'].strip()
+        ]
+        if themes:
+            result['themes'] = themes[:top_n_themes]
+        
+        return result
+    
+    @contextmanager
+    def collect_requests(self):
+        """批处理收集模式：缓存未命中的请求不发送，记录到返回的字典（缓存键 -> 请求）后抛出DeferredRequest"""
+        if self.cache is None:
+            raise ValueError("收集模式需要启用LLM响应缓存")
+        pending: Dict[str, Dict] = {}
+        self._pending = pending
+        try:
+            yield pending
+        finally:
+            self._pending = None
+    
+    def _chat(self, messages: List[Dict], model: str = "gpt-3.5-turbo", purpose: str = "general",
+              on_update: Callable[[str], None] = None, validate: Callable[[str], Any] = None, **params) -> str:
+        """统一的对话补全调用入口：先查磁盘缓存，未命中时经调度器请求API，并记录用量
+        
+        提供on_update时以流式方式请求，每收到一段输出就以目前的完整文本调用on_update；
+        是否流式不影响缓存键，缓存命中时直接以完整结果调用一次。
+        提供validate时（如json.loads），输出通过校验后才写入缓存，校验抛出的异常原样抛给调用方；
+        无法通过校验的缓存条目被删除并重新请求，格式错误或被截断的输出不会在整个TTL内被反复使用。
+        """
+        key = self.cache.make_key(model, messages, params) if self.cache else None
+        estimated_tokens = sum(self.token_counter.count(message['content']) for message in messages)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None and validate and not self._is_valid(cached, validate):
+                logger.warning(f"{purpose} 请求的缓存结果无法解析，已删除并重新请求")
+                self.cache.delete(key)
+                cached = None
+            if cached is not None:
+                self.usage.record(purpose, model, estimated_tokens, self.token_counter.count(cached), 0.0, cached=True)
+                if on_update:
+                    on_update(cached)
+                return cached
+        
+        pending = self._pending
+        if pending is not None:
+            pending[key] = {'model': model, 'messages': messages, 'params': params, 'purpose': purpose}
+            raise DeferredRequest(purpose)
+        
+        start_time = time.time()
+        try:
+            if on_update:
+                request = lambda: self._stream_completion(model, messages, params, on_update)
+            else:
+                request = lambda: self.client.chat.completions.create(model=model, messages=messages,
+                                                                      timeout=self.call_timeout, **params)
+            response, retries = self.scheduler.execute(
+                request,
+                purpose=purpose,
+                estimated_tokens=estimated_tokens + params.get('max_tokens', 500)
+            )
+        except RequestCancelled:
+            # 所属分析已放弃，请求没有发出
+            raise
+        except Exception as e:
+            # 可重试错误会在调度器耗尽重试次数后才抛出
+            retryable = isinstance(e, RequestScheduler.RETRYABLE_ERRORS) and not RequestScheduler.is_quota_exhausted(e)
+            retries = self.scheduler.max_retries if retryable else 0
+            self.usage.record(purpose, model, 0, 0, time.time() - start_time, retries=retries, error=str(e))
+            raise
+        
+        if on_update:
+            # 流式响应不返回用量，按本地计数估算
+            content, usage = response, None
+        else:
+            content = response.choices[0].message.content
+            usage = getattr(response, 'usage', None)
+        prompt_tokens = usage.prompt_tokens if usage else estimated_tokens
+        completion_tokens = usage.completion_tokens if usage else self.token_counter.count(content or '')
+        self.usage.record(purpose, model, prompt_tokens, completion_tokens, time.time() - start_time, retries=retries)
+        
+        if validate and content is not None:
+            validate(content)
+        if key and content is not None:
+            self.cache.set(key, content)
+        return content
+    
+    @staticmethod
+    def _is_valid(content: str, validate: Callable[[str], Any]) -> bool:
+        try:
+            validate(content)
+            return True
+        except Exception:
+            return False
+    
+    def _stream_completion(self, model: str, messages: List[Dict], params: Dict,
+                           on_update: Callable[[str], None]) -> str:
+        """发出一次流式请求并逐段回调，返回完整输出；中途出错时由调度器整体重试"""
+        stream = self.client.chat.completions.create(model=model, messages=messages, stream=True,
+                                                     timeout=self.call_timeout, **params)
+        parts: List[str] = []
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_update("".join(parts))
+        return "".join(parts)
+    
+    def _format_entity_candidates(self, candidates: List[Dict]) -> List[str]:
+        """将候选实体格式化为紧凑的提示行"""
+        lines = []
+        for i, candidate in enumerate(candidates, 1):
+            contexts = " / ".join(candidate.get('snippets', []))
+            lines.append(f"{i}. {candidate['name']}（出现{candidate['mentions']}次，涉及{candidate['articles']}篇文章）：{contexts}")
+        return lines
+    
+    def _parse_json_list(self, content: str, key: str) -> List[Dict]:
+        """解析LLM返回的JSON列表；json_object模式下列表通常被包在一个对象字段里"""
+        data = json.loads(content)
+        if isinstance(data, dict):
+            if isinstance(data.get(key), list):
+                return data[key]
+            # 兼容模型使用其他字段名的情况
+            for value in data.values():
+                if isinstance(value, list):
+                    return value
+            return []
+        return data
+    
+    def generate_summary(self, text: str, max_length: int = 500, on_update: Callable[[str], None] = None) -> str:
+        """生成综合摘要；提供on_update时流式生成，并以目前的摘要文本回调"""
         if self.client:
             try:
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "你是一个专业的摘要生成器。请生成简洁、全面且信息丰富的摘要。"},
-                        {"role": "user", "content": f"请为以下文本生成一个全面的摘要，长度不超过{max_length}个字符。摘要应包含关键事件、重要发现和主要结论。\n\n文本：{text[:3000]}..."}
-                    ]
-                )
-                
-                return response.choices[0].message.content
-                
+                return self._request_summary(text, max_length, on_update)
             except Exception as e:
                 logger.error(f"使用LLM生成摘要时出错: {e}")
                 # 出错时返回模拟摘要
-                return "这是关于人工智能最新进展的综合摘要。近期研究表明，人工智能技术在多个领域取得了重大突破，包括大型语言模型、计算机视觉和机器人技术。专家预测，这些技术将在未来几年对社会和经济产生深远影响。"
+                return self._generate_mock_summary()
         else:
             # 没有API密钥时返回模拟摘要
-            return "这是关于人工智能最新进展的综合摘要。近期研究表明，人工智能技术在多个领域取得了重大突破，包括大型语言模型、计算机视觉和机器人技术。专家预测，这些技术将在未来几年对社会和经济产生深远影响。"
+            return self._generate_mock_summary()
+    
+    def _request_summary(self, text: str, max_length: int = 500, on_update: Callable[[str], None] = None) -> str:
+        """请求LLM生成摘要，出错时抛出异常"""
+        return self._chat(
+            purpose='summary',
+            on_update=on_update,
+            messages=[
+                {"role": "system", "content": "你是一个专业的摘要生成器。请生成简洁、全面且信息丰富的摘要。"},
+                {"role": "user", "content": f"请为以下文本生成一个全面的摘要，长度不超过{max_length}个字符。摘要应包含关键事件、重要发现和主要结论。\n\n文本：{self.token_counter.truncate(text, self.PROMPT_BUDGETS['summary'])}"}
+            ]
+        )
+    
+    def refresh_summary(self, previous_summary: str, new_material: str, max_length: int = 500,
+                        on_update: Callable[[str], None] = None) -> str:
+        """根据上一次的摘要和新增文章的要点更新摘要（增量分析使用），出错时抛出异常"""
+        return self._chat(
+            purpose='summary',
+            on_update=on_update,
+            messages=[
+                {"role": "system", "content": "你是一个专业的摘要生成器。请生成简洁、全面且信息丰富的摘要。"},
+                {"role": "user", "content": f"以下是此前生成的摘要和新增报道的要点。请将新增内容整合进摘要，保留仍然重要的既有信息，更新已经变化的事实，生成一份新的摘要，长度不超过{max_length}个字符。\n\n此前的摘要：{previous_summary}\n\n新增报道要点：{self.token_counter.truncate(new_material, self.PROMPT_BUDGETS['summary'])}"}
+            ]
+        )
     
     def identify_themes(self, text: str, top_n: int = 5) -> List[Dict]:
         """识别主要主题"""
         if self.client:
             try:
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "你是一个主题分析专家。请从文本中识别主要主题和趋势。"},
-                        {"role": "user", "content": f"请从以下文本中识别最重要的{top_n}个主题。为每个主题提供名称和简要描述。以JSON格式返回：[{{\"name\": \"主题名称\", \"description\": \"主题描述\"}}, ...]\n\n文本：{text[:2000]}..."}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                
-                import json
-                themes = json.loads(response.choices[0].message.content)
-                return themes[:top_n] if len(themes) > top_n else themes
-                
+                return self._request_themes(text, top_n)
             except Exception as e:
                 logger.error(f"使用LLM识别主题时出错: {e}")
                 # 出错时返回模拟数据
@@ -129,42 +613,171 @@ class LLMProcessor:
             # 没有API密钥时返回模拟数据
             return self._generate_mock_themes(top_n)
     
-    def build_timeline(self, articles: List[Dict]) -> List[Dict]:
-        """构建事件时间线"""
-        # 按日期排序文章
-        sorted_articles = sorted(articles, key=lambda x: x.get('normalized_date', datetime.now()))
+    def _request_themes(self, text: str, top_n: int) -> List[Dict]:
+        """请求LLM识别主题，出错时抛出异常"""
+        content = self._chat(
+            purpose='themes',
+            validate=json.loads,
+            messages=[
+                {"role": "system", "content": "你是一个主题分析专家。请从文本中识别主要主题和趋势。"},
+                {"role": "user", "content": f"请从以下文本中识别最重要的{top_n}个主题。为每个主题提供名称和简要描述。以JSON格式返回：[{{\"name\": \"主题名称\", \"description\": \"主题描述\"}}, ...]\n\n文本：{self.token_counter.truncate(text, self.PROMPT_BUDGETS['themes'])}"}
+            ],
+            response_format={"type": "json_object"}
+        )
         
-        timeline = []
+        themes = self._parse_json_list(content, 'themes')
+        return themes[:top_n] if len(themes) > top_n else themes
+    
+    def refresh_themes(self, previous_themes: List[Dict], new_text: str, top_n: int = 5) -> List[Dict]:
+        """结合上一次的主题和新增文章更新主题列表（增量分析使用），出错时抛出异常"""
+        previous_text = "\n".join(f"- {theme.get('name', '')}：{theme.get('description', '')}" for theme in previous_themes)
+        content = self._chat(
+            purpose='themes',
+            validate=json.loads,
+            messages=[
+                {"role": "system", "content": "你是一个主题分析专家。请从文本中识别主要主题和趋势。"},
+                {"role": "user", "content": f"以下是此前识别出的主题和新增报道的内容。请结合新增内容更新主题列表：保留仍然重要的主题，必要时修改描述，并加入新出现的重要主题，总数不超过{top_n}个。以JSON格式返回：{{\"themes\": [{{\"name\": \"主题名称\", \"description\": \"主题描述\"}}, ...]}}\n\n此前的主题：\n{previous_text}\n\n新增报道：{self.token_counter.truncate(new_text, self.PROMPT_BUDGETS['themes'])}"}
+            ],
+            response_format={"type": "json_object"}
+        )
+        
+        themes = self._parse_json_list(content, 'themes')
+        if not themes:
+            raise ValueError("主题更新结果为空")
+        return themes[:top_n]
+    
+    def build_timeline(self, articles: List[Dict], index: VectorIndex = None, failed: Set[str] = None) -> List[Dict]:
+        """构建事件时间线；提供向量索引时，超出预算的长文章只发送与事件和日期最相关的段落
+
+        有批次失败或整体回退到模拟时间线时在failed中加入'timeline'。
+        """
+        # 按日期排序文章
+        sorted_articles = self._sort_by_date(articles)
         
         if self.client:
             try:
-                # 使用LLM提取时间线上的关键事件
-                for article in sorted_articles[:10]:  # 限制文章数量
-                    response = self.client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": "你是一个时间线分析专家。请从文章中提取具体的事件和时间信息。"},
-                            {"role": "user", "content": f"请从以下文章中提取具体的事件信息。以JSON格式返回：[{{\"date\": \"日期\", \"event\": \"事件描述\"}}, ...]\n\n文章标题：{article['title']}\n文章内容：{article['content'][:1000]}..."}
-                        ],
-                        response_format={"type": "json_object"}
-                    )
-                    
-                    import json
-                    events = json.loads(response.choices[0].message.content)
-                    timeline.extend(events)
-                    
+                # 多篇文章打包成批次并发提取，单个批次失败只影响该批次的文章
+                return self.timeline_builder.build(sorted_articles, self._timeline_content_fn(index), failed)
+            except RequestCancelled:
+                raise
             except Exception as e:
                 logger.error(f"使用LLM构建时间线时出错: {e}")
+                if failed is not None:
+                    failed.add('timeline')
                 # 出错时返回基于文章日期的模拟时间线
                 timeline = self._generate_mock_timeline(sorted_articles)
         else:
             # 没有API密钥时返回模拟时间线
             timeline = self._generate_mock_timeline(sorted_articles)
         
-        # 按日期排序并去重
-        timeline.sort(key=lambda x: x.get('date', datetime.now().strftime('%Y-%m-%d')))
+        return timeline[-self.timeline_max_events:]  # 限制时间线事件数量，与LLM提取的时间线一样保留最近的事件
+    
+    def embedder(self) -> Callable[[List[str]], np.ndarray]:
+        """与提示检索相同的向量函数：embedding模式且有API客户端时使用嵌入接口，否则使用本地哈希向量"""
+        if self.retrieval_mode == "embedding" and self.client:
+            return self._embed
+        return self.hashing_embedder
+
+    def _build_index(self, articles: List[Dict]) -> Optional[VectorIndex]:
+        """为提示检索建立向量索引；嵌入接口不可用时退化为本地哈希向量"""
+        if self.retrieval_mode == "off" or not articles:
+            return None
+        if self.retrieval_mode == "embedding" and self.client:
+            try:
+                return VectorIndex(self._embed, chunk_size=self.RETRIEVAL_CHUNK_TOKENS,
+                                   length_fn=self.token_counter.count).build(articles)
+            except Exception as e:
+                logger.error(f"使用嵌入接口建立向量索引时出错: {e}，改用本地哈希向量")
+        return VectorIndex(self.hashing_embedder, chunk_size=self.RETRIEVAL_CHUNK_TOKENS,
+                           length_fn=self.token_counter.count).build(articles)
+    
+    def _retrieve_context(self, index: Optional[VectorIndex], articles: List[Dict], purpose: str) -> str:
+        """按用途检索预算内最相关的文本块；没有索引或检索出错时使用语料开头"""
+        budget = self.PROMPT_BUDGETS[purpose]
+        if index is not None:
+            try:
+                text = index.retrieve(self.RETRIEVAL_QUERIES[purpose], budget=budget)
+                if text:
+                    return text
+            except Exception as e:
+                logger.error(f"检索 {purpose} 提示的相关文本时出错: {e}，改用语料开头")
+        return self._corpus_prefix(articles, max_tokens=budget)
+    
+    def _timeline_content_fn(self, index: Optional[VectorIndex]) -> Optional[Callable[[Dict, int], str]]:
+        """返回时间线提示的文章内容选择函数：长文章只保留与事件和日期最相关的块"""
+        if index is None:
+            return None
+        
+        def select(article: Dict, budget: int) -> str:
+            content = article.get('content', '')
+            if self.token_counter.count(content) <= budget:
+                return content
+            try:
+                text = index.retrieve(self.RETRIEVAL_QUERIES['timeline'], budget=budget,
+                                      key=article.get('url') or article.get('title', ''), with_headers=False)
+            except Exception as e:
+                logger.error(f"检索时间线文本时出错: {e}")
+                text = ""
+            return text or self.token_counter.truncate(content, budget)
+        
+        return select
+    
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """经调度器批量调用嵌入接口，已缓存的文本不再请求"""
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        keys = [self.cache.make_key(self.embedding_model, [text], {'endpoint': 'embeddings'}) if self.cache else None
+                for text in texts]
+        missing = []
+        for i, key in enumerate(keys):
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                vectors[i] = json.loads(cached)
+            else:
+                missing.append(i)
         
-        return timeline[:20]  # 限制时间线事件数量
+        for start in range(0, len(missing), self.EMBEDDING_BATCH_SIZE):
+            batch = missing[start:start + self.EMBEDDING_BATCH_SIZE]
+            inputs = [texts[i] for i in batch]
+            estimated_tokens = sum(self.token_counter.count(text) for text in inputs)
+            start_time = time.time()
+            try:
+                response, retries = self.scheduler.execute(
+                    lambda: self.client.embeddings.create(model=self.embedding_model, input=inputs,
+                                                          timeout=self.call_timeout),
+                    purpose='embedding',
+                    estimated_tokens=estimated_tokens
+                )
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                retryable = isinstance(e, RequestScheduler.RETRYABLE_ERRORS) and not RequestScheduler.is_quota_exhausted(e)
+                retries = self.scheduler.max_retries if retryable else 0
+                self.usage.record('embedding', self.embedding_model, 0, 0, time.time() - start_time,
+                                  retries=retries, error=str(e))
+                raise
+            
+            usage = getattr(response, 'usage', None)
+            self.usage.record('embedding', self.embedding_model, usage.prompt_tokens if usage else estimated_tokens, 0,
+                              time.time() - start_time, retries=retries)
+            for item in response.data:
+                i = batch[item.index]
+                vectors[i] = item.embedding
+                if keys[i]:
+                    self.cache.set(keys[i], json.dumps(item.embedding))
+        
+        return np.asarray(vectors, dtype=np.float32)
+    
+    def _corpus_prefix(self, articles: List[Dict], max_tokens: int) -> str:
+        """按顺序拼接文章内容，达到token上限即停止"""
+        return self.token_counter.pack((article['content'] for article in articles), max_tokens)
+    
+    def _sort_by_date(self, articles: List[Dict]) -> List[Dict]:
+        """按规范化日期升序排列文章"""
+        return sorted(articles, key=lambda x: x.get('normalized_date', datetime.now()))
+    
+    def _generate_mock_summary(self) -> str:
+        """生成模拟摘要"""
+        return "这是关于人工智能最新进展的综合摘要。近期研究表明，人工智能技术在多个领域取得了重大突破，包括大型语言模型、计算机视觉和机器人技术。专家预测，这些技术将在未来几年对社会和经济产生深远影响。"
     
     def _generate_mock_entities(self, top_n: int) -> List[Dict]:
         """生成模拟实体数据"""
@@ -0,0 +1,155 @@
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Set, Iterator, Callable, Optional
+
+from processor.batch_jobs import DeferredRequest
+from processor.request_scheduler import RequestCancelled, submit_in_context
+
+logger = logging.getLogger(__name__)
+
+class MapReduceSummarizer:
+    """分层map-reduce摘要：按预算把文章分块并行摘要，再逐层合并部分摘要，直到得到一份总摘要"""
+
+    def __init__(self, chat: Callable[..., str], model: str = "gpt-3.5-turbo", chunk_size: int = 3000,
+                 length_fn: Callable[[str], int] = len, partial_length: int = 300, max_workers: int = 4,
+                 max_levels: int = 5):
+        # chat(messages=..., model=..., **params) 返回模型输出文本，由LLMProcessor提供
+        self.chat = chat
+        self.model = model
+        # 块大小的单位由length_fn决定，默认按字符，LLMProcessor传入token计数函数
+        self.chunk_size = chunk_size
+        self.length_fn = length_fn
+        self.partial_length = partial_length
+        self.max_workers = max_workers
+        self.max_levels = max_levels
+
+    def summarize(self, articles: List[Dict], max_length: int = 500, on_update: Callable[[str], None] = None,
+                  failed: Set[str] = None) -> str:
+        """对全部文章生成总摘要；任何一层全部失败时抛出异常，由调用方回退
+
+        部分文本块摘要失败时跳过这些块继续合并，并在failed中加入'summary'，调用方据此判断摘要没有覆盖全部文章。
+        提供on_update时只有最终的合并请求以流式方式发出，中间层的部分摘要不对外展示。
+        """
+        chunks = list(self._chunk_articles(articles))
+        if not chunks:
+            raise ValueError("没有可摘要的文章内容")
+
+        logger.info(f"map阶段：{len(articles)} 篇文章分为 {len(chunks)} 个块")
+        if len(chunks) == 1:
+            return self._summarize_text(chunks[0], max_length, final=True, on_update=on_update)
+
+        partials = self._map(chunks, self.partial_length, failed)
+
+        # 部分摘要放不进一个块时继续分组合并，直到一组即可容纳
+        level = 1
+        while len(partials) > 1 and level < self.max_levels:
+            groups = self._group_texts(partials)
+            if len(groups) == 1:
+                break
+            logger.info(f"reduce第 {level} 层：{len(partials)} 份部分摘要合并为 {len(groups)} 组")
+            partials = self._map(["\n\n".join(group) for group in groups], self.partial_length, failed)
+            level += 1
+
+        return self._summarize_text("\n\n".join(partials), max_length, final=True, on_update=on_update)
+
+    def _chunk_articles(self, articles: List[Dict]) -> Iterator[str]:
+        """逐篇累积文章直到达到块预算；超长文章按句子切开，不生成整个语料的拼接字符串"""
+        current: List[str] = []
+        current_len = 0
+
+        for article in articles:
+            for piece in self._split_article(article):
+                piece_len = self.length_fn(piece)
+                if current and current_len + piece_len > self.chunk_size:
+                    yield "\n\n".join(current)
+                    current, current_len = [], 0
+                current.append(piece)
+                current_len += piece_len + 1
+
+        if current:
+            yield "\n\n".join(current)
+
+    def _split_article(self, article: Dict) -> Iterator[str]:
+        """单篇文章不超过预算时整体返回，否则按句子切成多段"""
+        header = f"【{article.get('source', '')}】{article.get('title', '')}\n"
+        content = article.get('content', '')
+        if self.length_fn(header + content) <= self.chunk_size:
+            yield header + content
+            return
+
+        sentences = article.get('sentences') or re.split(r'(?<=[。！？.!?])\s*', content)
+        piece = header
+        piece_len = self.length_fn(header)
+        for sentence in sentences:
+            # 单个句子本身超出预算时按字符截断（字符数不少于token数，截断后必然放得下）
+            sentence = sentence[:self.chunk_size - len(header)]
+            sentence_len = self.length_fn(sentence)
+            if piece_len + sentence_len > self.chunk_size and piece != header:
+                yield piece
+                piece = header
+                piece_len = self.length_fn(header)
+            piece += sentence + " "
+            piece_len += sentence_len + 1
+        if piece != header:
+            yield piece
+
+    def _group_texts(self, texts: List[str]) -> List[List[str]]:
+        """把部分摘要按预算分组，每组至少两份，保证每一层都在收敛"""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        current_len = 0
+        for text in texts:
+            text_len = self.length_fn(text)
+            if len(current) >= 2 and current_len + text_len > self.chunk_size:
+                groups.append(current)
+                current, current_len = [], 0
+            current.append(text)
+            current_len += text_len + 1
+        if current:
+            groups.append(current)
+        return groups
+
+    def _map(self, texts: List[str], max_length: int, failed: Set[str] = None) -> List[str]:
+        """并行摘要多个文本块，失败的块被丢弃并记录到failed"""
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(texts)))) as executor:
+            futures = [submit_in_context(executor, self._safe_summarize, text, max_length) for text in texts]
+            results = [future.result() for future in futures]
+
+        partials = [result for result in results if result]
+        if not partials:
+            raise RuntimeError("所有文本块摘要均失败")
+        if len(partials) < len(texts):
+            logger.warning(f"{len(texts) - len(partials)} 个文本块摘要失败，已跳过")
+            if failed is not None:
+                failed.add('summary')
+        return partials
+
+    def _safe_summarize(self, text: str, max_length: int) -> Optional[str]:
+        try:
+            return self._summarize_text(text, max_length, final=False)
+        except (DeferredRequest, RequestCancelled):
+            # 批处理收集模式下不能用部分块的摘要继续合并，否则会提交内容不完整的合并请求；
+            # 所属分析已放弃时也不再继续
+            raise
+        except Exception as e:
+            logger.error(f"文本块摘要出错: {e}")
+            return None
+
+    def _summarize_text(self, text: str, max_length: int, final: bool,
+                        on_update: Callable[[str], None] = None) -> str:
+        """调用LLM摘要一段文本；中间层要求保留事实细节，最终层生成完整的综合摘要"""
+        if final:
+            instruction = f"请为以下内容生成一个全面的摘要，长度不超过{max_length}个字符。摘要应包含关键事件、重要发现和主要结论。"
+        else:
+            instruction = f"请概括以下内容中的关键事实、人物、机构、时间和数据，长度不超过{max_length}个字符，供后续合并使用。"
+
+        return self.chat(
+            model=self.model,
+            purpose='summary_reduce' if final else 'summary_map',
+            on_update=on_update,
+            messages=[
+                {"role": "system", "content": "你是一个专业的摘要生成器。请生成简洁、全面且信息丰富的摘要。"},
+                {"role": "user", "content": f"{instruction}\n\n文本：{text}"}
+            ]
+        )
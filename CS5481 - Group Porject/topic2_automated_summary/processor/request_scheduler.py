@@ -0,0 +1,252 @@
+import re
+import time
+import heapq
+import random
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from concurrent.futures import Executor, Future
+from typing import Callable, Tuple, Any, Optional
+
+from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+logger = logging.getLogger(__name__)
+
+# 当前线程所属分析的取消标志，由cancel_scope()设置；线程池中的任务通过submit_in_context()继承
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar('request_cancel_event',
+                                                                                         default=None)
+
+
+class RequestCancelled(Exception):
+    """请求所属的分析已被放弃，排队或退避中的请求不再发出"""
+
+
+@contextmanager
+def cancel_scope(event: threading.Event):
+    """在此范围内（以及由submit_in_context提交的任务中）发起的请求在event被设置后不再发出"""
+    token = _cancel_event.set(event)
+    try:
+        yield event
+    finally:
+        _cancel_event.reset(token)
+
+
+def submit_in_context(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """把任务连同当前的上下文变量（取消标志等）一起提交到线程池，线程池的工作线程默认不继承调用方的上下文"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class RequestScheduler:
+    """集中式LLM请求调度器：每分钟请求数/token数预算、按优先级排队、有界并发，以及429自适应退避
+
+    所有线程都通过execute()发起请求。空闲名额总是先分配给优先级最高（数值最小）的等待者，
+    因此预算紧张时摘要请求会排在时间线请求之前。
+    """
+
+    # 用途到优先级的映射，数值越小越优先
+    PRIORITIES = {
+        'summary': 0,
+        'summary_reduce': 0,
+        'analysis': 0,
+        'summary_map': 1,
+        'embedding': 1,
+        'entities': 1,
+        'themes': 1,
+        'timeline': 2,
+        'general': 2
+    }
+    RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+    # OpenAI的x-ratelimit-reset-*使用 "6m0s"、"1.5s"、"20ms" 形式的时长
+    DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+    DURATION_UNITS = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+
+    def __init__(self, requests_per_minute: int = 500, tokens_per_minute: int = 200000, max_concurrency: int = 8,
+                 max_retries: int = 4, base_backoff: float = 1.0, max_backoff: float = 60.0, window: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.window = window
+
+        self._condition = threading.Condition()
+        self._waiting = []          # (priority, seq) 小顶堆
+        self._seq = 0
+        self._active = 0
+        self._sent = deque()        # (时间戳, token数)，滑动窗口内已发出的请求
+        self._window_tokens = 0
+        self._paused_until = 0.0
+        # 收到429后临时降低并发上限，连续成功后逐步恢复
+        self._concurrency_limit = max_concurrency
+        self.stats = {'requests': 0, 'rate_limited': 0, 'retries': 0, 'wait_time': 0.0}
+
+    def execute(self, func: Callable[[], Any], purpose: str = 'general', estimated_tokens: int = 0) -> Tuple[Any, int]:
+        """在预算允许时执行func，返回 (结果, 重试次数)；不可重试的错误或重试耗尽时抛出异常
+
+        所属分析被取消（见cancel_scope）时，排队或退避中的请求抛出RequestCancelled，不再发出。
+        """
+        priority = self.PRIORITIES.get(purpose, self.PRIORITIES['general'])
+        cancelled = _cancel_event.get()
+        retries = 0
+        while True:
+            self._acquire(priority, estimated_tokens, cancelled)
+            try:
+                result = func()
+            except self.RETRYABLE_ERRORS as e:
+                # 不再重试的失败直接抛出，不暂停调度器、不降低其他请求的并发上限
+                if retries >= self.max_retries or self.is_quota_exhausted(e):
+                    raise
+                delay = self._on_error(e, retries)
+                retries += 1
+                with self._condition:
+                    self.stats['retries'] += 1
+                logger.warning(f"{purpose} 请求失败（{type(e).__name__}），{delay:.1f}秒后第 {retries} 次重试")
+                if cancelled is not None:
+                    if cancelled.wait(delay):
+                        raise RequestCancelled(purpose)
+                else:
+                    time.sleep(delay)
+                continue
+            finally:
+                self._release()
+
+            self._on_success()
+            return result, retries
+
+    def _acquire(self, priority: int, tokens: int, cancelled: threading.Event = None) -> None:
+        """排队等待并发名额和窗口预算；等待期间定期检查取消标志"""
+        start = time.time()
+        with self._condition:
+            self._seq += 1
+            entry = (priority, self._seq)
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    if cancelled is not None and cancelled.is_set():
+                        raise RequestCancelled()
+                    if self._waiting[0] == entry:
+                        wait = self._wait_time(tokens)
+                        if wait <= 0:
+                            break
+                    else:
+                        # 不是队首时等待前面的请求发出后的通知
+                        wait = 1.0
+                    self._condition.wait(timeout=wait if cancelled is None else min(wait, 1.0))
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+
+            self._active += 1
+            now = time.time()
+            self._sent.append((now, tokens))
+            self._window_tokens += tokens
+            self.stats['requests'] += 1
+            self.stats['wait_time'] += now - start
+            # 让下一个等待者重新检查
+            self._condition.notify_all()
+
+    def _wait_time(self, tokens: int) -> float:
+        """计算队首请求还需等待的秒数，0表示可以立即发出（调用时需持有锁）"""
+        now = time.time()
+        while self._sent and now - self._sent[0][0] >= self.window:
+            self._window_tokens -= self._sent.popleft()[1]
+
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._active >= self._concurrency_limit:
+            return 1.0
+        if len(self._sent) >= self.requests_per_minute:
+            return self._sent[0][0] + self.window - now
+        # 单个请求超过整个窗口预算时，只要窗口为空就放行，避免永久阻塞
+        if self._sent and self._window_tokens + tokens > self.tokens_per_minute:
+            return self._sent[0][0] + self.window - now
+        return 0
+
+    def _release(self) -> None:
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _on_error(self, error: Exception, attempt: int) -> float:
+        """根据错误计算退避时间；429时暂停全部请求并降低并发上限"""
+        delay = min(self.max_backoff, self.base_backoff * (2 ** attempt)) * (1 + random.random() * 0.25)
+        if isinstance(error, RateLimitError):
+            retry_after = self._retry_after(error)
+            if retry_after is not None:
+                delay = retry_after
+            with self._condition:
+                self.stats['rate_limited'] += 1
+                self._paused_until = max(self._paused_until, time.time() + delay)
+                self._concurrency_limit = max(1, self._concurrency_limit // 2)
+            logger.warning(f"触发速率限制，暂停 {delay:.1f} 秒，并发上限降为 {self._concurrency_limit}")
+        return delay
+
+    @staticmethod
+    def is_quota_exhausted(error: Exception) -> bool:
+        """额度用尽（insufficient_quota）的429在充值之前不会成功，不应重试"""
+        return isinstance(error, RateLimitError) and 'insufficient_quota' in (getattr(error, 'code', None),
+                                                                            getattr(error, 'type', None))
+
+    def _on_success(self) -> None:
+        with self._condition:
+            if self._concurrency_limit < self.max_concurrency:
+                self._concurrency_limit += 1
+                self._condition.notify_all()
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        """读取响应头中的等待时间：retry-after-ms（毫秒）、Retry-After（秒数或HTTP日期），
+        以及OpenAI的x-ratelimit-reset-requests/x-ratelimit-reset-tokens（时长）"""
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        for name in ('retry-after-ms', 'retry-after', 'x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens'):
+            value = headers.get(name)
+            if not value:
+                continue
+            if name == 'retry-after-ms':
+                seconds = self._parse_duration(f"{value}ms")
+            elif name == 'retry-after':
+                seconds = self._parse_duration(value)
+                if seconds is None:
+                    seconds = self._parse_http_date(value)
+            else:
+                seconds = self._parse_duration(value)
+            if seconds is not None:
+                return min(self.max_backoff, max(0.0, seconds))
+        return None
+
+    @classmethod
+    def _parse_duration(cls, value: str) -> Optional[float]:
+        """解析秒数（"3"、"1.5"）或带单位的时长（"6m0s"、"1h2m"、"20ms"），无法解析时返回None"""
+        text = str(value).strip().lower()
+        try:
+            return float(text)
+        except ValueError:
+            pass
+        parts = cls.DURATION_PATTERN.findall(text)
+        if not parts or "".join(number + unit for number, unit in parts) != text:
+            return None
+        return sum(float(number) * cls.DURATION_UNITS[unit] for number, unit in parts)
+
+    @staticmethod
+    def _parse_http_date(value: str) -> Optional[float]:
+        """Retry-After也可以是HTTP日期，返回距现在的秒数"""
+        try:
+            return parsedate_to_datetime(str(value)).timestamp() - time.time()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return None
+
+    def get_stats(self) -> dict:
+        """返回调度统计和当前队列状态"""
+        with self._condition:
+            stats = dict(self.stats)
+            stats['concurrency_limit'] = self._concurrency_limit
+            stats['queued'] = len(self._waiting)
+            stats['active'] = self._active
+        return stats
@@ -0,0 +1,184 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+from typing import List, Dict, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+class RunCheckpoint:
+    """把一次运行中各阶段的输出保存到运行目录，失败后可以从中间阶段继续
+
+    运行目录为 runs_dir/<时间>_<主题哈希>/，每个阶段一个gzip压缩的紧凑JSON文件（crawl.json.gz、
+    process.json.gz、analyze.json.gz），datetime字段带类型标记以便原样恢复；meta.json记录主题、
+    已完成的阶段和失败的阶段。写入临时文件后原子替换，中断时不会留下半个检查点。
+    reuse_until之前的阶段在有检查点时直接读取，之后的阶段重新计算并覆盖检查点；某个阶段重新计算后，
+    其后的阶段不再读取基于旧输入的检查点。结果不完整（如部分分析任务回退到模拟数据）的阶段以partial标记保存，
+    继续运行时总是重新计算。
+    """
+
+    STAGES = ('crawl', 'process', 'analyze', 'render')
+    # 有检查点的阶段（render的输出就是页面本身）
+    SAVED_STAGES = ('crawl', 'process', 'analyze')
+    VERSION = 1
+
+    def __init__(self, run_dir: str, topic: str, reuse_until: int = 0):
+        self.run_dir = run_dir
+        self.topic = topic
+        self.reuse_until = reuse_until
+        os.makedirs(run_dir, exist_ok=True)
+        self.meta = self._load_meta() or {'version': self.VERSION, 'topic': topic, 'created_at': time.time(),
+                                          'stages': {}}
+
+    @staticmethod
+    def _topic_hash(topic: str) -> str:
+        return hashlib.sha256(topic.encode('utf-8')).hexdigest()[:8]
+
+    @classmethod
+    def create(cls, runs_dir: str, topic: str, keep: int = 5) -> "RunCheckpoint":
+        """为主题新建运行目录，只保留该主题最近的keep个运行"""
+        name = f"{time.strftime('%Y%m%d_%H%M%S')}_{cls._topic_hash(topic)}"
+        run_dir = os.path.join(runs_dir, name)
+        # 同一秒内的运行取比已有序号更大的后缀（较早的运行可能已被清理，不能复用空出的名字，否则排序会颠倒）
+        suffixes = [int(parts[3]) if len(parts) > 3 else 1
+                    for parts in (existing.split('_') for existing in
+                                  (os.listdir(runs_dir) if os.path.isdir(runs_dir) else []))
+                    if '_'.join(parts[:3]) == name and (len(parts) == 3 or parts[3].isdigit())]
+        if suffixes:
+            run_dir = os.path.join(runs_dir, f"{name}_{max(suffixes) + 1}")
+        checkpoint = cls(run_dir, topic)
+        checkpoint._write_meta()
+        if keep > 0:
+            for old_run in cls.list_runs(runs_dir, topic)[keep:]:
+                shutil.rmtree(old_run, ignore_errors=True)
+        return checkpoint
+
+    @classmethod
+    def resume(cls, runs_dir: str, topic: str, run_id: str = None, from_stage: str = None) -> Optional["RunCheckpoint"]:
+        """打开已有的运行目录（默认为该主题最近的一次运行）；from_stage及之后的阶段重新计算，默认从第一个没有检查点的阶段开始"""
+        if run_id:
+            run_dir = run_id if os.path.isdir(run_id) else os.path.join(runs_dir, run_id)
+            if not os.path.isdir(run_dir):
+                logger.error(f"运行目录不存在: {run_dir}")
+                return None
+        else:
+            runs = cls.list_runs(runs_dir, topic)
+            if not runs:
+                logger.warning(f"没有找到主题 '{topic}' 之前的运行，将从头开始")
+                return None
+            run_dir = runs[0]
+
+        reuse_until = cls.STAGES.index(from_stage) if from_stage else len(cls.STAGES)
+        checkpoint = cls(run_dir, topic, reuse_until=reuse_until)
+        if checkpoint.meta.get('topic') != topic:
+            logger.warning(f"运行目录 {run_dir} 属于主题 '{checkpoint.meta.get('topic')}'，与当前主题 '{topic}' 不同")
+        logger.info(f"从运行目录 {run_dir} 继续，已有检查点: {checkpoint.completed()}")
+        return checkpoint
+
+    @classmethod
+    def list_runs(cls, runs_dir: str, topic: str) -> List[str]:
+        """主题的运行目录，最新的在前"""
+        if not os.path.isdir(runs_dir):
+            return []
+        topic_hash = cls._topic_hash(topic)
+        runs = []
+        for name in os.listdir(runs_dir):
+            parts = name.split('_')
+            if parts[2:3] == [topic_hash] and os.path.isdir(os.path.join(runs_dir, name)):
+                # 同一秒内的多次运行带有序号后缀
+                runs.append(((parts[0], parts[1], int(parts[3]) if len(parts) > 3 else 1), name))
+        return [os.path.join(runs_dir, name) for _, name in sorted(runs, reverse=True)]
+
+    def _path(self, stage: str) -> str:
+        return os.path.join(self.run_dir, f"{stage}.json.gz")
+
+    def completed(self) -> List[str]:
+        """有完整检查点的阶段"""
+        return [stage for stage in self.SAVED_STAGES
+                if os.path.exists(self._path(stage)) and not self.is_partial(stage)]
+
+    def is_partial(self, stage: str) -> bool:
+        return bool(self.meta['stages'].get(stage, {}).get('partial'))
+
+    def reusable(self, stage: str) -> bool:
+        return (self.STAGES.index(stage) < self.reuse_until and os.path.exists(self._path(stage))
+                and not self.is_partial(stage))
+
+    def load(self, stage: str) -> Optional[Any]:
+        """读取阶段检查点；文件损坏时返回None，调用方重新计算该阶段"""
+        try:
+            with gzip.open(self._path(stage), 'rt', encoding='utf-8') as f:
+                return json.load(f, object_hook=self._decode)
+        except (OSError, ValueError, EOFError) as e:
+            logger.warning(f"读取 {stage} 阶段检查点失败: {e}，将重新计算")
+            return None
+
+    def save(self, stage: str, data: Any, partial: bool = False) -> None:
+        """保存阶段检查点；partial表示结果不完整，继续运行时不会复用"""
+        start = time.time()
+        fd, tmp_path = tempfile.mkstemp(dir=self.run_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0) as f:
+                f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=self._encode).encode('utf-8'))
+            os.replace(tmp_path, self._path(stage))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.meta['stages'][stage] = {'saved_at': time.time(), 'bytes': os.path.getsize(self._path(stage)),
+                                      'partial': partial}
+        self.meta.pop('failed_stage', None)
+        self._write_meta()
+        # 本阶段的输出已经更新，之后的阶段必须基于新的输出重新计算
+        self.reuse_until = min(self.reuse_until, self.STAGES.index(stage) + 1)
+        logger.info(f"{stage} 阶段检查点已保存（{'不完整，' if partial else ''}"
+                    f"{self.meta['stages'][stage]['bytes'] / 1024:.1f}KB，{time.time() - start:.2f}秒）")
+
+    def mark_failed(self, stage: str, error: str) -> None:
+        self.meta['failed_stage'] = stage
+        self.meta['error'] = error
+        self._write_meta()
+
+    def mark_done(self, output_file: str) -> None:
+        self.meta['stages']['render'] = {'saved_at': time.time(), 'output': output_file}
+        self.meta.pop('failed_stage', None)
+        self.meta.pop('error', None)
+        self._write_meta()
+
+    def _load_meta(self) -> Optional[Dict]:
+        path = os.path.join(self.run_dir, "meta.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.run_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_path, os.path.join(self.run_dir, "meta.json"))
+
+    @staticmethod
+    def _encode(value: Any) -> Any:
+        if isinstance(value, datetime):
+            return {'__datetime__': value.isoformat()}
+        if isinstance(value, (set, tuple)):
+            return list(value)
+        if hasattr(value, 'tolist'):
+            # numpy数组和标量
+            return value.tolist()
+        return str(value)
+
+    @staticmethod
+    def _decode(obj: Dict) -> Any:
+        if len(obj) == 1 and '__datetime__' in obj:
+            return datetime.fromisoformat(obj['__datetime__'])
+        return obj
@@ -0,0 +1,162 @@
+import re
+import zlib
+import hashlib
+import logging
+from collections import defaultdict
+from typing import List, Dict, Set
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class SentenceDeduplicator:
+    """跨文章句子去重，用于压缩LLM提示
+
+    转载稿在多个来源中重复出现相同或几乎相同的句子。规范化后的句子先做精确哈希匹配，
+    再用字符shingle的MinHash签名和LSH分桶查找近似重复：同桶候选先按签名一致率批量筛选，
+    再用真实的Jaccard相似度确认。
+    每个句子只保留第一次出现的版本，并标注同样报道了该句的其他来源。
+    """
+
+    NORMALIZE_PATTERN = re.compile(r'[\W_]+', re.UNICODE)
+    MERSENNE_PRIME = (1 << 31) - 1
+
+    def __init__(self, shingle_size: int = 4, num_hashes: int = 32, bands: int = 8, threshold: float = 0.7,
+                 min_length: int = 10, max_verifications: int = 5, seed: int = 1):
+        if num_hashes % bands:
+            raise ValueError("num_hashes必须能被bands整除")
+        self.shingle_size = shingle_size
+        self.num_hashes = num_hashes
+        self.bands = bands
+        self.rows = num_hashes // bands
+        self.threshold = threshold
+        # 过短的句子（如“他说。”）不参与去重
+        self.min_length = min_length
+        self.max_verifications = max_verifications
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, self.MERSENNE_PRIME, size=num_hashes).astype(np.uint64)
+        self._b = rng.randint(0, self.MERSENNE_PRIME, size=num_hashes).astype(np.uint64)
+
+    def compact(self, articles: List[Dict]) -> List[Dict]:
+        """返回去重后的文章副本：sentences和content只包含首次出现的句子，被其他来源重复的句子附带来源标注
+
+        去重后没有剩余句子的文章被丢弃；其他字段保持不变。
+        """
+        kept = []                                # 每项: {'article', 'sentence', 'shingles', 'sources'}
+        signatures = np.zeros((64, self.num_hashes), dtype=np.uint64)
+        exact_index: Dict[str, int] = {}
+        buckets: Dict[tuple, List[int]] = defaultdict(list)
+        per_article: List[List[int]] = [[] for _ in articles]
+        stats = {'sentences': 0, 'exact_duplicates': 0, 'near_duplicates': 0}
+
+        for article_idx, article in enumerate(articles):
+            source = article.get('source', '')
+            for sentence in self._sentences(article):
+                stats['sentences'] += 1
+                normalized = self.NORMALIZE_PATTERN.sub('', sentence.lower())
+                if len(normalized) < self.min_length:
+                    per_article[article_idx].append(self._add(kept, article_idx, sentence, set()))
+                    signatures = self._grow(signatures, len(kept))
+                    continue
+
+                digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+                if digest in exact_index:
+                    kept[exact_index[digest]]['sources'].add(source)
+                    stats['exact_duplicates'] += 1
+                    continue
+
+                shingles = self._shingles(normalized)
+                signature = self._signature(shingles)
+                band_keys = self._band_keys(signature)
+                match = self._find_near_duplicate(kept, signatures, buckets, band_keys, signature, shingles)
+                if match is not None:
+                    kept[match]['sources'].add(source)
+                    exact_index[digest] = match
+                    stats['near_duplicates'] += 1
+                    continue
+
+                index = self._add(kept, article_idx, sentence, shingles)
+                signatures = self._grow(signatures, len(kept))
+                signatures[index] = signature
+                exact_index[digest] = index
+                for key in band_keys:
+                    buckets[key].append(index)
+                per_article[article_idx].append(index)
+
+        compacted = []
+        for article_idx, article in enumerate(articles):
+            sentences = [self._attribute(kept[index], article.get('source', '')) for index in per_article[article_idx]]
+            if not sentences:
+                continue
+            compacted.append(dict(article, sentences=sentences, content=" ".join(sentences)))
+
+        removed = stats['exact_duplicates'] + stats['near_duplicates']
+        logger.info(f"句子去重：共 {stats['sentences']} 句，去除 {removed} 句"
+                    f"（完全重复 {stats['exact_duplicates']}，近似重复 {stats['near_duplicates']}），"
+                    f"{len(articles) - len(compacted)} 篇文章的内容全部与其他文章重复")
+        return compacted
+
+    def _sentences(self, article: Dict) -> List[str]:
+        sentences = article.get('sentences') or re.split(r'(?<=[。！？.!?])\s*', article.get('content', ''))
+        return [sentence.strip() for sentence in sentences if sentence.strip()]
+
+    def _add(self, kept: List[Dict], article_idx: int, sentence: str, shingles: Set[int]) -> int:
+        kept.append({'article': article_idx, 'sentence': sentence, 'shingles': shingles, 'sources': set()})
+        return len(kept) - 1
+
+    def _shingles(self, normalized: str) -> Set[int]:
+        """字符级shingle的哈希集合，对中英文都适用"""
+        size = min(self.shingle_size, len(normalized))
+        return {zlib.crc32(normalized[i:i + size].encode('utf-8'))
+                for i in range(len(normalized) - size + 1)}
+
+    def _grow(self, signatures: np.ndarray, size: int) -> np.ndarray:
+        """签名矩阵按倍增方式扩容"""
+        if size <= len(signatures):
+            return signatures
+        grown = np.zeros((len(signatures) * 2, self.num_hashes), dtype=np.uint64)
+        grown[:len(signatures)] = signatures
+        return grown
+
+    def _signature(self, shingles: Set[int]) -> np.ndarray:
+        """MinHash签名：每个哈希函数下shingle哈希的最小值"""
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        return ((np.outer(self._a, values) + self._b[:, None]) % self.MERSENNE_PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[tuple]:
+        """把签名切分为LSH分桶键"""
+        return [(band,) + tuple(signature[band * self.rows:(band + 1) * self.rows].tolist())
+                for band in range(self.bands)]
+
+    def _find_near_duplicate(self, kept: List[Dict], signatures: np.ndarray, buckets: Dict[tuple, List[int]],
+                             band_keys: List[tuple], signature: np.ndarray, shingles: Set[int]):
+        """在同桶的已保留句子中查找Jaccard相似度达到阈值的句子
+
+        同桶句子可能很多（模板化的句子共享大量shingle），先用签名一致率（Jaccard的无偏估计）
+        批量筛掉明显不相似的候选，再按估计值从高到低对少数候选计算真实的Jaccard。
+        """
+        candidates = set()
+        for key in band_keys:
+            candidates.update(buckets.get(key, ()))
+        if not candidates:
+            return None
+
+        indexes = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        estimates = (signatures[indexes] == signature).mean(axis=1)
+        # 32个哈希时估计值的标准差约0.08，筛选时放宽一些
+        # 只验证估计值最高的几个候选，模板化语料中大量候选的估计值都接近阈值
+        order = np.argsort(-estimates)[:self.max_verifications]
+        for position in order:
+            if estimates[position] < self.threshold - 0.1:
+                break
+            index = int(indexes[position])
+            other = kept[index]['shingles']
+            if len(shingles & other) / len(shingles | other) >= self.threshold:
+                return index
+        return None
+
+    def _attribute(self, item: Dict, own_source: str) -> str:
+        """为被其他来源重复报道的句子附加来源标注"""
+        others = sorted(source for source in item['sources'] if source and source != own_source)
+        if not others:
+            return item['sentence']
+        return f"{item['sentence']}〔另见：{'、'.join(others)}〕"
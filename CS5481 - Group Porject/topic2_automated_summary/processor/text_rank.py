@@ -0,0 +1,154 @@
+import re
+import zlib
+import logging
+from typing import List, Dict, Tuple, Callable
+import numpy as np
+import networkx as nx
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+class TextRankSummarizer:
+    """基于TextRank的抽取式预摘要，从全部文章中挑选最具代表性的句子作为LLM输入"""
+
+    WORD_PATTERN = re.compile(r"[a-z0-9]+|[\u4e00-\u9fa5]+")
+    # 分块计算相似度时每块的句子数，每块只需要 块大小×句子数 的稠密内存
+    BLOCK_SIZE = 256
+
+    def __init__(self, n_features: int = 4096, top_k_neighbors: int = 10, min_similarity: float = 0.1,
+                 damping: float = 0.85, min_sentence_length: int = 10, max_sentences: int = 10000):
+        self.n_features = n_features
+        self.top_k_neighbors = top_k_neighbors
+        self.min_similarity = min_similarity
+        self.damping = damping
+        self.min_sentence_length = min_sentence_length
+        self.max_sentences = max_sentences
+
+    def summarize(self, articles: List[Dict], budget: int = 3000, length_fn: Callable[[str], int] = len) -> str:
+        """按中心度选出句子直到达到预算（默认按字符计，可传入token计数函数），再按原文顺序拼接成摘要底稿"""
+        ranked = self.rank_sentences(articles)
+        if not ranked:
+            return ""
+
+        selected = []
+        total = 0
+        for score, position, sentence in ranked:
+            length = length_fn(sentence)
+            if total + length > budget:
+                continue
+            selected.append((position, sentence))
+            total += length + 1
+
+        selected.sort()
+        return "\n".join(sentence for _, sentence in selected)
+
+    def rank_sentences(self, articles: List[Dict]) -> List[Tuple[float, Tuple[int, int], str]]:
+        """返回 (PageRank得分, (文章序号, 句子序号), 句子) 列表，按得分降序"""
+        sentences, positions = self._collect_sentences(articles)
+        if not sentences:
+            return []
+        if len(sentences) <= 2:
+            return [(1.0, position, sentence) for position, sentence in zip(positions, sentences)]
+
+        graph = self._build_graph(self._feature_matrix(sentences))
+        scores = nx.pagerank(graph, alpha=self.damping, weight='weight')
+
+        ranked = sorted(
+            ((scores.get(i, 0.0), positions[i], sentences[i]) for i in range(len(sentences))),
+            key=lambda item: item[0],
+            reverse=True
+        )
+        logger.info(f"TextRank完成，共 {len(sentences)} 个句子，图中 {graph.number_of_edges()} 条边")
+        return ranked
+
+    def _collect_sentences(self, articles: List[Dict]) -> Tuple[List[str], List[Tuple[int, int]]]:
+        """收集句子（优先使用DataProcessor生成的sentences字段），过滤过短的句子和完全重复的句子
+
+        句子总数超过max_sentences时按文章轮流抽取（每篇文章依次取下一句），每篇文章都有句子参与排序，
+        而不是只保留前几篇文章的句子。
+        """
+        per_article = []
+        seen = set()
+        for article_idx, article in enumerate(articles):
+            article_sentences = article.get('sentences') or re.split(r'(?<=[。！？.!?])\s*', article.get('content', ''))
+            collected = []
+            for sentence_idx, sentence in enumerate(article_sentences):
+                sentence = sentence.strip()
+                if len(sentence) < self.min_sentence_length or sentence in seen:
+                    continue
+                seen.add(sentence)
+                collected.append((sentence, (article_idx, sentence_idx)))
+            if collected:
+                per_article.append(collected)
+
+        total = sum(len(collected) for collected in per_article)
+        if total > self.max_sentences:
+            logger.info(f"句子数量 {total} 超过上限 {self.max_sentences}，按文章轮流抽取")
+            sampled = []
+            depth = 0
+            while len(sampled) < self.max_sentences:
+                sampled.extend(collected[depth] for collected in per_article if depth < len(collected))
+                depth += 1
+            # 按原文顺序排列，摘要拼接时保持文章内的句子顺序
+            items = sorted(sampled[:self.max_sentences], key=lambda item: item[1])
+        else:
+            items = [item for collected in per_article for item in collected]
+
+        return [sentence for sentence, _ in items], [position for _, position in items]
+
+    def _features(self, sentence: str) -> List[int]:
+        """英文按单词、中文按字符二元组做哈希特征"""
+        features = []
+        for token in self.WORD_PATTERN.findall(sentence.lower()):
+            if token[0] >= '\u4e00':
+                grams = [token[i:i + 2] for i in range(len(token) - 1)] or [token]
+            else:
+                if len(token) <= 2:
+                    continue
+                grams = [token]
+            features.extend(zlib.crc32(gram.encode('utf-8')) % self.n_features for gram in grams)
+        return features
+
+    def _feature_matrix(self, sentences: List[str]) -> sparse.csr_matrix:
+        """构建行归一化的TF-IDF哈希稀疏矩阵，每行只存储句子中实际出现的特征"""
+        rows, cols = [], []
+        for i, sentence in enumerate(sentences):
+            features = self._features(sentence)
+            rows.extend([i] * len(features))
+            cols.extend(features)
+
+        data = np.ones(len(cols), dtype=np.float32)
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(sentences), self.n_features), dtype=np.float32)
+        matrix.sum_duplicates()
+
+        doc_freq = np.bincount(matrix.indices, minlength=self.n_features)
+        idf = (np.log((len(sentences) + 1) / (doc_freq + 1)) + 1).astype(np.float32)
+        matrix.data *= idf[matrix.indices]
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(np.float32)
+        return matrix
+
+    def _build_graph(self, matrix: sparse.csr_matrix) -> nx.Graph:
+        """分块计算余弦相似度，只保留每个句子最相似的top_k个邻居且超过阈值的边，得到稀疏图
+
+        不会生成完整的 n×n 相似度矩阵，内存随句子数线性增长。
+        """
+        n = matrix.shape[0]
+        graph = nx.Graph()
+        graph.add_nodes_from(range(n))
+
+        k = min(self.top_k_neighbors, n - 1)
+        transposed = matrix.T.tocsc()
+        for start in range(0, n, self.BLOCK_SIZE):
+            block = (matrix[start:start + self.BLOCK_SIZE] @ transposed).toarray()
+            block[np.arange(block.shape[0]), np.arange(start, start + block.shape[0])] = 0.0
+            neighbors = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            for offset, row in enumerate(neighbors):
+                for j in row:
+                    weight = float(block[offset, j])
+                    if weight >= self.min_similarity:
+                        graph.add_edge(start + offset, int(j), weight=weight)
+
+        return graph
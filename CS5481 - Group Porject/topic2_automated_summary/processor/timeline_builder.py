@@ -0,0 +1,223 @@
+import re
+import json
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Set, Tuple, Optional, Callable
+
+from processor.batch_jobs import DeferredRequest
+from processor.request_scheduler import RequestCancelled, submit_in_context
+
+logger = logging.getLogger(__name__)
+
+class TimelineBuilder:
+    """批量时间线提取引擎：多篇文章打包成一个请求，批次之间并发执行，单篇文章失败互不影响"""
+
+    # ISO 8601写法（含时间和时区）先用datetime.fromisoformat解析，这里是其他常见写法
+    DATE_FORMATS = [
+        '%Y/%m/%d', '%Y.%m.%d', '%Y/%m/%d %H:%M', '%Y/%m/%d %H:%M:%S',
+        '%d %B %Y', '%B %d, %Y', '%B %d %Y', '%d %b %Y', '%b %d, %Y', '%b %d %Y', '%d/%m/%Y'
+    ]
+    PARTIAL_DATE_FORMATS = ['%Y-%m', '%Y/%m', '%B %Y', '%b %Y']
+    # 月份缩写后的点号（"Mar. 5"）和strptime不认识的"Sept"
+    MONTH_ABBR_PATTERN = re.compile(r'\b(Jan|Feb|Mar|Apr|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)\.', re.IGNORECASE)
+    CHINESE_DATE_PATTERN = re.compile(r'(\d{4})\s*年\s*(?:(\d{1,2})\s*月\s*(?:(\d{1,2})\s*[日号])?)?')
+
+    def __init__(self, chat: Callable[..., str], model: str = "gpt-3.5-turbo", batch_size: int = 4,
+                 max_concurrency: int = 3, article_budget: int = 1000, truncate: Callable[[str, int], str] = None,
+                 max_articles: int = 40, max_events: int = 20):
+        # chat(messages=..., model=..., validate=..., **params) 返回模型输出文本，由LLMProcessor提供（含缓存）
+        self.chat = chat
+        self.model = model
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        # 每篇文章内容的预算；未提供truncate时按字符截断
+        self.article_budget = article_budget
+        self.truncate = truncate or (lambda text, budget: text[:budget])
+        self.max_articles = max_articles
+        self.max_events = max_events
+        # 同一个实例可能被多个分析任务共享，用信号量限制全局并发请求数
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    def build(self, articles: List[Dict], content_fn: Callable[[Dict, int], str] = None,
+              failed: Set[str] = None) -> List[Dict]:
+        """提取并合并所有文章的时间线事件；content_fn(article, budget)可替代按预算截断选择文章内容
+
+        articles按日期升序排列，超过max_articles篇时只使用最近的文章；事件超出上限时同样保留最近的事件，
+        与增量分析的merge()一致，同一批文章全量分析和增量分析得到相同的时间线。
+        有批次请求失败（该批次使用标题生成的事件）时在failed中加入'timeline'，调用方据此判断结果不完整。
+        """
+        selected = articles[-self.max_articles:]
+        batches = [selected[i:i + self.batch_size] for i in range(0, len(selected), self.batch_size)]
+        logger.info(f"开始提取时间线，{len(selected)} 篇文章分为 {len(batches)} 个批次")
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(batches)))) as executor:
+            futures = [submit_in_context(executor, self._process_batch, batch, content_fn) for batch in batches]
+            batch_results = [future.result() for future in futures]
+
+        failed_batches = sum(1 for _, ok in batch_results if not ok)
+        if failed_batches and failed is not None:
+            logger.warning(f"{failed_batches} 个时间线批次提取失败，时间线结果不完整")
+            failed.add('timeline')
+        events = [event for batch_events, _ in batch_results for event in batch_events]
+        return self._merge_events(events)
+
+    def _process_batch(self, batch: List[Dict],
+                       content_fn: Callable[[Dict, int], str] = None) -> Tuple[List[Dict], bool]:
+        """处理一个批次，返回 (事件列表, 请求是否成功)；请求失败时该批次的每篇文章单独退化为基于标题和发布日期的事件"""
+        articles_by_id = {f"a{i + 1}": article for i, article in enumerate(batch)}
+        try:
+            with self._semaphore:
+                content = self.chat(
+                    model=self.model,
+                    purpose='timeline',
+                    # 解析失败的输出不写入缓存
+                    validate=self._parse_events,
+                    messages=[
+                        {"role": "system", "content": "你是一个时间线分析专家。请从文章中提取具体的事件和时间信息。"},
+                        {"role": "user", "content": self._build_prompt(articles_by_id, content_fn)}
+                    ],
+                    response_format={"type": "json_object"}
+                )
+            raw_events = self._parse_events(content)
+        except DeferredRequest:
+            return [self._fallback_event(article) for article in batch], False
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"时间线批次提取出错: {e}，该批次 {len(batch)} 篇文章使用标题生成事件")
+            return [self._fallback_event(article) for article in batch], False
+
+        events = []
+        covered = set()
+        for raw in raw_events:
+            if not isinstance(raw, dict) or not raw.get('event'):
+                continue
+            article = articles_by_id.get(str(raw.get('article_id', '')).strip())
+            default_date = article.get('normalized_date') if article else None
+            date = self._normalize_date(raw.get('date'), default_date)
+            if date is None:
+                continue
+            events.append(self._make_event(date, raw['event'], article))
+            if article:
+                covered.add(id(article))
+
+        # 模型漏掉的文章不影响其他文章的结果，同样用标题补一个事件
+        for article in batch:
+            if id(article) not in covered:
+                events.append(self._fallback_event(article))
+
+        return events, True
+
+    def _build_prompt(self, articles_by_id: Dict[str, Dict], content_fn: Callable[[Dict, int], str] = None) -> str:
+        """把一个批次的文章拼成带编号的提示"""
+        content_fn = content_fn or (lambda article, budget: self.truncate(article.get('content', ''), budget))
+        parts = []
+        for article_id, article in articles_by_id.items():
+            parts.append(
+                f"[{article_id}] 标题：{article.get('title', '')}\n"
+                f"发布时间：{article.get('published_date', '')}\n"
+                f"内容：{content_fn(article, self.article_budget)}"
+            )
+        articles_text = "\n\n".join(parts)
+        return (
+            "请从以下每篇文章中提取具体的事件信息，日期尽量使用YYYY-MM-DD格式，无法确定具体日期时使用文章发布时间。"
+            "以JSON格式返回：{\"events\": [{\"article_id\": \"文章编号\", \"date\": \"日期\", \"event\": \"事件描述\"}, ...]}\n\n"
+            f"{articles_text}"
+        )
+
+    def _parse_events(self, content: str) -> List[Dict]:
+        """解析模型返回的事件列表"""
+        data = json.loads(content)
+        if isinstance(data, dict):
+            for value in data.values():
+                if isinstance(value, list):
+                    return value
+            return []
+        return data if isinstance(data, list) else []
+
+    def _normalize_date(self, value, default: Optional[datetime] = None) -> Optional[datetime]:
+        """把模型给出的各种日期写法规范化为datetime，只有年或年月时取该时段的第一天
+
+        日期后的时间、时区或说明文字（如"2024-03-05 (approx)"）会被忽略；无法解析时返回default
+        （调用方传入文章的normalized_date），不会把文本中任意的四位数字当作年份。
+        """
+        if isinstance(value, datetime):
+            return value
+        text = str(value or '').strip()
+        if text:
+            match = self.CHINESE_DATE_PATTERN.search(text)
+            if match:
+                year, month, day = match.groups()
+                try:
+                    return datetime(int(year), int(month or 1), int(day or 1))
+                except ValueError:
+                    return default
+
+            # 只有整个值是年份时才按年份处理，"1530 GMT"这样的时间不是年份
+            if re.fullmatch(r'\d{4}', text):
+                return datetime(int(text), 1, 1)
+
+            text = self.MONTH_ABBR_PATTERN.sub(lambda m: m.group(1)[:3], text)
+            tokens = text.split()
+            # 从完整文本开始逐个去掉末尾的词，直到剩下的部分是可识别的日期
+            for end in range(len(tokens), 0, -1):
+                date = self._parse_date_text(' '.join(tokens[:end]).rstrip(' ,;'))
+                if date is not None:
+                    return date
+
+        return default
+
+    def _parse_date_text(self, text: str) -> Optional[datetime]:
+        """解析一段完整的日期文本，不能识别时返回None"""
+        try:
+            date = datetime.fromisoformat(re.sub(r'[Zz]$', '+00:00', text))
+            # 保留原文写出的日期，去掉时区后与其他日期一起比较
+            return date.replace(tzinfo=None)
+        except ValueError:
+            pass
+        for fmt in self.DATE_FORMATS + self.PARTIAL_DATE_FORMATS:
+            try:
+                return datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+        return None
+
+    def _make_event(self, date: datetime, event: str, article: Optional[Dict]) -> Dict:
+        """构造统一格式的时间线事件"""
+        item = {"date": date.strftime("%Y-%m-%d"), "event": str(event).strip(), "_sort_key": date}
+        if article:
+            item["source"] = article.get('source', '')
+            item["url"] = article.get('url', '')
+        return item
+
+    def _fallback_event(self, article: Dict) -> Dict:
+        """用文章标题和发布日期构造事件"""
+        date = self._normalize_date(article.get('published_date'), article.get('normalized_date')) or datetime.now()
+        return self._make_event(date, article.get('title', ''), article)
+
+    def merge(self, previous: List[Dict], events: List[Dict]) -> List[Dict]:
+        """把新提取的事件追加到已有时间线中（增量分析使用），超出上限时保留最近的事件"""
+        combined = []
+        for item in list(previous) + list(events):
+            item = dict(item)
+            item["_sort_key"] = self._normalize_date(item.get("date")) or datetime.now()
+            combined.append(item)
+        return self._merge_events(combined)
+
+    def _merge_events(self, events: List[Dict]) -> List[Dict]:
+        """按真实日期排序，并去掉同一天内描述相同的事件，超出上限时保留最近的事件"""
+        events.sort(key=lambda item: item["_sort_key"])
+
+        merged = []
+        seen = set()
+        for item in events:
+            key = (item["date"], re.sub(r'\W+', '', item["event"].lower()))
+            if key in seen:
+                continue
+            seen.add(key)
+            item.pop("_sort_key")
+            merged.append(item)
+
+        return merged[-self.max_events:]
@@ -0,0 +1,176 @@
+import re
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict, deque
+from itertools import islice
+from typing import Dict, Deque, Optional, Iterable
+
+logger = logging.getLogger(__name__)
+
+# 当前线程的用量标签，由UsageTracker.tagged()设置；线程池中的任务需要通过contextvars.copy_context()继承
+_usage_tag: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('usage_tag', default=None)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+class TokenCounter:
+    """按模型分词器计算token数；tiktoken不可用（未安装或无法下载词表）时退化为按字符类别估算"""
+
+    CJK_PATTERN = re.compile(r'[\u4e00-\u9fa5\u3000-\u303f\uff00-\uffef]')
+
+    def __init__(self, model: str = "gpt-3.5-turbo"):
+        self.model = model
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except Exception as e:
+                logger.warning(f"无法加载 {model} 的分词器: {e}，使用估算的token数")
+
+    def count(self, text: str) -> int:
+        """计算文本的token数"""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        # 估算：中文及全角符号约每字1个token，其余字符约每4个1个token
+        cjk = len(self.CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """把文本截断到不超过max_tokens个token"""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text)[:max_tokens])
+
+        # 估算模式下二分查找最长的合法前缀
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count(text[:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low]
+
+    def pack(self, pieces: Iterable[str], max_tokens: int, separator: str = "\n\n") -> str:
+        """按顺序装入文本片段直到达到预算，最后一个放不下的片段截断后装入"""
+        packed = []
+        remaining = max_tokens
+        separator_tokens = self.count(separator)
+        for piece in pieces:
+            tokens = self.count(piece)
+            if tokens + separator_tokens <= remaining:
+                packed.append(piece)
+                remaining -= tokens + separator_tokens
+            else:
+                if remaining > separator_tokens:
+                    packed.append(self.truncate(piece, remaining - separator_tokens))
+                break
+        return separator.join(packed)
+
+
+class UsageTracker:
+    """记录每次LLM调用的token用量、耗时、重试次数和估算费用，生成单次运行的报告
+
+    多个主题并发分析时共用同一个记录器：在tagged()范围内发起的调用带有该标签，
+    report(tag=...)只统计带该标签的调用，不会混入同时进行的其他分析。
+    守护进程、HTTP服务等常驻进程中记录器一直存在，只保留最近的max_records条记录；
+    mark()返回的是累计序号，旧记录被丢弃后仍然有效。
+    """
+
+    # 每1K token的美元价格（输入, 输出）
+    MODEL_PRICES = {
+        'gpt-3.5-turbo': (0.0005, 0.0015),
+        'gpt-4o-mini': (0.00015, 0.0006),
+        'gpt-4o': (0.005, 0.015),
+        'text-embedding-3-small': (0.00002, 0.0),
+        'text-embedding-3-large': (0.00013, 0.0),
+        'text-embedding-ada-002': (0.0001, 0.0),
+    }
+
+    # 批处理接口的价格折扣
+    BATCH_DISCOUNT = 0.5
+
+    def __init__(self, max_records: int = 10000):
+        self.records: Deque[Dict] = deque(maxlen=max_records)
+        # 累计记录数，records中最旧一条的序号为 _total - len(records)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def record(self, purpose: str, model: str, prompt_tokens: int, completion_tokens: int, latency: float,
+               retries: int = 0, cached: bool = False, error: Optional[str] = None, batch: bool = False) -> None:
+        """记录一次调用；batch表示通过批处理接口完成的请求"""
+        input_price, output_price = self.MODEL_PRICES.get(model, (0.0, 0.0))
+        cost = 0.0 if cached else (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+        if batch:
+            cost *= self.BATCH_DISCOUNT
+        with self._lock:
+            self.records.append({
+                'purpose': purpose,
+                'model': model,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'latency': round(latency, 3),
+                'retries': retries,
+                'cached': cached,
+                'batch': batch,
+                'cost': cost,
+                'error': error,
+                'tag': _usage_tag.get(),
+                'timestamp': time.time()
+            })
+            self._total += 1
+
+    @contextmanager
+    def tagged(self, tag: str):
+        """此范围内（以及继承了上下文的线程池任务中）记录的调用带有tag"""
+        token = _usage_tag.set(tag)
+        try:
+            yield tag
+        finally:
+            _usage_tag.reset(token)
+
+    def mark(self) -> int:
+        """返回当前记录序号，用于只统计某次运行之后的调用"""
+        with self._lock:
+            return self._total
+
+    def report(self, since: int = 0, tag: str = None) -> Dict:
+        """汇总since之后的调用（提供tag时只统计带该标签的调用）：总量以及按用途分组的统计"""
+        with self._lock:
+            skip = since - (self._total - len(self.records))
+            records = list(islice(self.records, max(0, skip), None))
+        if skip < 0:
+            logger.warning(f"用量记录超过保留上限 {self.records.maxlen}，报告缺少最早的 {-skip} 次调用")
+        if tag is not None:
+            records = [item for item in records if item['tag'] == tag]
+
+        by_purpose = defaultdict(lambda: {'calls': 0, 'cached': 0, 'errors': 0, 'prompt_tokens': 0,
+                                          'completion_tokens': 0, 'latency': 0.0, 'retries': 0, 'cost': 0.0})
+        for item in records:
+            stats = by_purpose[item['purpose']]
+            stats['calls'] += 1
+            stats['cached'] += int(item['cached'])
+            stats['errors'] += int(item['error'] is not None)
+            stats['prompt_tokens'] += item['prompt_tokens']
+            stats['completion_tokens'] += item['completion_tokens']
+            stats['latency'] += item['latency']
+            stats['retries'] += item['retries']
+            stats['cost'] += item['cost']
+
+        totals = {key: sum(stats[key] for stats in by_purpose.values())
+                  for key in ('calls', 'cached', 'errors', 'prompt_tokens', 'completion_tokens', 'retries', 'cost')}
+        totals['latency'] = round(sum(stats['latency'] for stats in by_purpose.values()), 3)
+        totals['cost'] = round(totals['cost'], 6)
+        for stats in by_purpose.values():
+            stats['latency'] = round(stats['latency'], 3)
+            stats['cost'] = round(stats['cost'], 6)
+
+        return {'totals': totals, 'by_purpose': dict(by_purpose), 'calls': records}
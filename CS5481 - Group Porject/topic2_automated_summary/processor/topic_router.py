@@ -0,0 +1,90 @@
+import logging
+from typing import List, Dict, Set, Callable, Optional
+import numpy as np
+
+from processor.vector_index import HashingEmbedder
+
+logger = logging.getLogger(__name__)
+
+class TopicRouter:
+    """把共享语料中的文章分配给各主题
+
+    相关度 = 关键词得分与向量相似度的加权和。关键词得分是主题词（英文单词、中文字符二元组）在文章中
+    出现的比例，标题命中的权重更高；向量相似度是主题与文章开头部分的余弦相似度。
+    一篇文章可以同时属于多个主题；没有文章达到阈值的主题取相关度最高的min_articles篇，保证每个主题都有语料。
+    """
+
+    TITLE_WEIGHT = 2.0
+    # 计算向量时只取文章开头部分，新闻的主要信息集中在导语
+    LEAD_CHARS = 1000
+
+    def __init__(self, embed: Callable[[List[str]], np.ndarray] = None, keyword_weight: float = 0.6,
+                 threshold: float = 0.3, min_articles: int = 3, max_articles: Optional[int] = None):
+        # embed(texts) 返回 (len(texts), 维度) 的向量矩阵，默认使用本地哈希向量
+        self.embed = embed or HashingEmbedder()
+        self.keyword_weight = keyword_weight
+        self.threshold = threshold
+        self.min_articles = min_articles
+        self.max_articles = max_articles
+
+    def route(self, articles: List[Dict], topics: List[str]) -> Dict[str, List[Dict]]:
+        """返回 主题 -> 文章列表（保持文章在语料中的原有顺序）"""
+        if not articles or not topics:
+            return {topic: [] for topic in topics}
+
+        scores = self.score(articles, topics)
+        routed = {}
+        for t, topic in enumerate(topics):
+            ranked = np.argsort(-scores[t], kind='stable')
+            selected = [int(i) for i in ranked if scores[t, i] >= self.threshold]
+            if len(selected) < self.min_articles:
+                selected = [int(i) for i in ranked[:self.min_articles]]
+            if self.max_articles:
+                selected = selected[:self.max_articles]
+            routed[topic] = [articles[i] for i in sorted(selected)]
+            logger.info(f"主题 '{topic}' 分配到 {len(routed[topic])} 篇文章")
+
+        assigned = len({id(article) for topic_articles in routed.values() for article in topic_articles})
+        logger.info(f"文章路由完成：{len(articles)} 篇文章，{len(topics)} 个主题，{assigned} 篇被至少一个主题使用")
+        return routed
+
+    def score(self, articles: List[Dict], topics: List[str]) -> np.ndarray:
+        """返回 (主题数, 文章数) 的相关度矩阵"""
+        article_terms = [(set(self._terms(article.get('title', ''))), set(self._terms(article.get('content', ''))))
+                         for article in articles]
+        keyword_scores = np.array([[self._keyword_score(terms, title, content) for title, content in article_terms]
+                                   for terms in (self._terms(topic) for topic in topics)], dtype=np.float32)
+        if self.keyword_weight >= 1.0:
+            return keyword_scores
+
+        texts = [f"{article.get('title', '')}\n{article.get('content', '')[:self.LEAD_CHARS]}" for article in articles]
+        try:
+            vectors = self.embed(list(topics) + texts)
+        except Exception as e:
+            logger.error(f"计算文章向量时出错: {e}，改用本地哈希向量")
+            vectors = HashingEmbedder()(list(topics) + texts)
+        vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        similarity = np.clip(vectors[:len(topics)] @ vectors[len(topics):].T, 0.0, 1.0)
+        return self.keyword_weight * keyword_scores + (1 - self.keyword_weight) * similarity
+
+    def _terms(self, text: str) -> List[str]:
+        """切分为英文单词和中文字符二元组，与HashingEmbedder的切分方式一致（按词匹配，避免ai命中said）"""
+        terms = []
+        for token in HashingEmbedder.WORD_PATTERN.findall(text.lower()):
+            if token[0] >= '\u4e00':
+                terms.extend(token[j:j + 2] for j in range(len(token) - 1))
+                if len(token) == 1:
+                    terms.append(token)
+            else:
+                terms.append(token)
+        return list(dict.fromkeys(terms))
+
+    def _keyword_score(self, terms: List[str], title: Set[str], content: Set[str]) -> float:
+        if not terms:
+            return 0.0
+        hits = sum(self.TITLE_WEIGHT if term in title else 1.0 if term in content else 0.0 for term in terms)
+        return min(1.0, hits / len(terms))
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
@@ -0,0 +1,149 @@
+import re
+import zlib
+import logging
+from typing import List, Dict, Tuple, Callable, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class HashingEmbedder:
+    """本地哈希向量：英文单词和中文字符二元组的词频哈希到固定维度，无需调用API"""
+
+    WORD_PATTERN = re.compile(r"[a-z0-9]+|[\u4e00-\u9fa5]+")
+
+    def __init__(self, n_features: int = 1024):
+        self.n_features = n_features
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in self.WORD_PATTERN.findall(text.lower()):
+                if token[0] >= '\u4e00':
+                    grams = [token[j:j + 2] for j in range(len(token) - 1)] or [token]
+                else:
+                    grams = [token]
+                for gram in grams:
+                    matrix[i, zlib.crc32(gram.encode('utf-8')) % self.n_features] += 1.0
+        # 次线性词频，削弱高频词的影响
+        return np.log1p(matrix)
+
+
+class VectorIndex:
+    """把文章切成小块并建立向量索引，按查询取出最相关的块填充提示
+
+    使用精确的NumPy内积检索（向量已归一化，即余弦相似度），并用MMR在相关性和多样性之间平衡，
+    避免同一事件的多个相似块占满预算。不提供查询时以全部块的质心作为查询，得到覆盖面最广的块。
+    """
+
+    def __init__(self, embed: Callable[[List[str]], np.ndarray], chunk_size: int = 200,
+                 length_fn: Callable[[str], int] = len, mmr_lambda: float = 0.7, candidate_pool: int = 50):
+        # embed(texts) 返回 (len(texts), 维度) 的向量矩阵
+        self.embed = embed
+        self.chunk_size = chunk_size
+        self.length_fn = length_fn
+        self.mmr_lambda = mmr_lambda
+        self.candidate_pool = candidate_pool
+        self.chunks: List[Dict] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._keys = np.array([], dtype=object)
+        self._query_cache: Dict[str, np.ndarray] = {}
+
+    def build(self, articles: List[Dict]) -> "VectorIndex":
+        """切块并计算所有块的向量"""
+        self.chunks = [chunk for article_idx, article in enumerate(articles)
+                       for chunk in self._chunk_article(article_idx, article)]
+        self._keys = np.array([chunk['key'] for chunk in self.chunks], dtype=object)
+        if self.chunks:
+            self.vectors = self._normalize(np.asarray(self.embed([chunk['text'] for chunk in self.chunks]),
+                                                      dtype=np.float32))
+        logger.info(f"向量索引构建完成：{len(articles)} 篇文章，{len(self.chunks)} 个块")
+        return self
+
+    def _chunk_article(self, article_idx: int, article: Dict) -> List[Dict]:
+        """按句子累积到块预算，块不跨文章"""
+        sentences = article.get('sentences') or re.split(r'(?<=[。！？.!?])\s*', article.get('content', ''))
+        chunks = []
+        current: List[str] = []
+        current_len = 0
+        for sentence in sentences:
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            sentence_len = self.length_fn(sentence)
+            if current and current_len + sentence_len > self.chunk_size:
+                chunks.append(current)
+                current, current_len = [], 0
+            current.append(sentence)
+            current_len += sentence_len + 1
+        if current:
+            chunks.append(current)
+
+        return [{
+            'text': " ".join(sentences),
+            'header': f"【{article.get('source', '')}】{article.get('title', '')}",
+            'article': article_idx,
+            'position': position,
+            'key': article.get('url') or article.get('title', '')
+        } for position, sentences in enumerate(chunks)]
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _query_vector(self, query: Optional[str], mask: np.ndarray) -> np.ndarray:
+        if query is None:
+            return self._normalize(self.vectors[mask].mean(axis=0, keepdims=True))[0]
+        if query not in self._query_cache:
+            self._query_cache[query] = self._normalize(np.asarray(self.embed([query]), dtype=np.float32))[0]
+        return self._query_cache[query]
+
+    def search(self, query: str = None, top_k: int = 10, key: str = None) -> List[Tuple[float, Dict]]:
+        """返回 (相关度, 块) 列表；key限定只在某篇文章的块中检索"""
+        if not self.chunks:
+            return []
+        mask = np.ones(len(self.chunks), dtype=bool)
+        if key is not None:
+            mask = self._keys == key
+            if not mask.any():
+                return []
+
+        candidates = np.flatnonzero(mask)
+        scores = self.vectors[candidates] @ self._query_vector(query, mask)
+        pool_size = min(len(candidates), max(top_k, self.candidate_pool))
+        top = np.argpartition(-scores, pool_size - 1)[:pool_size]
+        pool = candidates[top]
+        pool_scores = scores[top]
+
+        # MMR：每次选择与查询相关、又与已选块差异最大的块
+        selected: List[int] = []
+        redundancy = np.zeros(len(pool), dtype=np.float32)
+        available = np.ones(len(pool), dtype=bool)
+        while len(selected) < min(top_k, len(pool)):
+            mmr = self.mmr_lambda * pool_scores - (1 - self.mmr_lambda) * redundancy
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            available[best] = False
+            redundancy = np.maximum(redundancy, self.vectors[pool] @ self.vectors[pool[best]])
+
+        return [(float(pool_scores[i]), self.chunks[pool[i]]) for i in selected]
+
+    def retrieve(self, query: str = None, budget: int = 1000, key: str = None,
+                 with_headers: bool = True) -> str:
+        """取出相关块直到达到预算（单位由length_fn决定），按原文顺序拼接"""
+        chosen = []
+        total = 0
+        # 多取一些候选，跳过放不下的块后仍能填满预算
+        top_k = max(1, budget // max(1, self.chunk_size)) * 2 + 2
+        for _, chunk in self.search(query, top_k=top_k, key=key):
+            text = f"{chunk['header']}\n{chunk['text']}" if with_headers else chunk['text']
+            length = self.length_fn(text)
+            if total + length > budget:
+                continue
+            chosen.append((chunk['article'], chunk['position'], text))
+            total += length + 1
+            if budget - total < self.chunk_size // 4:
+                break
+
+        chosen.sort()
+        return "\n\n".join(text for _, _, text in chosen)
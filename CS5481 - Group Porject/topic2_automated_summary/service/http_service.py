@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import logging
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs, unquote
+from typing import Dict, Optional, Tuple
+
+from generator.page_generator import PageGenerator
+from generator.page_manifest import PageManifest
+
+logger = logging.getLogger(__name__)
+
+class SummaryService:
+    """按需生成主题摘要的本地HTTP服务（asyncio，仅使用标准库）
+
+    接口：
+      POST /generate?topic=...[&force=1][&wait=0]  确保主题页面是新的，返回页面地址和状态（JSON）
+      GET  /summary?topic=...                        返回主题页面，必要时先生成
+      GET  /status                                   排队和进行中的生成任务、合并的请求数等
+      GET  /<文件>                                   输出目录中的静态文件（页面引用的资源、分片、流式摘要）
+
+    同一主题的并发请求合并为一次进行中的流程运行，所有请求等待同一个结果；freshness秒内生成过的页面
+    直接返回，热门主题的突发请求不会成倍增加爬取和LLM调用。流程在线程池中运行，最多同时运行max_concurrent个主题，
+    其余在队列中等待。静态文件在客户端接受时返回预压缩的.br/.gz文件，读取文件在线程中进行，不阻塞事件循环；
+    页面清单、变更列表和以.开头的文件（写入中的临时文件）不对外提供。
+    """
+
+    MAX_TOPIC_LENGTH = 100
+    MAX_HEADER_BYTES = 16 * 1024
+    MAX_BODY_BYTES = 64 * 1024
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, system, host: str = "127.0.0.1", port: int = 8080, freshness: float = 600.0,
+                 max_concurrent: int = 2):
+        self.system = system
+        self.page_generator: PageGenerator = system.page_generator
+        self.output_dir = os.path.abspath(self.page_generator.output_dir)
+        self.host = host
+        self.port = port
+        self.freshness = freshness
+        self.max_concurrent = max(1, max_concurrent)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="pipeline")
+        self._slots: Optional[asyncio.Semaphore] = None
+        # 主题 -> 进行中的生成任务及其状态
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._job_info: Dict[str, Dict] = {}
+        # 主题 -> 本进程中最近一次成功生成的时间
+        self._generated: Dict[str, float] = {}
+        self.stats = {'requests': 0, 'runs': 0, 'failed_runs': 0, 'coalesced': 0, 'fresh_hits': 0}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # ---- 生成与合并 ----
+
+    def _page_time(self, topic: str) -> Optional[float]:
+        """页面的生成时间；重启后以页面清单中记录的文件为准（不把占位页面或被覆盖的文件当作已生成的页面）"""
+        if topic in self._generated:
+            return self._generated[topic]
+        name = PageGenerator.page_name(topic)
+        entry = self.page_generator.manifest.pages.get(name)
+        try:
+            stat = os.stat(os.path.join(self.output_dir, name))
+        except OSError:
+            return None
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            return stat.st_mtime
+        return None
+
+    def _is_fresh(self, topic: str) -> bool:
+        generated = self._page_time(topic)
+        return generated is not None and time.time() - generated < self.freshness
+
+    def ensure(self, topic: str, force: bool = False) -> Tuple[str, asyncio.Task]:
+        """返回 (状态, 生成任务)：fresh表示页面无需重新生成（任务为None），running/queued表示合并到进行中的任务"""
+        if topic in self._jobs:
+            self.stats['coalesced'] += 1
+            return self._job_info[topic]['state'], self._jobs[topic]
+        if not force and self._is_fresh(topic):
+            self.stats['fresh_hits'] += 1
+            return 'fresh', None
+        self._job_info[topic] = {'state': 'queued', 'submitted_at': time.time(), 'waiters': 0}
+        task = asyncio.get_running_loop().create_task(self._generate(topic))
+        self._jobs[topic] = task
+        return 'queued', task
+
+    async def _generate(self, topic: str) -> Optional[str]:
+        info = self._job_info[topic]
+        try:
+            async with self._slots:
+                info['state'] = 'running'
+                info['started_at'] = time.time()
+                self.stats['runs'] += 1
+                loop = asyncio.get_running_loop()
+                try:
+                    output_file = await loop.run_in_executor(self._executor, lambda: self.system.run(topic=topic))
+                except Exception as e:
+                    logger.error(f"生成主题 '{topic}' 时出错: {e}", exc_info=True)
+                    output_file = None
+            if output_file:
+                self._generated[topic] = time.time()
+            else:
+                self.stats['failed_runs'] += 1
+            logger.info(f"主题 '{topic}' 生成{'完成' if output_file else '失败'}，"
+                        f"用时 {time.time() - info['started_at']:.2f}秒，共 {info['waiters']} 个请求等待此结果")
+            return output_file
+        finally:
+            del self._jobs[topic]
+            del self._job_info[topic]
+
+    async def _wait(self, topic: str, task: asyncio.Task) -> Optional[str]:
+        info = self._job_info.get(topic)
+        if info is not None:
+            info['waiters'] += 1
+        # shield：一个客户端断开不会取消其他请求共享的生成任务
+        return await asyncio.shield(task)
+
+    def status(self) -> Dict:
+        """队列深度：等待运行和正在运行的主题数、等待结果的请求数"""
+        now = time.time()
+        jobs = {topic: {'state': info['state'], 'waiters': info['waiters'],
+                        'age': round(now - info['submitted_at'], 2)} for topic, info in self._job_info.items()}
+        return {
+            'queued': sum(1 for info in self._job_info.values() if info['state'] == 'queued'),
+            'running': sum(1 for info in self._job_info.values() if info['state'] == 'running'),
+            'waiters': sum(info['waiters'] for info in self._job_info.values()),
+            'max_concurrent': self.max_concurrent,
+            'freshness': self.freshness,
+            'jobs': jobs,
+            'stats': self.stats
+        }
+
+    # ---- HTTP ----
+
+    async def start(self) -> None:
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"摘要服务已启动: http://{self.host}:{self.port}/")
+
+    async def serve_forever(self) -> None:
+        """运行直到收到SIGINT/SIGTERM；停止时不再接受新连接，等待进行中的生成任务完成"""
+        await self.start()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await stop.wait()
+        await self.close()
+
+    async def close(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._jobs:
+            logger.info(f"等待 {len(self._jobs)} 个进行中的生成任务完成")
+            await asyncio.gather(*self._jobs.values(), return_exceptions=True)
+        self._executor.shutdown(wait=True)
+        self.page_generator.save_manifest()
+        logger.info("摘要服务已停止")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            if len(head) > self.MAX_HEADER_BYTES:
+                await self._send(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, {'error': '请求头过大'})
+                return
+            lines = head.decode('latin-1').split("\r\n")
+            try:
+                method, target, _ = lines[0].split(" ", 2)
+            except ValueError:
+                await self._send(writer, HTTPStatus.BAD_REQUEST, {'error': '无效的请求行'})
+                return
+            headers = {}
+            for line in lines[1:]:
+                name, sep, value = line.partition(":")
+                if sep:
+                    headers[name.strip().lower()] = value.strip()
+            try:
+                length = int(headers.get('content-length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                await self._send(writer, HTTPStatus.BAD_REQUEST, {'error': '无效的Content-Length'})
+                return
+            if length > self.MAX_BODY_BYTES:
+                await self._send(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': '请求体过大'})
+                return
+            body = await reader.readexactly(length) if length else b""
+
+            self.stats['requests'] += 1
+            status, payload, extra = await self._route(method.upper(), target, headers, body)
+            await self._send(writer, status, payload, extra)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"处理请求时出错: {e}", exc_info=True)
+            try:
+                await self._send(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+            # 等待连接真正关闭，避免半关闭的连接和退出时未关闭传输的警告
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _route(self, method: str, target: str, headers: Dict, body: bytes):
+        parts = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        if parts.path == '/status' and method == 'GET':
+            return HTTPStatus.OK, self.status(), {}
+        if parts.path in ('/generate', '/summary'):
+            if body and headers.get('content-type', '').startswith('application/json'):
+                try:
+                    query.update({key: str(value) for key, value in json.loads(body).items()})
+                except (ValueError, AttributeError):
+                    return HTTPStatus.BAD_REQUEST, {'error': '请求体不是有效的JSON对象'}, {}
+            topic = (query.get('topic') or '').strip()
+            if not self._valid_topic(topic):
+                return HTTPStatus.BAD_REQUEST, {'error': '缺少或无效的topic参数'}, {}
+            if parts.path == '/generate' and method == 'POST':
+                return await self._generate_endpoint(topic, query)
+            if parts.path == '/summary' and method == 'GET':
+                return await self._summary_endpoint(topic, headers)
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': '不支持的请求方法'}, {}
+        if method == 'GET':
+            return await self._static(unquote(parts.path), headers)
+        return HTTPStatus.NOT_FOUND, {'error': '未找到'}, {}
+
+    def _valid_topic(self, topic: str) -> bool:
+        """主题直接用于页面文件名，拒绝可能跳出输出目录的字符"""
+        return (bool(topic) and len(topic) <= self.MAX_TOPIC_LENGTH and '..' not in topic
+                and not any(char in topic for char in '/\\\0'))
+
+    async def _generate_endpoint(self, topic: str, query: Dict):
+        force = query.get('force', '').lower() in ('1', 'true', 'yes')
+        wait = query.get('wait', '1').lower() not in ('0', 'false', 'no')
+        state, task = self.ensure(topic, force=force)
+        result = {'topic': topic, 'page': "/" + PageGenerator.page_name(topic), 'queue': self.status()['queued']}
+        if task is None:
+            return HTTPStatus.OK, dict(result, status='fresh', generated_at=self._page_time(topic)), {}
+        if not wait:
+            if self._job_info.get(topic) is not None:
+                self._job_info[topic]['waiters'] += 1
+            return HTTPStatus.ACCEPTED, dict(result, status=state), {}
+        output_file = await self._wait(topic, task)
+        if not output_file:
+            return HTTPStatus.BAD_GATEWAY, dict(result, status='failed', error='摘要生成失败'), {}
+        return HTTPStatus.OK, dict(result, status='generated', generated_at=self._generated.get(topic)), {}
+
+    async def _summary_endpoint(self, topic: str, headers: Dict):
+        _, task = self.ensure(topic)
+        if task is not None:
+            output_file = await self._wait(topic, task)
+            if not output_file and self._page_time(topic) is None:
+                return HTTPStatus.BAD_GATEWAY, {'topic': topic, 'status': 'failed', 'error': '摘要生成失败'}, {}
+        return await self._static("/" + PageGenerator.page_name(topic), headers)
+
+    async def _static(self, path: str, headers: Dict):
+        """在线程中读取静态文件，大文件或慢速磁盘不会阻塞其他请求"""
+        return await asyncio.to_thread(self._read_static, path, headers)
+
+    def _is_private(self, relative_path: str) -> bool:
+        """页面清单、变更列表（含下游改名后的文件）以及以.开头的文件和目录（写入中的临时文件）"""
+        parts = relative_path.replace(os.sep, '/').split('/')
+        name = parts[-1]
+        changes_prefix = os.path.splitext(PageManifest.CHANGES_FILENAME)[0] + '.'
+        return (any(part.startswith('.') for part in parts) or name.endswith('.tmp')
+                or name == PageManifest.FILENAME or name.startswith(changes_prefix))
+
+    def _read_static(self, path: str, headers: Dict):
+        """返回输出目录中的文件，客户端接受时使用预压缩文件"""
+        if path in ('', '/'):
+            path = '/index.html'
+        full_path = os.path.abspath(os.path.join(self.output_dir, path.lstrip('/')))
+        relative_path = os.path.relpath(full_path, self.output_dir)
+        if (not full_path.startswith(self.output_dir + os.sep) or self._is_private(relative_path)
+                or not os.path.isfile(full_path)):
+            return HTTPStatus.NOT_FOUND, {'error': '未找到'}, {}
+
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        extra = {'Content-Type': content_type, 'Vary': 'Accept-Encoding'}
+        accepted = headers.get('accept-encoding', '')
+        for encoding, suffix in self.ENCODINGS:
+            if encoding in accepted and os.path.isfile(full_path + suffix):
+                full_path += suffix
+                extra['Content-Encoding'] = encoding
+                break
+        with open(full_path, 'rb') as f:
+            return HTTPStatus.OK, f.read(), extra
+
+    async def _send(self, writer: asyncio.StreamWriter, status: HTTPStatus, payload, extra: Dict = None) -> None:
+        extra = dict(extra or {})
+        if isinstance(payload, bytes):
+            body = payload
+        else:
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+            extra.setdefault('Content-Type', 'application/json; charset=utf-8')
+        head = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Length: {len(body)}", "Connection: close"]
+        head.extend(f"{name}: {value}" for name, value in extra.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import heapq
+import random
+import signal
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class RefreshDaemon:
+    """常驻进程：按各主题自己的刷新间隔（加随机抖动）反复运行摘要流程
+
+    所有刷新共用同一个AutomatedSummarySystem，爬虫依赖、NLTK、OpenAI客户端、LLM响应缓存、
+    模板和调度器只初始化一次，每次刷新只做实际的爬取、分析和渲染。
+    一个主题的下一次刷新在本次刷新结束后才排期，同一主题的刷新不会重叠；不同主题最多同时刷新max_workers个。
+    每个主题的上次结果和下次刷新时间保存在state_file中，重启后按保存的时间继续，而不是立即刷新全部主题。
+    收到SIGINT/SIGTERM后不再开始新的刷新，等待进行中的刷新结束并保存状态后退出。
+    """
+
+    # 刷新失败后的重试间隔（秒），连续失败时加倍，但不超过主题本身的刷新间隔
+    RETRY_DELAY = 60.0
+
+    def __init__(self, system, topics: Dict[str, float], jitter: float = 0.1, max_workers: int = 2,
+                 state_file: str = "./state/daemon.json"):
+        # topics为 主题 -> 刷新间隔（秒）
+        self.system = system
+        self.topics = topics
+        self.jitter = jitter
+        self.max_workers = max(1, max_workers)
+        self.state_file = state_file
+        self.state: Dict[str, Dict] = self._load_state()
+        self._queue: List[Tuple[float, str]] = []
+        self._running: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def _load_state(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get('topics', {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取守护进程状态失败: {e}，所有主题将重新排期")
+            return {}
+
+    def _save_state(self) -> None:
+        """写入临时文件后原子替换"""
+        state_dir = os.path.dirname(os.path.abspath(self.state_file))
+        os.makedirs(state_dir, exist_ok=True)
+        with self._lock:
+            content = json.dumps({'topics': self.state, 'saved_at': time.time()}, ensure_ascii=False, indent=2)
+        fd, tmp_path = tempfile.mkstemp(dir=state_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, self.state_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _with_jitter(self, seconds: float) -> float:
+        return seconds * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _schedule_initial(self) -> None:
+        """有保存状态的主题按上次排定的时间继续；新主题在第一个间隔的抖动范围内错开启动，避免同时刷新"""
+        now = time.time()
+        for topic, interval in self.topics.items():
+            due = self.state.get(topic, {}).get('next_due')
+            if due is None:
+                due = now + random.uniform(0, self.jitter * interval)
+            heapq.heappush(self._queue, (due, topic))
+            logger.info(f"主题 '{topic}' 每 {interval:.0f}秒刷新一次，下次刷新在 {max(0.0, due - now):.0f}秒后")
+
+    def stop(self, *_) -> None:
+        """请求停止：不再开始新的刷新，进行中的刷新完成后run()返回"""
+        if not self._stopping.is_set():
+            logger.info("收到停止信号，等待进行中的刷新完成后退出")
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self) -> None:
+        """阻塞运行直到stop()；在主线程中调用时安装SIGINT/SIGTERM处理"""
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                handlers[sig] = signal.signal(sig, self.stop)
+
+        self._schedule_initial()
+        logger.info(f"守护进程已启动：{len(self.topics)} 个主题，最多同时刷新 {self.max_workers} 个")
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="refresh") as executor:
+                while not self._stopping.is_set():
+                    self._dispatch(executor)
+                    self._wake.wait(timeout=self._next_wait())
+                    self._wake.clear()
+                # 退出with时等待进行中的刷新结束
+        finally:
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+            self._save_state()
+            logger.info("守护进程已停止，状态已保存")
+
+    def _next_wait(self) -> Optional[float]:
+        with self._lock:
+            if not self._queue or len(self._running) >= self.max_workers:
+                return None
+            return max(0.0, self._queue[0][0] - time.time())
+
+    def _dispatch(self, executor: ThreadPoolExecutor) -> None:
+        """提交所有已到期的主题，直到达到并发上限"""
+        now = time.time()
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now and len(self._running) < self.max_workers:
+                _, topic = heapq.heappop(self._queue)
+                self._running[topic] = now
+                executor.submit(self._refresh, topic)
+
+    def _refresh(self, topic: str) -> None:
+        logger.info(f"开始刷新主题 '{topic}'")
+        start = time.time()
+        try:
+            output_file = self.system.run(topic=topic)
+        except Exception as e:
+            logger.error(f"刷新主题 '{topic}' 时出错: {e}", exc_info=True)
+            output_file = None
+        finished = time.time()
+
+        interval = self.topics[topic]
+        with self._lock:
+            entry = self.state.setdefault(topic, {'failures': 0})
+            entry['last_run'] = start
+            entry['duration'] = finished - start
+            if output_file:
+                entry.update(last_success=finished, output=output_file, failures=0)
+                delay = self._with_jitter(interval)
+            else:
+                entry['failures'] = entry.get('failures', 0) + 1
+                delay = min(interval, self.RETRY_DELAY * 2 ** (entry['failures'] - 1))
+            entry['next_due'] = finished + delay
+            del self._running[topic]
+            # 本次刷新结束后才重新排期，同一主题的刷新不会重叠
+            heapq.heappush(self._queue, (entry['next_due'], topic))
+
+        status = "完成" if output_file else f"失败（连续 {entry['failures']} 次）"
+        logger.info(f"主题 '{topic}' 刷新{status}，用时 {finished - start:.2f}秒，{delay:.0f}秒后再次刷新")
+        self._save_state()
+        self._wake.set()
+
+
+def parse_topic_intervals(spec: str, default_interval: float) -> Dict[str, float]:
+    """解析 "主题A:3600,主题B" 形式的配置，未指定间隔的主题使用默认间隔（秒）"""
+    topics = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        topic, _, interval = item.rpartition(':')
+        if topic and interval.replace('.', '', 1).isdigit():
+            topics[topic.strip()] = float(interval)
+        else:
+            topics[item] = float(default_interval)
+    return topics
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 项目模块按目录导入（没有包安装），测试从项目根目录导入processor、generator等模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,165 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import threading
+
+from generator.page_generator import PageGenerator
+from service.http_service import SummaryService
+
+
+class FakeSystem:
+    """代替AutomatedSummarySystem：run()等待一段时间后写出页面，记录每次运行的主题"""
+
+    def __init__(self, output_dir: str, delay: float = 0.3):
+        self.page_generator = PageGenerator(output_dir=output_dir)
+        self.delay = delay
+        self.fail = False
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def run(self, topic: str):
+        with self._lock:
+            self.calls.append(topic)
+        time.sleep(self.delay)
+        if self.fail:
+            return None
+        path = os.path.join(self.page_generator.output_dir, PageGenerator.page_name(topic))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"<html>{topic}</html>")
+        return path
+
+
+async def _request(port: int, method: str, path: str, headers: dict = None, body: bytes = b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = [f"{method} {path} HTTP/1.1", "Host: test"]
+    head.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    if body and 'Content-Length' not in (headers or {}):
+        head.append(f"Content-Length: {len(body)}")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status_line, _, rest = response.partition(b"\r\n")
+    raw_headers, _, payload = rest.partition(b"\r\n\r\n")
+    response_headers = {}
+    for line in raw_headers.decode('latin-1').split("\r\n"):
+        name, _, value = line.partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    return int(status_line.split()[1]), response_headers, payload
+
+
+def _json(payload: bytes) -> dict:
+    return json.loads(payload.decode('utf-8'))
+
+
+def _serve(tmp_path, scenario, **kwargs):
+    system = FakeSystem(str(tmp_path))
+
+    async def main():
+        service = SummaryService(system, port=0, **kwargs)
+        await service.start()
+        try:
+            return await scenario(service, system)
+        finally:
+            await service.close()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_for_one_topic_share_a_run(tmp_path):
+    async def scenario(service, system):
+        responses = await asyncio.gather(*(_request(service.port, "POST", "/generate?topic=AI") for _ in range(5)))
+        assert [status for status, _, _ in responses] == [200] * 5
+        assert {_json(payload)['status'] for _, _, payload in responses} == {'generated'}
+        assert system.calls == ["AI"]
+        assert service.stats['coalesced'] == 4
+
+        # 新鲜期内的请求直接返回，不再运行
+        status, _, payload = await _request(service.port, "POST", "/generate?topic=AI")
+        assert (status, _json(payload)['status']) == (200, 'fresh')
+        # force强制重新生成
+        status, _, payload = await _request(service.port, "POST", "/generate?topic=AI&force=1")
+        assert (status, _json(payload)['status']) == (200, 'generated')
+        assert system.calls == ["AI", "AI"]
+
+    _serve(tmp_path, scenario)
+
+
+def test_different_topics_run_separately_within_the_concurrency_limit(tmp_path):
+    async def scenario(service, system):
+        tasks = [asyncio.ensure_future(_request(service.port, "POST", f"/generate?topic={topic}"))
+                 for topic in ("A", "B", "C")]
+        await asyncio.sleep(0.1)
+        status = service.status()
+        assert status['running'] == 1 and status['queued'] == 2
+        responses = await asyncio.gather(*tasks)
+        assert [code for code, _, _ in responses] == [200, 200, 200]
+        assert sorted(system.calls) == ["A", "B", "C"]
+
+    _serve(tmp_path, scenario, max_concurrent=1)
+
+
+def test_wait_0_returns_immediately_and_summary_joins_the_run(tmp_path):
+    async def scenario(service, system):
+        status, _, payload = await _request(service.port, "POST", "/generate?topic=AI&wait=0")
+        assert (status, _json(payload)['status']) == (202, 'queued')
+        status, _, payload = await _request(service.port, "GET", "/summary?topic=AI")
+        assert status == 200 and payload == "<html>AI</html>".encode('utf-8')
+        assert system.calls == ["AI"]
+
+    _serve(tmp_path, scenario)
+
+
+def test_failed_run_is_reported_and_retried(tmp_path):
+    async def scenario(service, system):
+        system.fail = True
+        status, _, payload = await _request(service.port, "POST", "/generate?topic=AI")
+        assert (status, _json(payload)['status']) == (502, 'failed')
+        system.fail = False
+        status, _, _ = await _request(service.port, "POST", "/generate?topic=AI")
+        assert status == 200
+        assert system.calls == ["AI", "AI"]
+
+    _serve(tmp_path, scenario)
+
+
+def test_json_body_and_invalid_requests(tmp_path):
+    async def scenario(service, system):
+        body = json.dumps({"topic": "AI"}).encode('utf-8')
+        status, _, _ = await _request(service.port, "POST", "/generate",
+                                      {"Content-Type": "application/json"}, body)
+        assert status == 200
+        for topic in ("", "../etc", "a/b"):
+            status, _, _ = await _request(service.port, "POST", f"/generate?topic={topic}")
+            assert status == 400
+        for length in ("abc", "-5"):
+            status, _, _ = await _request(service.port, "POST", "/generate?topic=AI", {"Content-Length": length})
+            assert status == 400
+        status, _, _ = await _request(service.port, "POST", "/generate?topic=AI",
+                                      {"Content-Length": str(service.MAX_BODY_BYTES + 1)})
+        assert status == 413
+
+    _serve(tmp_path, scenario)
+
+
+def test_static_files_skip_private_and_temporary_files(tmp_path):
+    for name, content in (("page.html", b"<html>page</html>"), ("page.html.gz", gzip.compress(b"<html>page</html>")),
+                          ("manifest.json", b"{}"), ("changes.txt", b"page.html\n"),
+                          ("changes.syncing", b"page.html\n"), (".page.html.x1.tmp", b"partial"),
+                          ("stream_AI.json.tmp", b"partial")):
+        (tmp_path / name).write_bytes(content)
+
+    async def scenario(service, system):
+        status, headers, payload = await _request(service.port, "GET", "/page.html")
+        assert status == 200 and payload == b"<html>page</html>"
+        assert headers['content-type'] == 'text/html; charset=utf-8'
+        status, headers, payload = await _request(service.port, "GET", "/page.html", {"Accept-Encoding": "gzip"})
+        assert headers['content-encoding'] == 'gzip' and gzip.decompress(payload) == b"<html>page</html>"
+        for path in ("/manifest.json", "/changes.txt", "/changes.syncing", "/.page.html.x1.tmp",
+                     "/stream_AI.json.tmp", "/../outside.txt", "/missing.html"):
+            status, _, _ = await _request(service.port, "GET", path)
+            assert status == 404, path
+
+    _serve(tmp_path, scenario)
@@ -0,0 +1,145 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from benchmark.mock_llm_server import MockLLMServer
+from processor.analysis_state import AnalysisStateStore
+from processor.llm_cache import LLMResponseCache
+from processor.llm_processor import LLMProcessor
+from processor.request_scheduler import RequestScheduler
+
+KEY = "人工智能"
+
+
+def _article(i: int, topic: str = "人工智能") -> dict:
+    sentences = "".join(f"2024年3月{i + 1}日，研究机构发布了关于{topic}的第{j}份报告，引发行业讨论。" for j in range(6))
+    return {'title': f"{topic}报道{i}", 'url': f"https://example.com/{i}", 'source': f"来源{i % 3}",
+            'published_date': f"2024-03-{i + 1:02d}", 'content': sentences}
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = MockLLMServer(latency=0.0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_processor(server, tmp_path):
+    def make(base_url: str = None, **kwargs) -> LLMProcessor:
+        return LLMProcessor(api_key="mock", base_url=base_url or server.base_url, retrieval_mode="hashing",
+                            state_store=AnalysisStateStore(str(tmp_path / "state")),
+                            scheduler=RequestScheduler(max_retries=0), **kwargs)
+    return make
+
+
+def _fingerprints(processor: LLMProcessor):
+    state = processor.state_store.load(KEY)
+    return set(state['articles']) if state else None
+
+
+def test_only_new_articles_are_analysed(make_processor):
+    processor = make_processor()
+    articles = [_article(i) for i in range(4)]
+    first = processor.analyze_articles(articles, state_key=KEY)
+    assert first['failed'] == []
+    assert _fingerprints(processor) == {article['url'] for article in articles}
+
+    # 没有新增文章时直接复用上一次的结果，不发出任何请求
+    unchanged = processor.analyze_articles(articles, state_key=KEY)
+    assert unchanged['usage']['totals']['calls'] == 0
+    assert unchanged['summary'] == first['summary']
+
+    articles.append(_article(4))
+    second = processor.analyze_articles(articles, state_key=KEY)
+    assert second['failed'] == []
+    assert _fingerprints(processor) == {article['url'] for article in articles}
+    assert any(event.get('url') == articles[4]['url'] for event in second['timeline'])
+    # 上一次的事件保留在合并后的时间线中
+    assert {event['date'] for event in first['timeline']} <= {event['date'] for event in second['timeline']}
+
+
+def test_timeline_batch_failure_keeps_articles_pending(make_processor):
+    processor = make_processor()
+    articles = [_article(i) for i in range(4)]
+    processor.analyze_articles(articles, state_key=KEY)
+    saved = processor.state_store.load(KEY)
+
+    chat = processor.timeline_builder.chat
+
+    def failing(**kwargs):
+        raise RuntimeError("timeline unavailable")
+
+    processor.timeline_builder.chat = failing
+    articles.append(_article(4))
+    result = processor.analyze_articles(articles, state_key=KEY)
+    assert 'timeline' in result['failed']
+    # 状态没有被回退结果覆盖，新文章下次仍会被重新分析
+    assert processor.state_store.load(KEY)['articles'] == saved['articles']
+
+    processor.timeline_builder.chat = chat
+    retried = processor.analyze_articles(articles, state_key=KEY)
+    assert retried['failed'] == []
+    assert articles[4]['url'] in _fingerprints(processor)
+    assert not any(event['event'] == articles[4]['title'] for event in retried['timeline'])
+
+
+def test_dropped_summary_chunk_is_a_failure(make_processor):
+    processor = make_processor()
+    processor.map_reduce_summarizer.chunk_size = 150
+    chat = processor.map_reduce_summarizer.chat
+    calls = []
+
+    def flaky(**kwargs):
+        calls.append(kwargs['purpose'])
+        if kwargs['purpose'] == 'summary_map' and calls.count('summary_map') == 1:
+            raise RuntimeError("chunk failed")
+        return chat(**kwargs)
+
+    processor.map_reduce_summarizer.chat = flaky
+    result = processor.analyze_articles([_article(i) for i in range(6)], state_key=KEY)
+    assert calls.count('summary_map') > 1
+    assert 'summary' in result['failed']
+    assert processor.state_store.load(KEY) is None
+
+
+def test_failed_requests_never_save_state(make_processor):
+    server = MockLLMServer(latency=0.0, error_rate=1.0).start()
+    try:
+        processor = make_processor(base_url=server.base_url)
+        result = processor.analyze_articles([_article(i) for i in range(3)], state_key=KEY)
+    finally:
+        server.stop()
+    assert {'entities', 'summary', 'themes', 'timeline'} <= set(result['failed'])
+    assert result['usage']['failed_tasks'] == result['failed']
+    assert processor.state_store.load(KEY) is None
+
+
+def test_unparseable_responses_are_not_cached(make_processor, tmp_path):
+    processor = make_processor(cache=LLMResponseCache(cache_dir=str(tmp_path / "cache")))
+    replies = ['{"themes": [{"name": "被截断', '{"themes": [{"name": "主题", "description": "描述"}]}']
+
+    def create(**_):
+        message = SimpleNamespace(content=replies.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    processor.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    with pytest.raises(json.JSONDecodeError):
+        processor._request_themes("文本", 3)
+    assert processor.cache.get_stats()['writes'] == 0
+    # 截断的输出没有被缓存，下一次重新请求并缓存有效结果
+    assert processor._request_themes("文本", 3)[0]['name'] == "主题"
+    assert processor._request_themes("文本", 3)[0]['name'] == "主题"
+    assert replies == [] and processor.cache.get_stats()['writes'] == 1
+
+
+def test_unparseable_cached_entries_are_replaced(make_processor, tmp_path):
+    processor = make_processor(cache=LLMResponseCache(cache_dir=str(tmp_path / "cache")))
+    messages = [{"role": "user", "content": "请以JSON格式返回主题"}]
+    key = processor.cache.make_key("gpt-3.5-turbo", messages, {'response_format': {"type": "json_object"}})
+    # 例如批处理结果或旧版本写入的无效条目
+    processor.cache.set(key, "not json")
+    content = processor._chat(messages=messages, validate=json.loads, response_format={"type": "json_object"})
+    json.loads(content)
+    assert processor.cache.get(key) == content
@@ -0,0 +1,98 @@
+import sqlite3
+
+from processor import llm_cache
+from processor.llm_cache import LLMResponseCache
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def _make_cache(tmp_path, monkeypatch, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache.time, 'time', clock.time)
+    return LLMResponseCache(cache_dir=str(tmp_path), **kwargs), clock
+
+
+def _keys(cache):
+    with sqlite3.connect(cache.path) as conn:
+        return {row[0] for row in conn.execute("SELECT key FROM responses")}
+
+
+def test_hit_and_miss(tmp_path, monkeypatch):
+    cache, _ = _make_cache(tmp_path, monkeypatch)
+    key = cache.make_key("gpt", [{"role": "user", "content": "你好"}], {})
+    assert cache.get(key) is None
+    cache.set(key, "回答")
+    assert cache.get(key) == "回答"
+    stats = cache.get_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['writes'] == 1
+
+
+def test_make_key_depends_on_params():
+    messages = [{"role": "user", "content": "x"}]
+    assert LLMResponseCache.make_key("gpt", messages, {'a': 1}) != LLMResponseCache.make_key("gpt", messages, {'a': 2})
+    assert LLMResponseCache.make_key("gpt", messages, {'a': 1, 'b': 2}) == \
+        LLMResponseCache.make_key("gpt", messages, {'b': 2, 'a': 1})
+
+
+def test_expired_entry_is_a_miss_and_deleted(tmp_path, monkeypatch):
+    cache, clock = _make_cache(tmp_path, monkeypatch, ttl=60)
+    cache.set("k", "value")
+    clock.now += 61
+    assert cache.get("k") is None
+    assert cache.get_stats()['expired'] == 1
+    assert "k" not in _keys(cache)
+
+
+def test_bypass_skips_reads_but_still_writes(tmp_path, monkeypatch):
+    cache, _ = _make_cache(tmp_path, monkeypatch, bypass=True)
+    cache.set("k", "value")
+    assert cache.get("k") is None
+    assert "k" in _keys(cache)
+
+
+def test_size_eviction_removes_least_recently_accessed(tmp_path, monkeypatch):
+    cache, clock = _make_cache(tmp_path, monkeypatch, max_bytes=250)
+    for i in range(3):
+        cache.set(f"k{i}", "x" * 80)
+        clock.now += 1
+    # 访问k0后，最久未访问的是k1
+    assert cache.get("k0") is not None
+    clock.now += 1
+    cache.set("k3", "x" * 80)
+
+    keys = _keys(cache)
+    assert "k1" not in keys
+    assert {"k0", "k3"} <= keys
+    assert cache.get_stats()['evictions'] >= 1
+
+
+def test_eviction_drops_expired_entries_first(tmp_path, monkeypatch):
+    cache, clock = _make_cache(tmp_path, monkeypatch, ttl=10, max_bytes=250)
+    cache.set("old", "x" * 80)
+    clock.now += 20
+    cache.set("a", "x" * 80)
+    cache.set("b", "x" * 80)
+    cache.set("c", "x" * 80)
+    assert _keys(cache) == {"a", "b", "c"}
+
+
+def test_replacing_an_entry_does_not_inflate_the_size_total(tmp_path, monkeypatch):
+    cache, _ = _make_cache(tmp_path, monkeypatch, max_bytes=250)
+    for _ in range(10):
+        cache.set("same", "x" * 200)
+    assert cache.get_stats()['evictions'] == 0
+    assert _keys(cache) == {"same"}
+
+
+def test_size_total_is_restored_from_existing_file(tmp_path, monkeypatch):
+    cache, _ = _make_cache(tmp_path, monkeypatch, max_bytes=250)
+    cache.set("a", "x" * 200)
+    reopened = LLMResponseCache(cache_dir=str(tmp_path), max_bytes=250)
+    reopened.set("b", "x" * 200)
+    assert _keys(reopened) == {"b"}
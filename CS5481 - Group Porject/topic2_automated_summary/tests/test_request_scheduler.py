@@ -0,0 +1,206 @@
+import time
+import threading
+from email.utils import formatdate
+
+import httpx
+import pytest
+from openai import RateLimitError, BadRequestError
+
+from processor.request_scheduler import RequestScheduler, RequestCancelled, cancel_scope
+
+
+def _error(cls, status: int, headers: dict = None, body: dict = None):
+    request = httpx.Request("POST", "http://test/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return cls("error", response=response, body=body)
+
+
+def _rate_limit(headers: dict = None, body: dict = None) -> RateLimitError:
+    return _error(RateLimitError, 429, headers, body)
+
+
+def _failing(errors, result="ok"):
+    """依次抛出errors中的异常，之后返回result"""
+    calls = []
+
+    def func():
+        calls.append(time.time())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return func, calls
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("3", 3.0),
+    ("1.5", 1.5),
+    ("1s", 1.0),
+    ("0.5s", 0.5),
+    ("20ms", 0.02),
+    ("6m0s", 360.0),
+    ("1h2m3s", 3723.0),
+    ("2m30.5s", 150.5),
+    ("soon", None),
+    ("6m0sx", None),
+    ("", None),
+])
+def test_parse_duration(value, expected):
+    parsed = RequestScheduler._parse_duration(value)
+    if expected is None:
+        assert parsed is None
+    else:
+        assert parsed == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({'retry-after': '2'}, 2.0),
+    ({'retry-after-ms': '250'}, 0.25),
+    ({'retry-after-ms': '250', 'retry-after': '2'}, 0.25),
+    ({'x-ratelimit-reset-requests': '20ms'}, 0.02),
+    ({'x-ratelimit-reset-tokens': '1.5s'}, 1.5),
+    # 超过上限时按max_backoff截断
+    ({'x-ratelimit-reset-requests': '6m0s'}, 60.0),
+    ({'retry-after': 'invalid', 'x-ratelimit-reset-requests': '3s'}, 3.0),
+    ({}, None),
+])
+def test_retry_after_headers(headers, expected):
+    scheduler = RequestScheduler(max_backoff=60.0)
+    assert scheduler._retry_after(_rate_limit(headers)) == (pytest.approx(expected) if expected is not None else None)
+
+
+def test_retry_after_http_date():
+    scheduler = RequestScheduler(max_backoff=60.0)
+    value = scheduler._retry_after(_rate_limit({'retry-after': formatdate(time.time() + 10, usegmt=True)}))
+    assert 8.0 <= value <= 10.0
+
+
+def test_rate_limit_is_retried_after_retry_after():
+    scheduler = RequestScheduler(max_concurrency=4, base_backoff=5.0)
+    func, calls = _failing([_rate_limit({'retry-after-ms': '100'})])
+
+    result, retries = scheduler.execute(func, purpose='summary')
+
+    assert (result, retries) == ("ok", 1)
+    # 按响应头等待而不是按base_backoff指数退避
+    assert 0.09 <= calls[1] - calls[0] < 1.0
+    stats = scheduler.get_stats()
+    assert stats['rate_limited'] == 1 and stats['retries'] == 1
+    # 429后并发上限减半，成功后逐步恢复
+    assert stats['concurrency_limit'] == 3
+
+
+def test_rate_limit_pauses_other_requests():
+    scheduler = RequestScheduler()
+    scheduler._on_error(_rate_limit({'retry-after': '0.3'}), attempt=0)
+
+    start = time.time()
+    scheduler.execute(lambda: "ok", purpose='timeline')
+    assert time.time() - start >= 0.25
+
+
+def test_retries_are_exhausted():
+    scheduler = RequestScheduler(max_retries=2)
+    error = _rate_limit({'retry-after-ms': '1'})
+    func, calls = _failing([error] * 5)
+
+    with pytest.raises(RateLimitError):
+        scheduler.execute(func)
+    assert len(calls) == 3
+
+
+def test_final_attempt_does_not_pause_the_scheduler():
+    scheduler = RequestScheduler(max_concurrency=4, max_retries=1)
+    func, calls = _failing([_rate_limit({'retry-after': '30'}), _rate_limit({'retry-after': '30'})])
+    scheduler._on_error = lambda error, attempt: 0.0 if attempt == 0 else pytest.fail("最后一次失败不应退避")
+
+    with pytest.raises(RateLimitError):
+        scheduler.execute(func)
+    assert len(calls) == 2
+
+
+def test_exhausted_quota_is_not_retried():
+    scheduler = RequestScheduler(max_concurrency=4)
+    error = _rate_limit({'retry-after': '30'}, body={'code': 'insufficient_quota', 'type': 'insufficient_quota'})
+    func, calls = _failing([error])
+
+    start = time.time()
+    with pytest.raises(RateLimitError):
+        scheduler.execute(func)
+    assert len(calls) == 1
+    # 其他请求不受影响：没有暂停，并发上限不变
+    scheduler.execute(lambda: "ok")
+    assert time.time() - start < 1.0
+    stats = scheduler.get_stats()
+    assert stats['retries'] == 0 and stats['rate_limited'] == 0 and stats['concurrency_limit'] == 4
+
+
+def test_non_retryable_error_is_raised_immediately():
+    scheduler = RequestScheduler()
+    func, calls = _failing([_error(BadRequestError, 400)])
+
+    with pytest.raises(BadRequestError):
+        scheduler.execute(func)
+    assert len(calls) == 1
+    assert scheduler.get_stats()['retries'] == 0
+
+
+def test_requests_per_window_budget():
+    scheduler = RequestScheduler(requests_per_minute=2, window=0.3)
+    start = time.time()
+    for _ in range(3):
+        scheduler.execute(lambda: None)
+    assert time.time() - start >= 0.25
+
+
+def test_higher_priority_waiters_go_first():
+    scheduler = RequestScheduler(max_concurrency=1)
+    release = threading.Event()
+    started = threading.Event()
+    order = []
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    holder = threading.Thread(target=scheduler.execute, args=(blocker,))
+    holder.start()
+    started.wait(5)
+
+    threads = []
+    for purpose in ('timeline', 'summary'):
+        thread = threading.Thread(target=scheduler.execute, args=(lambda p=purpose: order.append(p), purpose))
+        thread.start()
+        threads.append(thread)
+        while scheduler.get_stats()['queued'] < len(threads):
+            time.sleep(0.01)
+
+    release.set()
+    for thread in [holder] + threads:
+        thread.join(5)
+    assert order == ['summary', 'timeline']
+
+
+def test_cancelled_requests_are_not_sent():
+    scheduler = RequestScheduler()
+    cancelled = threading.Event()
+    cancelled.set()
+    func, calls = _failing([])
+
+    with cancel_scope(cancelled), pytest.raises(RequestCancelled):
+        scheduler.execute(func)
+    assert calls == []
+    assert scheduler.get_stats()['queued'] == 0
+
+
+def test_cancel_interrupts_backoff():
+    scheduler = RequestScheduler(max_retries=3)
+    cancelled = threading.Event()
+    func, calls = _failing([_rate_limit({'retry-after': '30'})] * 3)
+    threading.Timer(0.2, cancelled.set).start()
+
+    start = time.time()
+    with cancel_scope(cancelled), pytest.raises(RequestCancelled):
+        scheduler.execute(func)
+    assert time.time() - start < 5
+    assert len(calls) == 1
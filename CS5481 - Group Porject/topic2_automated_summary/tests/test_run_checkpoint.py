@@ -0,0 +1,137 @@
+import os
+import json
+import gzip
+from datetime import datetime
+
+import numpy as np
+
+from main import AutomatedSummarySystem, load_config
+from processor.run_checkpoint import RunCheckpoint
+
+TOPIC = "人工智能"
+
+
+def _system() -> AutomatedSummarySystem:
+    # _run_stage不依赖系统的其他组件，不需要初始化爬虫和LLM客户端
+    return object.__new__(AutomatedSummarySystem)
+
+
+def test_round_trip_preserves_datetimes_and_converts_containers(tmp_path):
+    checkpoint = RunCheckpoint.create(str(tmp_path), TOPIC)
+    data = [{'title': '标题', 'normalized_date': datetime(2024, 3, 5, 8, 30), 'tags': ('a', 'b'),
+             'vector': np.arange(3, dtype=np.float32), 'nested': {'when': datetime(2024, 1, 1)}}]
+    checkpoint.save('process', data)
+
+    loaded = RunCheckpoint.resume(str(tmp_path), TOPIC).load('process')
+    assert loaded == [{'title': '标题', 'normalized_date': datetime(2024, 3, 5, 8, 30), 'tags': ['a', 'b'],
+                       'vector': [0.0, 1.0, 2.0], 'nested': {'when': datetime(2024, 1, 1)}}]
+    with gzip.open(os.path.join(checkpoint.run_dir, 'process.json.gz'), 'rt', encoding='utf-8') as f:
+        assert json.load(f)[0]['normalized_date'] == {'__datetime__': '2024-03-05T08:30:00'}
+    assert not [name for name in os.listdir(checkpoint.run_dir) if name.endswith('.tmp')]
+
+
+def test_resume_selects_latest_run_of_the_topic(tmp_path):
+    first = RunCheckpoint.create(str(tmp_path), TOPIC)
+    second = RunCheckpoint.create(str(tmp_path), TOPIC)
+    other = RunCheckpoint.create(str(tmp_path), "气候变化")
+
+    assert RunCheckpoint.list_runs(str(tmp_path), TOPIC) == [second.run_dir, first.run_dir]
+    assert RunCheckpoint.resume(str(tmp_path), TOPIC).run_dir == second.run_dir
+    assert RunCheckpoint.resume(str(tmp_path), TOPIC, run_id=os.path.basename(first.run_dir)).run_dir == first.run_dir
+    assert RunCheckpoint.resume(str(tmp_path), TOPIC, run_id="missing") is None
+    assert RunCheckpoint.resume(str(tmp_path), "没有运行过的主题") is None
+    assert RunCheckpoint.list_runs(str(tmp_path), "气候变化") == [other.run_dir]
+
+
+def test_create_keeps_only_recent_runs(tmp_path):
+    runs = [RunCheckpoint.create(str(tmp_path), TOPIC, keep=2).run_dir for _ in range(4)]
+    assert RunCheckpoint.list_runs(str(tmp_path), TOPIC) == runs[:1:-1]
+    assert not os.path.exists(runs[0])
+
+
+def test_from_stage_recomputes_that_stage_and_later_ones(tmp_path):
+    checkpoint = RunCheckpoint.create(str(tmp_path), TOPIC)
+    for stage in RunCheckpoint.SAVED_STAGES:
+        checkpoint.save(stage, {'stage': stage})
+
+    resumed = RunCheckpoint.resume(str(tmp_path), TOPIC, from_stage='analyze')
+    assert [resumed.reusable(stage) for stage in RunCheckpoint.SAVED_STAGES] == [True, True, False]
+    assert RunCheckpoint.resume(str(tmp_path), TOPIC).completed() == list(RunCheckpoint.SAVED_STAGES)
+
+
+def test_recomputed_stage_invalidates_later_checkpoints(tmp_path):
+    checkpoint = RunCheckpoint.create(str(tmp_path), TOPIC)
+    for stage in RunCheckpoint.SAVED_STAGES:
+        checkpoint.save(stage, {'stage': stage})
+
+    resumed = RunCheckpoint.resume(str(tmp_path), TOPIC)
+    # 预处理检查点损坏，重新计算后分析阶段不能再读取基于旧输入的检查点
+    with open(resumed._path('process'), 'wb') as f:
+        f.write(b"corrupted")
+    system = _system()
+    assert system._run_stage(resumed, 'crawl', lambda: {'stage': 'new crawl'}) == ({'stage': 'crawl'}, True)
+    assert system._run_stage(resumed, 'process', lambda: {'stage': 'new process'}) == ({'stage': 'new process'}, False)
+    assert system._run_stage(resumed, 'analyze', lambda: {'stage': 'new analyze'}) == ({'stage': 'new analyze'}, False)
+
+
+def test_partial_analysis_is_recomputed_on_resume(tmp_path):
+    system = _system()
+    is_partial = lambda data: bool(data.get('failed'))
+    checkpoint = RunCheckpoint.create(str(tmp_path), TOPIC)
+    system._run_stage(checkpoint, 'crawl', lambda: [{'title': 'a'}])
+    system._run_stage(checkpoint, 'process', lambda: [{'title': 'a'}])
+    data, reused = system._run_stage(checkpoint, 'analyze', lambda: {'summary': '模拟摘要', 'failed': ['summary']},
+                                     is_partial=is_partial)
+    assert reused is False
+    assert checkpoint.is_partial('analyze')
+
+    resumed = RunCheckpoint.resume(str(tmp_path), TOPIC)
+    assert resumed.completed() == ['crawl', 'process']
+    calls = []
+
+    def analyze():
+        calls.append(1)
+        return {'summary': '真实摘要', 'failed': []}
+
+    data, reused = system._run_stage(resumed, 'analyze', analyze, is_partial=is_partial)
+    assert (data['summary'], reused, calls) == ('真实摘要', False, [1])
+    assert not resumed.is_partial('analyze')
+
+    # 完整的分析结果之后可以复用
+    resumed = RunCheckpoint.resume(str(tmp_path), TOPIC)
+    data, reused = system._run_stage(resumed, 'analyze', analyze, is_partial=is_partial)
+    assert (data['summary'], reused, calls) == ('真实摘要', True, [1])
+
+
+def test_empty_stage_output_is_not_saved(tmp_path):
+    checkpoint = RunCheckpoint.create(str(tmp_path), TOPIC)
+    assert _system()._run_stage(checkpoint, 'crawl', list) == ([], False)
+    assert checkpoint.completed() == []
+
+
+def test_failure_and_completion_are_recorded_in_meta(tmp_path):
+    checkpoint = RunCheckpoint.create(str(tmp_path), TOPIC)
+    checkpoint.mark_failed('analyze', 'boom')
+    meta = RunCheckpoint(checkpoint.run_dir, TOPIC).meta
+    assert (meta['failed_stage'], meta['error']) == ('analyze', 'boom')
+
+    checkpoint.mark_done('output/summary.html')
+    meta = RunCheckpoint(checkpoint.run_dir, TOPIC).meta
+    assert 'failed_stage' not in meta and meta['stages']['render']['output'] == 'output/summary.html'
+
+
+def test_checkpoints_are_opt_in(tmp_path, monkeypatch):
+    monkeypatch.delenv('CHECKPOINT_RUNS', raising=False)
+    assert load_config()['CHECKPOINT_RUNS'] is False
+
+    system = _system()
+    system.runs_dir, system.runs_keep, system.checkpoint_runs = str(tmp_path), 5, False
+    assert system._open_checkpoint(TOPIC, resume=False) is None
+    assert not os.listdir(tmp_path)
+    # --resume找不到之前的运行时新建运行目录，之后可以继续
+    checkpoint = system._open_checkpoint(TOPIC, resume=True)
+    assert RunCheckpoint.list_runs(str(tmp_path), TOPIC) == [checkpoint.run_dir]
+    assert system._open_checkpoint(TOPIC, resume=True).run_dir == checkpoint.run_dir
+
+    system.checkpoint_runs = True
+    assert system._open_checkpoint(TOPIC, resume=False).run_dir != checkpoint.run_dir
@@ -0,0 +1,87 @@
+import hashlib
+
+import pytest
+
+from processor.sentence_dedup import SentenceDeduplicator
+
+
+def _article(source: str, *sentences: str, title: str = "标题") -> dict:
+    return {'source': source, 'title': title, 'sentences': list(sentences)}
+
+
+def test_exact_duplicates_keep_first_occurrence_with_attribution():
+    shared = "国家统计局今日发布了最新的经济运行数据报告。"
+    articles = [
+        _article("新华社", shared, "新华社记者在现场进行了采访报道。"),
+        _article("路透社", shared, "路透社分析师认为数据好于市场预期。"),
+    ]
+    compacted = SentenceDeduplicator().compact(articles)
+
+    assert compacted[0]['sentences'] == [f"{shared}〔另见：路透社〕", "新华社记者在现场进行了采访报道。"]
+    assert compacted[1]['sentences'] == ["路透社分析师认为数据好于市场预期。"]
+    assert compacted[1]['content'] == "路透社分析师认为数据好于市场预期。"
+
+
+def test_duplicates_ignore_case_whitespace_and_punctuation():
+    articles = [
+        _article("A", "The central bank raised interest rates by 25 basis points."),
+        _article("B", "the Central Bank raised interest rates by 25 basis points!"),
+    ]
+    compacted = SentenceDeduplicator().compact(articles)
+    assert len(compacted) == 1
+    assert compacted[0]['sentences'][0].endswith("〔另见：B〕")
+
+
+def test_near_duplicates_are_removed():
+    original = "The company announced on Tuesday that it would cut about 1,200 jobs across its European operations."
+    reworded = "The company announced on Tuesday that it will cut about 1,200 jobs across its European operations."
+    articles = [_article("A", original), _article("B", reworded, "An unrelated sentence about the weather today.")]
+    compacted = SentenceDeduplicator().compact(articles)
+
+    assert compacted[0]['sentences'] == [f"{original}〔另见：B〕"]
+    assert compacted[1]['sentences'] == ["An unrelated sentence about the weather today."]
+
+
+def test_different_sentences_are_kept():
+    articles = [
+        _article("A", "研究人员发现新的催化剂可以显著提高电池寿命。"),
+        _article("B", "市场监管部门对多家企业开展了专项执法检查。"),
+    ]
+    compacted = SentenceDeduplicator().compact(articles)
+    assert [article['sentences'] for article in compacted] == [
+        ["研究人员发现新的催化剂可以显著提高电池寿命。"],
+        ["市场监管部门对多家企业开展了专项执法检查。"],
+    ]
+
+
+def test_threshold_controls_near_duplicate_matching():
+    original = "The company announced on Tuesday that it would cut about 1,200 jobs across its European operations."
+    reworded = "The company announced on Tuesday that it will cut about 1,200 jobs across its European operations."
+    articles = [_article("A", original), _article("B", reworded)]
+
+    assert len(SentenceDeduplicator(threshold=0.99).compact(articles)) == 2
+    assert len(SentenceDeduplicator(threshold=0.7).compact(articles)) == 1
+
+
+def test_short_sentences_are_not_deduplicated():
+    articles = [_article("A", "他说。", "第一篇文章的主要内容在这里展开。"), _article("B", "他说。")]
+    compacted = SentenceDeduplicator().compact(articles)
+    assert compacted[1]['sentences'] == ["他说。"]
+
+
+def test_articles_fully_covered_by_others_are_dropped():
+    sentences = ["第一句内容足够长可以参与去重比较。", "第二句内容同样足够长可以参与比较。"]
+    articles = [_article("A", *sentences, title="原稿"), _article("B", *sentences, title="转载")]
+    compacted = SentenceDeduplicator().compact(articles)
+    assert [article['title'] for article in compacted] == ["原稿"]
+
+
+def test_signature_matrix_grows_past_initial_capacity():
+    articles = [_article("A", *(hashlib.sha1(str(i).encode()).hexdigest() for i in range(200)))]
+    compacted = SentenceDeduplicator().compact(articles)
+    assert len(compacted[0]['sentences']) == 200
+
+
+def test_invalid_band_configuration():
+    with pytest.raises(ValueError):
+        SentenceDeduplicator(num_hashes=30, bands=8)
@@ -0,0 +1,132 @@
+import re
+import json
+from datetime import datetime
+
+import pytest
+
+from processor.timeline_builder import TimelineBuilder
+
+
+def _builder(chat=None, **kwargs) -> TimelineBuilder:
+    return TimelineBuilder(chat or (lambda **_: '{"events": []}'), **kwargs)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-03-05", datetime(2024, 3, 5)),
+    ("2024/03/05", datetime(2024, 3, 5)),
+    ("2024.03.05", datetime(2024, 3, 5)),
+    ("2024-03-05T08:30:00", datetime(2024, 3, 5, 8, 30)),
+    ("5 March 2024", datetime(2024, 3, 5)),
+    ("March 5, 2024", datetime(2024, 3, 5)),
+    ("Mar 5, 2024", datetime(2024, 3, 5)),
+    ("05/03/2024", datetime(2024, 3, 5)),
+    # 只有年月时取当月第一天
+    ("2024-03", datetime(2024, 3, 1)),
+    ("March 2024", datetime(2024, 3, 1)),
+    ("2024年3月5日", datetime(2024, 3, 5)),
+    ("2024 年 3 月 5 号", datetime(2024, 3, 5)),
+    ("2024年3月", datetime(2024, 3, 1)),
+    ("2024年", datetime(2024, 1, 1)),
+    ("据报道，2024年3月5日上午", datetime(2024, 3, 5)),
+    ("2024", datetime(2024, 1, 1)),
+    # 带时间和时区的ISO写法保留原文的日期
+    ("2024-03-05T10:00:00Z", datetime(2024, 3, 5, 10)),
+    ("2024-03-05T10:00:00+08:00", datetime(2024, 3, 5, 10)),
+    ("2024-03-05 10:00", datetime(2024, 3, 5, 10)),
+    ("Mar. 5, 2024", datetime(2024, 3, 5)),
+    ("Sept. 5, 2024", datetime(2024, 9, 5)),
+    ("March 5 2024", datetime(2024, 3, 5)),
+    # 日期后的说明文字被忽略
+    ("2024-03-05 (approx)", datetime(2024, 3, 5)),
+    ("5 March 2024, morning", datetime(2024, 3, 5)),
+])
+def test_normalize_date_formats(value, expected):
+    assert _builder()._normalize_date(value) == expected
+
+
+def test_normalize_date_falls_back_to_default():
+    default = datetime(2023, 1, 2)
+    builder = _builder()
+    assert builder._normalize_date("", default) == default
+    assert builder._normalize_date(None, default) == default
+    assert builder._normalize_date("不久之前", default) == default
+    assert builder._normalize_date("不久之前") is None
+    # 文本中的四位数字不一定是年份，无法解析时使用文章的日期
+    assert builder._normalize_date("Updated 1530 GMT", default) == default
+    assert builder._normalize_date("early 2024", default) == default
+
+
+def test_normalize_date_keeps_datetime_and_rejects_invalid_day():
+    builder = _builder()
+    value = datetime(2024, 5, 6, 7, 8)
+    assert builder._normalize_date(value) is value
+    # 不存在的日期不会被当作月初
+    assert builder._normalize_date("2024年2月30日", datetime(2000, 1, 1)) == datetime(2000, 1, 1)
+
+
+def test_events_are_mapped_to_articles_and_missing_articles_fall_back():
+    articles = [
+        {'title': '发布会', 'url': 'u1', 'source': 'A', 'published_date': '2024-03-01', 'content': '...'},
+        {'title': '新政策出台', 'url': 'u2', 'source': 'B', 'published_date': '2024-03-02', 'content': '...'},
+    ]
+
+    def chat(**_):
+        return json.dumps({"events": [
+            {"article_id": "a1", "date": "2024年2月28日", "event": "公司召开发布会"},
+            {"article_id": "a1", "date": "无法确定", "event": "没有日期的事件"},
+        ]})
+
+    events = _builder(chat, batch_size=2).build(articles)
+    assert [(event['date'], event['event'], event['url']) for event in events] == [
+        ("2024-02-28", "公司召开发布会", "u1"),
+        ("2024-03-02", "新政策出台", "u2"),
+    ]
+
+
+def test_failed_batch_uses_titles_and_published_dates():
+    articles = [{'title': f'标题{i}', 'url': f'u{i}', 'published_date': f'2024-01-0{i + 1}'} for i in range(3)]
+
+    def chat(**_):
+        raise RuntimeError("boom")
+
+    events = _builder(chat, batch_size=2).build(articles)
+    assert [event['event'] for event in events] == ['标题0', '标题1', '标题2']
+    assert events[0]['date'] == '2024-01-01'
+
+
+def test_merge_sorts_by_date_and_removes_duplicates():
+    builder = _builder(max_events=3)
+    previous = [
+        {'date': '2024-01-01', 'event': '事件一'},
+        {'date': '2024-01-03', 'event': '事件三'},
+    ]
+    new = [
+        {'date': '2024-01-02', 'event': '事件二'},
+        {'date': '2024-01-03', 'event': '事件三！'},
+        {'date': '2024-01-04', 'event': '事件四'},
+    ]
+    merged = builder.merge(previous, new)
+    # 同一天描述相同（忽略标点）的事件只保留一个，超出上限时保留最近的事件
+    assert [item['event'] for item in merged] == ['事件二', '事件三', '事件四']
+    assert all('_sort_key' not in item for item in merged)
+
+
+def _echo_chat(**kwargs):
+    """每篇文章返回一个以标题为描述、发布时间为日期的事件"""
+    prompt = kwargs['messages'][-1]['content']
+    return json.dumps({"events": [
+        {"article_id": article_id, "date": date, "event": title}
+        for article_id, title, date in re.findall(r'\[(a\d+)\] 标题：(.*)\n发布时间：(.*)', prompt)
+    ]})
+
+
+def test_full_and_incremental_timelines_agree():
+    articles = [{'title': f'事件{i}', 'url': f'u{i}', 'published_date': f'2024-01-{i + 1:02d}'} for i in range(8)]
+    builder = _builder(_echo_chat, batch_size=3, max_events=5)
+
+    full = builder.build(articles)
+    previous = builder.build(articles[:5])
+    incremental = builder.merge(previous, builder.build(articles[5:]))
+    # 两条路径都保留最近的事件
+    assert [event['event'] for event in full] == ['事件3', '事件4', '事件5', '事件6', '事件7']
+    assert incremental == full